@@ -0,0 +1,104 @@
+"""Model memory and codec throughput benchmark.
+
+Compares the slotted models and ``orchestrator.core.codec`` with the previous
+approach: plain (``__dict__``) dataclasses converted with
+``dataclasses.asdict`` and ``json``. Reports
+
+* memory per step held as a plain dataclass, a slotted dataclass and a step
+  dict (the form the dispatch queue keeps), measured with ``tracemalloc``;
+* encode and decode throughput for a 20-step plan, and for single steps as
+  they are sent to runners.
+
+The codec uses ``orjson`` when it is installed; the line printed first says
+which backend was measured.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_codec
+"""
+
+from __future__ import annotations
+
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, field, fields, make_dataclass
+
+from orchestrator.core import codec
+from orchestrator.core.models import Plan, Step
+
+
+N_STEPS = 100_000
+N_ROUNDS = 20_000
+
+# The models as they were before they were slotted
+LegacyStep = make_dataclass(
+    "LegacyStep",
+    [(f.name, f.type, field(default=f.default, default_factory=f.default_factory)) for f in fields(Step)],
+)
+
+
+def _fields(i: int) -> dict:
+    return {
+        "step_id": f"fetch_data-{i}",
+        "team": "Engineering",
+        "intent": "Fetch market data for target symbols",
+        "adapter": {"type": "finance"},
+        "args": {"action": "fetch_data"},
+        "budget_tokens": 400,
+        "depends_on": [f"fetch_data-{i - 1}"] if i else [],
+    }
+
+
+def _bytes_per_item(build) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [build(i) for i in range(N_STEPS)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del items
+    return (after - before) / N_STEPS
+
+
+def _rate(fn, rounds: int = N_ROUNDS) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return rounds / (time.perf_counter() - start)
+
+
+def main() -> None:
+    print(f"codec backend: {'orjson' if codec.orjson is not None else 'json'}")
+    for label, build in (
+        ("dataclass", lambda i: LegacyStep(**_fields(i))),
+        ("slotted", lambda i: Step(**_fields(i))),
+        ("step dict", _fields),
+    ):
+        print(f"{label:>10}: {_bytes_per_item(build):>6,.0f} bytes per step")
+
+    plan = Plan(plan_id="plan-bench", gates=["gate1"], steps=[Step(**_fields(i)) for i in range(20)])
+    legacy = {"plan_id": plan.plan_id, "gates": plan.gates, "steps": [LegacyStep(**_fields(i)) for i in range(20)]}
+    encoded = json.dumps(asdict(plan))
+
+    def legacy_encode():
+        json.dumps({"plan_id": legacy["plan_id"], "gates": legacy["gates"], "steps": [asdict(s) for s in legacy["steps"]]})
+
+    def legacy_decode():
+        data = json.loads(encoded)
+        Plan(plan_id=data["plan_id"], gates=data["gates"], steps=[LegacyStep(**s) for s in data["steps"]])
+
+    step = dict(_fields(0), correlation_id="lease-1")
+    message = json.dumps(step)
+    for label, old, new in (
+        ("plan encode", legacy_encode, lambda: codec.dumps(plan)),
+        ("plan decode", legacy_decode, lambda: codec.plan_from_dict(codec.loads(encoded))),
+        ("+ validate", legacy_decode, lambda: codec.plan_from_dict(codec.loads(encoded), validate=True)),
+        ("step send", lambda: json.dumps(step), lambda: codec.dumps_text(step)),
+        ("result recv", lambda: json.loads(message), lambda: codec.loads(message)),
+    ):
+        before, after = _rate(old), _rate(new)
+        print(f"{label:>12}: {before:>10,.0f}/s -> {after:>10,.0f}/s  x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
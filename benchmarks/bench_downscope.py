@@ -0,0 +1,89 @@
+"""Benchmark for ``downscope_plan`` on large plans.
+
+Builds synthetic plans of thousands of steps with mixed adapters, priorities
+and dependencies, cuts each to 40% of its estimated tokens and reports the
+time taken and the value kept, next to the old prefix truncation (keep steps
+in order until the cap is hit). Three shapes are measured: independent steps
+and a dependency forest (both solved exactly) and a DAG where some steps have
+two dependencies (greedy pass). Plans whose DP table would exceed
+``DP_MAX_CELLS`` also take the greedy pass; the solver used is printed.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_downscope
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from functools import reduce
+from math import gcd
+
+from orchestrator.core.models import Plan, Step
+from orchestrator.cost.estimator import TokenEstimator
+from orchestrator.cost.governor import DEFAULT_STEP_TOKENS, DP_MAX_CELLS, downscope_plan, estimate_plan
+
+
+SIZES = (1_000, 5_000, 10_000)
+CAP_SHARE = 0.4
+ADAPTERS = sorted(DEFAULT_STEP_TOKENS)
+
+
+def _plan(n: int, shape: str, rng: random.Random) -> Plan:
+    steps = []
+    for i in range(n):
+        depends_on = []
+        if shape != "independent" and i and rng.random() < 0.5:
+            depends_on.append(f"s-{rng.randrange(i)}")
+            if shape == "dag" and i > 1 and rng.random() < 0.3:
+                depends_on.append(f"s-{rng.randrange(i)}")
+        steps.append(
+            Step(
+                step_id=f"s-{i}",
+                team="Engineering",
+                intent="Bench",
+                adapter={"type": rng.choice(ADAPTERS)},
+                priority=rng.choice((0, 0, 0, 1, 2, 5)),
+                depends_on=depends_on,
+            )
+        )
+    return Plan(plan_id=f"bench-{shape}-{n}", gates=[], steps=steps)
+
+
+def _value(steps) -> int:
+    return sum(1 + max(step.priority, 0) for step in steps)
+
+
+def _prefix(plan: Plan, cap: int, estimator: TokenEstimator) -> list:
+    tokens = estimate_plan(plan, estimator).step_tokens
+    kept, total = [], 0
+    for step in plan.steps:
+        if total + tokens[step.step_id] > cap:
+            break
+        kept.append(step)
+        total += tokens[step.step_id]
+    return kept
+
+
+def main() -> None:
+    rng = random.Random(7)
+    estimator = TokenEstimator(DEFAULT_STEP_TOKENS)
+    for shape in ("independent", "forest", "dag"):
+        for n in SIZES:
+            plan = _plan(n, shape, rng)
+            tokens = estimate_plan(plan, estimator).step_tokens
+            cap = int(sum(tokens.values()) * CAP_SHARE)
+            cells = (n + 1) * (cap // (reduce(gcd, tokens.values(), 0) or 1) + 1)
+            solver = "dp" if shape != "dag" and cells <= DP_MAX_CELLS else "greedy"
+            start = time.perf_counter()
+            kept = downscope_plan(plan, cap, estimator).steps
+            elapsed = time.perf_counter() - start
+            print(
+                f"{shape:>11} {n:>6,} steps ({solver:>6}): {elapsed * 1000:>6,.0f} ms  "
+                f"value {_value(kept):>6,} vs prefix {_value(_prefix(plan, cap, estimator)):>6,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Append throughput benchmark for ``CostLedger``.
+
+Records the same stream of entries with each durability level and reports
+appends per second. ``write`` opens, writes and closes the file for every
+entry (the original behaviour); ``group`` buffers entries and commits them
+with one write per group; ``fsync`` additionally fsyncs every group. A final
+check reads the file back with a fresh ledger to confirm nothing was lost.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_ledger_append
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+
+from orchestrator.cost.ledger import DURABILITY_LEVELS, CostLedger
+
+
+N_APPENDS = 20_000
+
+
+def _round(directory: str, durability: str) -> float:
+    ledger_path = os.path.join(directory, f"{durability}.jsonl")
+    ledger = CostLedger(ledger_path, durability=durability)
+    start = time.perf_counter()
+    for i in range(N_APPENDS):
+        ledger.append(f"task-{i % 8}", f"s-{i}", 120, 30, 0.001)
+    ledger.close()
+    elapsed = time.perf_counter() - start
+    totals = CostLedger(ledger_path).totals_today()
+    assert totals["in_tokens"] == 120 * N_APPENDS, f"lost entries: {totals}"
+    return elapsed
+
+
+def main() -> None:
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for durability in DURABILITY_LEVELS:
+            elapsed = _round(tmp, durability)
+            rate = N_APPENDS / elapsed
+            baseline = baseline or rate
+            print(f"{durability:>6}: {rate:>11,.0f} appends/s  x{rate / baseline:.1f}")
+
+
+if __name__ == "__main__":
+    main()
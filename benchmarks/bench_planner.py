@@ -0,0 +1,52 @@
+"""Planning throughput benchmark for ``plan_project``.
+
+Plans a mix of single- and multi-domain specs over every domain with a
+template and reports plans per second. Since the templates are compiled once
+at import, each plan only copies step prototypes; a second round after the
+estimator has learned new usage shows the cost of refreshing the cached
+estimates once.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_planner
+"""
+
+from __future__ import annotations
+
+import time
+
+from orchestrator.cost.governor import default_estimator
+from orchestrator.plan_templates import FALLBACK_DOMAIN, PLAN_TEMPLATES
+from orchestrator.planner import plan_project
+
+
+N_PLANS = 50_000
+
+
+def _specs() -> list:
+    domains = sorted(d for d in PLAN_TEMPLATES if d != FALLBACK_DOMAIN)
+    specs = [{"goal": f"Goal {d}", "domains": [d]} for d in domains]
+    specs += [{"goal": f"Goal {a}+{b}", "domains": [a, b]} for a, b in zip(domains, domains[1:])]
+    specs.append({"goal": "Goal unknown", "domains": ["unknown"]})
+    return specs
+
+
+def _round(specs: list) -> tuple:
+    steps = 0
+    start = time.perf_counter()
+    for i in range(N_PLANS):
+        steps += len(plan_project(specs[i % len(specs)]).steps)
+    return time.perf_counter() - start, steps
+
+
+def main() -> None:
+    specs = _specs()
+    for label in ("cached estimates", "after new usage"):
+        if label == "after new usage":
+            default_estimator.observe("web", "deploy", 320)
+        elapsed, steps = _round(specs)
+        print(f"{label:>16}: {N_PLANS / elapsed:>9,.0f} plans/s  {steps / elapsed:>10,.0f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Local load test for multi-runner fan-out.
+
+Simulated runners pull from a shared ``DispatchQueue`` through a
+``RunnerRegistry`` the same way ``/ws`` connections do: pop a step, lease it,
+"execute" it with a fixed latency, then complete the lease. Throughput is
+reported for increasing runner counts; with I/O-bound steps it should scale
+linearly. Each round also starts one extra runner that crashes while holding
+a lease, and the test checks that its step is re-queued and still completed
+by one of the healthy runners.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_runner_fanout
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from orchestrator.dispatch_queue import DispatchQueue
+from orchestrator.runners import RunnerRegistry
+
+
+N_STEPS = 2_000
+STEP_LATENCY = 0.005  # seconds per simulated step
+RUNNER_COUNTS = (1, 2, 4, 8, 16, 32)
+
+
+async def _runner(registry: RunnerRegistry, completed: set, total: int, crash_after: int = -1) -> None:
+    runner_id = registry.register()
+    handled = 0
+    try:
+        while len(completed) < total:
+            try:
+                queued = await asyncio.wait_for(registry.queue.get_entry(), timeout=STEP_LATENCY * 4)
+            except asyncio.TimeoutError:
+                continue
+            lease = registry.lease(runner_id, queued)
+            await asyncio.sleep(STEP_LATENCY)
+            if handled == crash_after:
+                return  # dies holding the lease; unregister re-queues it
+            if registry.complete(lease.lease_id) is not None:
+                completed.add(lease.step_id)
+            handled += 1
+    finally:
+        registry.unregister(runner_id)
+
+
+async def _round(n_runners: int) -> float:
+    queue = DispatchQueue()
+    registry = RunnerRegistry(queue)
+    for i in range(N_STEPS):
+        queue.push({"step_id": f"s-{i}", "adapter": {"type": "files"}}, lane=f"project-{i % 4}")
+    completed: set = set()
+    start = time.perf_counter()
+    await asyncio.gather(
+        _runner(registry, completed, N_STEPS, crash_after=0),
+        *(_runner(registry, completed, N_STEPS) for _ in range(n_runners)),
+    )
+    elapsed = time.perf_counter() - start
+    assert len(completed) == N_STEPS, f"lost {N_STEPS - len(completed)} steps"
+    return elapsed
+
+
+def main() -> None:
+    baseline = None
+    for n in RUNNER_COUNTS:
+        elapsed = asyncio.run(_round(n))
+        throughput = N_STEPS / elapsed
+        baseline = baseline or throughput
+        print(f"{n:>3} runners: {throughput:>9,.0f} steps/s  speedup x{throughput / baseline:.1f}")
+
+
+if __name__ == "__main__":
+    main()
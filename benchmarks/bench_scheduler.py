@@ -0,0 +1,95 @@
+"""Scheduler tick benchmark.
+
+Schedules 100,000 interval jobs (every 1 to 24 hours) on a virtual clock and
+advances it 10 seconds per tick, so each tick finds only a handful of due
+jobs. Compares ``Scheduler.run_pending``, which pops due jobs off its
+``next_run`` heap and journals only the jobs it changed, with the previous
+approach of scanning every job on every tick, and checks that both find the
+same due jobs. The heap run persists to a temporary ``jobs.yaml``; the
+previous approach also rewrote the whole file on every tick that ran a job,
+which is timed once (``full save``) rather than per tick.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_scheduler
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import os
+import random
+import tempfile
+import time
+
+from orchestrator.cost.budget import BudgetEngine, load_budget_config
+from orchestrator.scheduler import Scheduler
+
+
+N_JOBS = 100_000
+N_TICKS = 300
+TICK = dt.timedelta(seconds=10)
+START = dt.datetime(2026, 1, 5, 8, 0)
+
+
+def _scheduler(now: list, jobs_path=None) -> Scheduler:
+    budget = BudgetEngine(load_budget_config(), daily_usage=lambda: 0)
+    scheduler = Scheduler(jobs_path=None, budget=budget, clock=lambda: now[0])
+    rng = random.Random(1)
+    for _ in range(N_JOBS):
+        scheduler.add_job({"interval": rng.randint(3600, 86400), "task_ref": "bench"})
+    # Spread the first runs over the benchmarked window and beyond
+    for job in scheduler.jobs:
+        scheduler.reschedule(job, START + dt.timedelta(seconds=rng.randint(0, 86400)))
+    if jobs_path:
+        scheduler.jobs_path = jobs_path
+        scheduler.save_jobs()
+    return scheduler
+
+
+def bench_scan(scheduler: Scheduler, now: list) -> tuple:
+    """The previous tick: look at every job and run the due ones."""
+    jobs = scheduler.jobs
+    ran = 0
+    start = time.perf_counter()
+    for _ in range(N_TICKS):
+        now[0] += TICK
+        for job in jobs:
+            next_run = job.get("next_run")
+            if not isinstance(next_run, dt.datetime) or next_run > now[0]:
+                continue
+            ran += 1
+            job["next_run"] = now[0] + dt.timedelta(seconds=job["interval"])
+    return time.perf_counter() - start, ran
+
+
+def bench_heap(scheduler: Scheduler, now: list) -> tuple:
+    ran = [0]
+    scheduler.register("bench", lambda: ran.__setitem__(0, ran[0] + 1))
+    start = time.perf_counter()
+    for _ in range(N_TICKS):
+        now[0] += TICK
+        scheduler.run_pending()
+    return time.perf_counter() - start, ran[0]
+
+
+def main() -> None:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs_path = os.path.join(tmp, "jobs.yaml")
+        for name, fn, path in (("full scan", bench_scan, None), ("heap", bench_heap, jobs_path)):
+            now = [START]
+            scheduler = _scheduler(now, path)
+            elapsed, ran = fn(scheduler, now)
+            results[name] = ran
+            print(f"{name:>9}: {N_TICKS} ticks over {N_JOBS:,} jobs in {elapsed:.3f}s "
+                  f"({elapsed / N_TICKS * 1e3:.3f} ms/tick, {ran} runs)")
+        start = time.perf_counter()
+        scheduler.save_jobs()
+        print(f"full save: {time.perf_counter() - start:.3f}s per rewrite of {N_JOBS:,} jobs")
+        assert len(Scheduler(jobs_path=jobs_path).jobs) == N_JOBS
+    assert results["full scan"] == results["heap"], results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Restart-time benchmark for the orchestrator write-ahead log.
+
+Writes one million events (push / pop / result cycles, with a share of
+budget parks and a backlog that is still queued) through a ``DispatchQueue``
+journaled to a ``WriteAheadLog``, then times ``recover`` on a fresh log
+object. A second round disables snapshots to show the cost of replaying the
+full history. A third replays plans with many held steps, whose ``done``
+events only touch the steps waiting on them.
+
+Run from the repository root::
+
+    python -m benchmarks.bench_wal_recovery
+"""
+
+from __future__ import annotations
+
+import tempfile
+import time
+
+from orchestrator.dispatch_queue import DispatchQueue
+from orchestrator.plan_executor import PlanExecutor
+from orchestrator.wal import SNAPSHOT_EVERY, WriteAheadLog
+
+
+N_EVENTS = 1_000_000
+BACKLOG = 5_000  # steps left queued at the "crash"
+N_PLANS = 10_000  # two-step plans, half of them completed, for the held replay
+
+
+def _write(directory: str, snapshot_every: int) -> float:
+    wal = WriteAheadLog(directory, snapshot_every=snapshot_every)
+    wal.recover()
+    queue = DispatchQueue(journal=wal.record_queue_event)
+    start = time.perf_counter()
+    events = 0
+    i = 0
+    while events < N_EVENTS - BACKLOG:
+        queue.push({"step_id": f"s-{i}", "adapter": {"type": "files"}}, lane=f"p-{i % 16}")
+        queued = queue.pop_entry()
+        if i % 10 == 0:
+            wal.record_park(queued.seq, {"step_id": queued.step["step_id"], "reason": "budget"})
+        else:
+            wal.record_result(queued.seq, {"step_id": queued.step["step_id"], "status": "ok"})
+        events += 3
+        i += 1
+    for j in range(BACKLOG):
+        queue.push({"step_id": f"b-{j}", "adapter": {"type": "web"}}, lane="backlog")
+    wal.close()
+    return time.perf_counter() - start
+
+
+def _write_held(directory: str) -> float:
+    wal = WriteAheadLog(directory, snapshot_every=N_EVENTS * 2)
+    wal.recover()
+    queue = DispatchQueue(journal=wal.record_queue_event)
+    executor = PlanExecutor(queue, journal=wal.record_dag_event)
+    start = time.perf_counter()
+    plan = [{"step_id": "a-1"}, {"step_id": "a-2", "depends_on": ["a-1"]}]
+    for i in range(N_PLANS):
+        executor.submit(plan, f"p-{i % 16}")
+    for i in range(N_PLANS // 2):
+        executor.complete(f"p-{i % 16}", "a-1")
+    wal.close()
+    return time.perf_counter() - start
+
+
+def _recover(directory: str, snapshot_every: int) -> tuple:
+    wal = WriteAheadLog(directory, snapshot_every=snapshot_every)
+    start = time.perf_counter()
+    state = wal.recover()
+    elapsed = time.perf_counter() - start
+    wal.close()
+    return elapsed, state
+
+
+def main() -> None:
+    for label, snapshot_every in (("snapshot+tail", SNAPSHOT_EVERY), ("full replay", N_EVENTS * 2)):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_s = _write(tmp, snapshot_every)
+            recover_s, state = _recover(tmp, snapshot_every)
+            print(
+                f"{label:>14}: wrote {N_EVENTS:,} events in {write_s:.1f}s  "
+                f"recovered in {recover_s * 1000:,.0f} ms  "
+                f"(queued={len(state.queued):,} runs={len(state.runs):,} parked={len(state.parked):,})"
+            )
+    with tempfile.TemporaryDirectory() as tmp:
+        write_s = _write_held(tmp)
+        recover_s, state = _recover(tmp, N_EVENTS * 2)
+        print(
+            f"{'held replay':>14}: wrote {N_PLANS:,} plans in {write_s:.1f}s  "
+            f"recovered in {recover_s * 1000:,.0f} ms  (held={len(state.held):,})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Dict and JSON codec for the data models.
+
+The models in ``models.py`` are slotted dataclasses, so they have no
+``__dict__`` and ``dataclasses.asdict`` (which deep-copies recursively) is
+the slow way to serialise them. This module converts them with precomputed
+field lists instead:
+
+* ``to_dict`` turns a ``Step``, ``Plan``, ``StepResult`` or ``ParkedItem``
+  into a plain dict. Containers are shared with the model, not copied.
+* ``step_from_dict``, ``plan_from_dict``, ``result_from_dict`` and
+  ``parked_from_dict`` build models from dicts, ignoring unknown keys (wire
+  messages carry extras such as ``correlation_id``). With ``validate=True``
+  the dict is checked by ``validators.default_validator`` before any model
+  is built, and every problem is reported in one ``ValidationError``.
+* ``dumps`` / ``loads`` convert between dicts or models and JSON bytes.
+  They use ``orjson`` when it is installed and fall back to ``json``; both
+  produce compact output that ``json.loads`` reads back the same. The wire
+  format does not depend on which is installed: whatever orjson refuses to
+  encode (non-str dict keys, integers beyond 64 bits, datetimes) or decode
+  (``NaN`` tokens, lone surrogates) is handed to ``json``, and NaN and
+  infinities are encoded as ``null`` by both, as strict JSON requires.
+
+The orchestrator uses ``dumps`` and ``loads`` for the messages it exchanges
+with runners and for plans it stores or returns.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from dataclasses import fields
+from operator import attrgetter
+from typing import Any, Dict, List, Union
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+from .models import ParkedItem, Plan, Step, StepResult
+from .validators import ValidationError, default_validator
+
+
+Model = Union[Step, Plan, StepResult, ParkedItem]
+
+_FIELDS = {cls: tuple(f.name for f in fields(cls)) for cls in (Step, StepResult, ParkedItem)}
+_GETTERS = {cls: attrgetter(*names) for cls, names in _FIELDS.items()}
+
+
+def to_dict(obj: Model) -> Dict[str, Any]:
+    """Plain dict of a model; nested steps of a plan are converted too."""
+    if isinstance(obj, Plan):
+        return {"plan_id": obj.plan_id, "gates": obj.gates, "steps": [_flat(step) for step in obj.steps]}
+    return _flat(obj)
+
+
+def _flat(obj: Any) -> Dict[str, Any]:
+    cls = type(obj)
+    return dict(zip(_FIELDS[cls], _GETTERS[cls](obj)))
+
+
+def _build(cls: type, data: Dict[str, Any]) -> Any:
+    try:
+        return cls(**data)
+    except TypeError:
+        # Extra keys (or missing required ones, which fail again below)
+        return cls(**{name: data[name] for name in _FIELDS[cls] if name in data})
+
+
+def step_from_dict(data: Dict[str, Any], validate: bool = False) -> Step:
+    """Build a Step; with ``validate``, raise ValidationError as ``validate_step`` would."""
+    if validate:
+        _check(default_validator.step_errors(data))
+    return _build(Step, data)
+
+
+def plan_from_dict(data: Dict[str, Any], validate: bool = False) -> Plan:
+    """Build a Plan and its steps; with ``validate``, raise ValidationError as ``validate_plan`` would."""
+    if validate:
+        _check(default_validator.plan_errors(data))
+    return Plan(
+        plan_id=data["plan_id"],
+        gates=data["gates"],
+        steps=[_build(Step, step) for step in data["steps"]],
+    )
+
+
+def result_from_dict(data: Dict[str, Any], validate: bool = False) -> StepResult:
+    """Build a StepResult; with ``validate``, raise ValidationError as ``validate_step_result`` would."""
+    if validate:
+        _check(default_validator.result_errors(data))
+    return _build(StepResult, data)
+
+
+def parked_from_dict(data: Dict[str, Any], validate: bool = False) -> ParkedItem:
+    """Build a ParkedItem; with ``validate``, require a reason."""
+    if validate and not data.get("reason"):
+        raise ValidationError(["reason is required in ParkedItem"])
+    return _build(ParkedItem, data)
+
+
+def _check(errors: List[str]) -> None:
+    if errors:
+        raise ValidationError(errors)
+
+
+def dumps(obj: Union[Model, Dict[str, Any], list]) -> bytes:
+    """Compact JSON bytes of a model, dict or list."""
+    if orjson is not None:
+        try:
+            # orjson serialises dataclasses natively, in field order
+            return orjson.dumps(obj, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            pass  # encode (or reject) it exactly as json does
+    if isinstance(obj, (Step, Plan, StepResult, ParkedItem)):
+        obj = to_dict(obj)
+    try:
+        text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False, allow_nan=False)
+    except ValueError:
+        # Out-of-range floats: write them as null, like orjson
+        text = json.dumps(_finite(obj, set()), separators=(",", ":"), ensure_ascii=False)
+    return text.encode("utf-8")
+
+
+def _finite(obj: Any, path: set) -> Any:
+    """Copy of ``obj`` with NaN and infinities replaced by None."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if not isinstance(obj, (dict, list, tuple)):
+        return obj
+    if id(obj) in path:
+        raise ValueError("Circular reference detected")
+    path.add(id(obj))
+    if isinstance(obj, dict):
+        copy: Any = {key: _finite(value, path) for key, value in obj.items()}
+    else:
+        copy = [_finite(value, path) for value in obj]
+    path.discard(id(obj))
+    return copy
+
+
+def dumps_text(obj: Union[Model, Dict[str, Any], list]) -> str:
+    """Like ``dumps`` but returns ``str`` (for text WebSocket frames)."""
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON text or bytes; raises ValueError on malformed input."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # json also reads NaN tokens and lone surrogates, or raises
+    return json.loads(data)
@@ -2,13 +2,15 @@
 
 These dataclasses mirror the schemas defined in `/docs/spec_task_envelope.md`. They provide
 simple containers for task specifications, plans, steps, results, and parked items.
+They are slotted to keep large plans and queues compact; use `codec.py` to convert
+them to and from dicts and JSON.
 """
 
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class ProjectSpec:
     goal: str
     domains: List[str]
@@ -16,7 +18,7 @@ class ProjectSpec:
     parameters: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class Step:
     step_id: str
     team: str
@@ -27,16 +29,18 @@ class Step:
     evidence: List[Any] = field(default_factory=list)
     budget_tokens: Optional[int] = None
     requires_human: bool = False
+    depends_on: List[str] = field(default_factory=list)  # step_ids that must run first
+    priority: int = 0  # higher is more valuable when a plan has to be cut
 
 
-@dataclass
+@dataclass(slots=True)
 class Plan:
     plan_id: str
     gates: List[str]
     steps: List[Step]
 
 
-@dataclass
+@dataclass(slots=True)
 class StepResult:
     step_id: str
     status: str  # ok|retry|blocked|failed
@@ -45,7 +49,7 @@ class StepResult:
     notes: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ParkedItem:
     reason: str
     proposed_free_alt: Optional[str] = None
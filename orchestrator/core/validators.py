@@ -1,10 +1,23 @@
 """Validators for data models.
 
-These functions perform minimal structural validation on the models defined in models.py.
-They raise ValueError on validation failure.
+These functions perform structural validation on the models defined in models.py.
+They raise ``ValidationError`` (a ``ValueError``) on validation failure.
+
+The checks are compiled once into a ``SchemaValidator``: the allowed adapter
+types and statuses become sets, and ``ARGS_SCHEMAS`` becomes a lookup from
+``(adapter type, action)`` to the arguments that step must carry. A
+validator does not stop at the first problem; it walks a plan once and
+reports every error it finds, each prefixed with where it is (for example
+``steps[12]: team is required``). ``validate_plans`` and
+``validate_step_results`` check many items in the same way and raise a
+single error listing the problems of all of them.
+
+The validator accepts models or plain dicts with the same fields, so
+``codec.py`` can check decoded data before building models from it.
 """
 
-from typing import List
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from .models import Plan, Step, StepResult
 
@@ -23,47 +36,318 @@ ALLOWED_ADAPTER_TYPES: List[str] = [
 
 ALLOWED_STATUSES: List[str] = ["ok", "retry", "blocked", "failed"]
 
+# adapter type -> args["action"] (None: any action) -> required arg -> allowed values (None: any)
+ARGS_SCHEMAS: Dict[str, Dict[Optional[str], Dict[str, Optional[Sequence[Any]]]]] = {
+    "finance": {
+        "place_orders": {"mode": ["paper", "live"]},
+    },
+    "schedule": {
+        None: {"cron": None},
+    },
+}
+
+# Errors shown in a ValidationError message; ``errors`` keeps all of them
+MAX_REPORTED = 10
+
+ArgChecks = Tuple[Tuple[str, Optional[frozenset]], ...]
+
+_STEP_FIELDS = ("step_id", "team", "adapter", "args", "depends_on")
+_PLAN_FIELDS = ("plan_id", "gates", "steps")
+_RESULT_FIELDS = ("step_id", "status")
+_GETTERS = {names: attrgetter(*names) for names in (_STEP_FIELDS, _PLAN_FIELDS, _RESULT_FIELDS)}
+
+
+class ValidationError(ValueError):
+    """Every problem found in one validation pass.
+
+    ``errors`` lists them all; the message shows the first ``MAX_REPORTED``.
+    """
+
+    def __init__(self, errors: Sequence[str]) -> None:
+        self.errors = list(errors)
+        message = "; ".join(self.errors[:MAX_REPORTED])
+        if len(self.errors) > MAX_REPORTED:
+            message += f" (and {len(self.errors) - MAX_REPORTED} more)"
+        super().__init__(message)
+
+
+class SchemaValidator:
+    """Validation rules compiled from the adapter, status and args tables."""
+
+    def __init__(
+        self,
+        adapter_types: Iterable[str] = ALLOWED_ADAPTER_TYPES,
+        statuses: Iterable[str] = ALLOWED_STATUSES,
+        args_schemas: Dict[str, Dict[Optional[str], Dict[str, Optional[Sequence[Any]]]]] = ARGS_SCHEMAS,
+    ) -> None:
+        self.adapter_types = frozenset(adapter_types)
+        self.statuses = frozenset(statuses)
+        # adapter type -> action -> checks; the None action holds the checks for every action
+        self._args: Dict[str, Dict[Optional[str], ArgChecks]] = {}
+        for adapter_type, actions in args_schemas.items():
+            if adapter_type not in self.adapter_types:
+                raise ValueError(f"Args schema for unknown adapter type: {adapter_type}")
+            common = _arg_checks(actions.get(None, {}))
+            compiled = self._args[adapter_type] = {None: common}
+            for action, required in actions.items():
+                if action is not None:
+                    compiled[action] = common + _arg_checks(required)
+
+    def step_errors(self, step: Any, where: str = "") -> List[str]:
+        """Problems with one step (model or dict), each prefixed with ``where``."""
+        values = _values(step, _STEP_FIELDS)
+        if values is None:
+            return [f"{where}step must be an object"]
+        return [where + problem for problem in self._step_problems(values)]
+
+    def plan_errors(self, plan: Any, where: str = "") -> List[str]:
+        """Problems with a plan (model or dict), its steps and its dependency graph."""
+        values = _values(plan, _PLAN_FIELDS)
+        if values is None:
+            return [f"{where}plan must be an object"]
+        plan_id, gates, steps = values
+        errors = []
+        if not plan_id:
+            errors.append(f"{where}plan_id is required")
+        if not isinstance(gates, list):
+            errors.append(f"{where}gates must be a list")
+        if not isinstance(steps, list) or len(steps) == 0:
+            errors.append(f"{where}steps must be a non-empty list")
+            return errors
+        edges: Dict[str, Sequence[str]] = {}
+        adapter_types, args_schemas = self.adapter_types, self._args
+        getter = _GETTERS[_STEP_FIELDS]
+        for i, step in enumerate(steps):
+            if step.__class__ is Step:
+                values = getter(step)
+            else:
+                values = _values(step, _STEP_FIELDS)
+                if values is None:
+                    errors.append(f"{where}steps[{i}]: step must be an object")
+                    continue
+            step_id, team, adapter, args, deps = values
+            # Fast path for the common well-formed step; anything else gets the full check
+            if (
+                step_id.__class__ is str
+                and step_id
+                and team
+                and adapter.__class__ is dict
+                and adapter.get("type").__class__ is str
+                and adapter["type"] in adapter_types
+                and (args is None or args.__class__ is dict)
+            ):
+                problems = None
+                schema = args_schemas.get(adapter["type"])
+                if schema is not None:
+                    action = args.get("action") if args else None
+                    if schema.get(action if action.__class__ is str else None) or schema[None]:
+                        problems = self._args_problems(adapter["type"], args or {}) or None
+            else:
+                problems = self._step_problems(values)
+                if step_id.__class__ is not str or not step_id:
+                    errors.extend(f"{where}steps[{i}]: {problem}" for problem in problems)
+                    continue
+            if step_id in edges:
+                problems = (problems or []) + [f"duplicate step_id {step_id}"]
+            elif deps.__class__ is list:
+                edges[step_id] = deps
+            else:
+                edges[step_id] = ()
+                if deps is not None:
+                    problems = (problems or []) + ["depends_on must be a list of step_ids"]
+            if problems:
+                errors.extend(f"{where}steps[{i}]: {problem}" for problem in problems)
+        try:
+            errors.extend(where + error for error in dependency_errors(edges))
+        except TypeError:  # an unhashable entry in some depends_on
+            errors.append(f"{where}depends_on must be a list of step_ids")
+        return errors
+
+    def _step_problems(self, values: Tuple[Any, ...]) -> List[str]:
+        step_id, team, adapter, args, _ = values
+        problems = []
+        if not step_id:
+            problems.append("step_id is required")
+        elif not isinstance(step_id, str):
+            problems.append("step_id must be a string")
+        if not team:
+            problems.append("team is required")
+        if not isinstance(adapter, dict) or "type" not in adapter:
+            problems.append("adapter with a 'type' field is required")
+            return problems
+        adapter_type = adapter["type"]
+        if not _member(adapter_type, self.adapter_types):
+            problems.append(f"Unknown adapter type: {adapter_type}")
+            return problems
+        if args is None:
+            args = {}
+        elif not isinstance(args, dict):
+            problems.append("args must be an object")
+            return problems
+        if adapter_type in self._args:
+            problems.extend(self._args_problems(adapter_type, args))
+        return problems
+
+    def _args_problems(self, adapter_type: str, args: Dict[str, Any]) -> List[str]:
+        checks = self._args[adapter_type]
+        action = args.get("action")
+        required = checks.get(action if isinstance(action, str) else None) or checks[None]
+        problems = []
+        for name, allowed in required:
+            value = args.get(name)
+            if value is None or value == "":
+                label = f"{adapter_type} {action}" if action else f"{adapter_type} steps"
+                problems.append(f"args.{name} is required for {label}")
+            elif allowed is not None and not _member(value, allowed):
+                problems.append(f"args.{name} must be one of {', '.join(sorted(allowed))}, not {value!r}")
+        return problems
+
+    def result_errors(self, step_result: Any, where: str = "") -> List[str]:
+        """Problems with a step result (model or dict)."""
+        values = _values(step_result, _RESULT_FIELDS)
+        if values is None:
+            return [f"{where}result must be an object"]
+        step_id, status = values
+        errors = []
+        if not step_id:
+            errors.append(f"{where}step_id is required in StepResult")
+        if not isinstance(status, str) or status not in self.statuses:
+            errors.append(f"{where}Invalid status: {status}")
+        return errors
+
+
+def _arg_checks(required: Dict[str, Optional[Sequence[Any]]]) -> ArgChecks:
+    return tuple((name, None if allowed is None else frozenset(allowed)) for name, allowed in required.items())
+
+
+def _values(obj: Any, names: Tuple[str, ...]) -> Optional[Tuple[Any, ...]]:
+    if isinstance(obj, dict):
+        return tuple(obj.get(name) for name in names)
+    try:
+        return _GETTERS[names](obj)
+    except AttributeError:
+        return None
+
+
+def _member(value: Any, allowed: frozenset) -> bool:
+    try:
+        return value in allowed
+    except TypeError:  # unhashable
+        return False
+
+
+default_validator = SchemaValidator()
+
 
 def validate_step(step: Step) -> None:
     """Validate a Step object.
 
-    Ensures required fields are present and the adapter type is allowed.
-    Raises ValueError on invalid data.
+    Ensures required fields are present, the adapter type is allowed and the
+    args match the adapter's schema. Raises ValidationError on invalid data.
     """
-    if not step.step_id:
-        raise ValueError("step_id is required")
-    if not step.team:
-        raise ValueError("team is required")
-    if not isinstance(step.adapter, dict) or "type" not in step.adapter:
-        raise ValueError("adapter with a 'type' field is required")
-    adapter_type = step.adapter.get("type")
-    if adapter_type not in ALLOWED_ADAPTER_TYPES:
-        raise ValueError(f"Unknown adapter type: {adapter_type}")
+    errors = default_validator.step_errors(step)
+    if errors:
+        raise ValidationError(errors)
 
 
 def validate_plan(plan: Plan) -> None:
     """Validate a Plan object.
 
-    Checks for a plan_id, gates list, and at least one step; validates each step.
-    Raises ValueError on invalid data.
+    Checks for a plan_id, gates list, and at least one step; validates each
+    step and the dependency graph. Raises ValidationError listing every
+    problem found.
+    """
+    errors = default_validator.plan_errors(plan)
+    if errors:
+        raise ValidationError(errors)
+
+
+def validate_plans(plans: Iterable[Plan]) -> None:
+    """Validate many plans, raising one ValidationError for all of them.
+
+    Errors are prefixed with ``plans[i]: `` (the position in ``plans``).
     """
-    if not plan.plan_id:
-        raise ValueError("plan_id is required")
-    if not isinstance(plan.gates, list):
-        raise ValueError("gates must be a list")
-    if not isinstance(plan.steps, list) or len(plan.steps) == 0:
-        raise ValueError("steps must be a non-empty list")
-    for step in plan.steps:
-        validate_step(step)
+    errors: List[str] = []
+    for i, plan in enumerate(plans):
+        errors.extend(default_validator.plan_errors(plan, f"plans[{i}]: "))
+    if errors:
+        raise ValidationError(errors)
+
+
+_DONE = object()  # end of a step's dependencies in find_cycle
+
+
+def find_cycle(edges: Dict[str, Sequence[str]]) -> Optional[List[str]]:
+    """Return one dependency cycle as a list of step_ids, or None.
+
+    ``edges`` maps each step_id to the step_ids it depends on; ids that are
+    not keys are ignored. Iterative depth-first search, O(steps + edges).
+    """
+    state: Dict[str, int] = {}  # 1 = on the current path, 2 = finished
+    for root in edges:
+        if root in state:
+            continue
+        path = [root]
+        stack = [iter(edges[root])]
+        state[root] = 1
+        while stack:
+            dep = next(stack[-1], _DONE)
+            if dep is _DONE:
+                state[path.pop()] = 2
+                stack.pop()
+            elif dep not in edges or state.get(dep) == 2:
+                continue
+            elif state.get(dep) == 1:
+                return path[path.index(dep):] + [dep]
+            else:
+                state[dep] = 1
+                path.append(dep)
+                stack.append(iter(edges[dep]))
+    return None
+
+
+def dependency_errors(edges: Dict[str, Sequence[str]]) -> List[str]:
+    """Unknown dependencies and (at most one) cycle in ``edges``."""
+    errors = [
+        f"Step {step_id} depends on unknown step {dep}"
+        for step_id, deps in edges.items()
+        for dep in deps
+        if dep not in edges
+    ]
+    cycle = find_cycle(edges)
+    if cycle is not None:
+        errors.append(f"Dependency cycle: {' -> '.join(cycle)}")
+    return errors
+
+
+def validate_dependencies(edges: Dict[str, Sequence[str]]) -> None:
+    """Check that every dependency names a step of the plan and that there are no cycles.
+
+    Raises ValidationError on invalid data.
+    """
+    errors = dependency_errors(edges)
+    if errors:
+        raise ValidationError(errors)
 
 
 def validate_step_result(step_result: StepResult) -> None:
     """Validate a StepResult object.
 
     Ensures the step_id and status are present and valid.
-    Raises ValueError on invalid data.
+    Raises ValidationError on invalid data.
+    """
+    errors = default_validator.result_errors(step_result)
+    if errors:
+        raise ValidationError(errors)
+
+
+def validate_step_results(results: Iterable[StepResult]) -> None:
+    """Validate many step results, raising one ValidationError for all of them.
+
+    Errors are prefixed with ``results[i]: ``.
     """
-    if not step_result.step_id:
-        raise ValueError("step_id is required in StepResult")
-    if step_result.status not in ALLOWED_STATUSES:
-        raise ValueError(f"Invalid status: {step_result.status}")
\ No newline at end of file
+    errors: List[str] = []
+    for i, step_result in enumerate(results):
+        errors.extend(default_validator.result_errors(step_result, f"results[{i}]: "))
+    if errors:
+        raise ValidationError(errors)
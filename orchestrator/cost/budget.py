@@ -0,0 +1,249 @@
+"""In-memory token budget with nested buckets.
+
+All budget limits come from ``config/budget.toml``. ``BudgetEngine`` holds one
+bucket per level of a step's path:
+
+    daily -> project -> task -> adapter
+
+Each bucket has a cap (``None`` for no cap at that level), the tokens already
+used today and the tokens reserved by steps that are dispatched but not
+finished. ``reserve`` admits a step only if every bucket on its path has
+room (an idle bucket takes one step of any size), and books the tokens on all of them in one go under a lock, so several
+dispatch loops can admit steps concurrently without over-committing.
+``try_reserve`` also reports which bucket refused a step, and its room, so
+callers can tell a full day from a full task, project or adapter.
+``commit`` swaps a reservation for the tokens actually used and ``release``
+returns it unused. Each operation touches one bucket per level, O(depth).
+
+The daily bucket's usage is read from ``daily_usage`` (normally the ledger's
+``totals_today``, which is answered from shared counters), so entries other
+processes write still count. Lower buckets count what was committed through
+the engine, seeded per task from the ledger with ``seed_tasks``. Usage resets
+when the UTC date changes; reservations still in flight carry over.
+
+Tokens set aside for today by scheduled budget windows (``held``, normally
+the scheduler's ``reserved_on`` for today) are not available to other work:
+``reserve`` counts them against the daily bucket until the window's job
+fires and its steps are queued.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import tomllib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+BUDGET_CONFIG = os.path.join("config", "budget.toml")
+
+
+@dataclass
+class BudgetConfig:
+    """The ``[limits]`` table of the budget config."""
+
+    daily_tokens: int = 25000
+    per_task_tokens: int = 8000
+    per_project_tokens: Optional[int] = None
+    adapter_tokens: Dict[str, int] = field(default_factory=dict)
+    warn_ratio: float = 0.8
+    stop_ratio: float = 0.9  # share of daily_tokens after which dispatch stops
+
+
+def load_budget_config(path: str = BUDGET_CONFIG) -> BudgetConfig:
+    """Read budget limits from ``path``; missing keys keep their defaults."""
+    config = BudgetConfig()
+    if not os.path.exists(path):
+        return config
+    with open(path, "rb") as f:
+        limits = tomllib.load(f).get("limits", {})
+    for key in ("daily_tokens", "per_task_tokens", "per_project_tokens"):
+        if limits.get(key):
+            setattr(config, key, int(limits[key]))
+    for key in ("warn_ratio", "stop_ratio"):
+        if key in limits:
+            setattr(config, key, float(limits[key]))
+    config.adapter_tokens = {name: int(cap) for name, cap in limits.get("adapters", {}).items()}
+    return config
+
+
+class _Bucket:
+    __slots__ = ("limit", "used", "reserved")
+
+    def __init__(self, limit: Optional[int]) -> None:
+        self.limit = limit
+        self.used = 0
+        self.reserved = 0
+
+    def room(self) -> Optional[int]:
+        return None if self.limit is None else self.limit - self.used - self.reserved
+
+
+@dataclass(frozen=True)
+class Reservation:
+    tokens: int
+    keys: Tuple[Tuple[str, str], ...]  # (level, name) below the daily bucket
+
+
+@dataclass(frozen=True)
+class Refusal:
+    """The first bucket on a step's path without room for it."""
+
+    level: str  # "daily", "project", "task" or "adapter"
+    name: Optional[str]  # None for the daily bucket
+    room: int  # tokens it has left (may be negative)
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class BudgetEngine:
+    """Nested daily/project/task/adapter token buckets."""
+
+    def __init__(
+        self,
+        config: Optional[BudgetConfig] = None,
+        daily_usage: Optional[Callable[[], int]] = None,
+        held: Optional[Callable[[], int]] = None,
+    ):
+        self.config = config or BudgetConfig()
+        self.daily_usage = daily_usage
+        self.held = held
+        self._daily = _Bucket(int(self.config.daily_tokens * self.config.stop_ratio))
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._day = _utc_today()
+        self._lock = threading.Lock()
+
+    def reserve(
+        self,
+        tokens: int,
+        project: Optional[str] = None,
+        task: Optional[str] = None,
+        adapter: Optional[str] = None,
+    ) -> Optional[Reservation]:
+        """Book ``tokens`` on every bucket of the path, or return None if one is full."""
+        return self.try_reserve(tokens, project, task, adapter)[0]
+
+    def try_reserve(
+        self,
+        tokens: int,
+        project: Optional[str] = None,
+        task: Optional[str] = None,
+        adapter: Optional[str] = None,
+    ) -> Tuple[Optional[Reservation], Optional[Refusal]]:
+        """Like ``reserve``, returning ``(reservation, None)`` or ``(None, refusal)``."""
+        # Read outside the lock: the scheduler may hold its own lock while it
+        # checks the budget
+        held = self.held() if self.held is not None else 0
+        with self._lock:
+            self._roll()
+            self._sync_daily()
+            keys = tuple(
+                (level, name)
+                for level, name in (("project", project), ("task", task), ("adapter", adapter))
+                if name is not None
+            )
+            path = [(("daily", None), self._daily)] + [(key, self._bucket(key)) for key in keys]
+            for (level, name), bucket in path:
+                room = bucket.room()
+                busy = bucket.used or bucket.reserved
+                if bucket is self._daily and room is not None:
+                    room -= held
+                    busy = busy or held
+                # An idle bucket admits one oversized step rather than none ever
+                if room is not None and tokens > room and busy:
+                    return None, Refusal(level, name, room)
+            for _, bucket in path:
+                bucket.reserved += tokens
+            return Reservation(tokens, keys), None
+
+    def commit(self, reservation: Reservation, tokens: Optional[int] = None) -> None:
+        """Replace a reservation with the tokens actually used (default: as reserved).
+
+        Record the usage in the ledger before committing, so the daily bucket
+        never under-counts.
+        """
+        used = reservation.tokens if tokens is None else tokens
+        with self._lock:
+            self._roll()
+            for bucket in self._path(reservation):
+                bucket.reserved -= reservation.tokens
+                bucket.used += used
+            if self.daily_usage is not None:
+                self._sync_daily()
+
+    def release(self, reservation: Reservation) -> None:
+        """Give back a reservation that was not used."""
+        with self._lock:
+            for bucket in self._path(reservation):
+                bucket.reserved -= reservation.tokens
+
+    def seed_tasks(self, used_by_task: Dict[str, int]) -> None:
+        """Set today's usage of task buckets, e.g. from ``CostLedger.totals_by_task``."""
+        with self._lock:
+            self._roll()
+            for task, used in used_by_task.items():
+                self._bucket(("task", task)).used = used
+
+    def task_usage(self) -> Dict[str, int]:
+        """Tokens used or reserved today per task bucket."""
+        with self._lock:
+            self._roll()
+            return {name: b.used + b.reserved for (level, name), b in self._buckets.items() if level == "task"}
+
+    def used_today(self) -> int:
+        """Tokens used today plus tokens reserved by steps still in flight."""
+        with self._lock:
+            self._roll()
+            self._sync_daily()
+            return self._daily.used + self._daily.reserved
+
+    def remaining(self) -> int:
+        """Tokens left under the full daily cap (ignoring the stop ratio)."""
+        return self.config.daily_tokens - self.used_today()
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[int]]]:
+        """Limits, usage and reservations per bucket, keyed ``daily`` or ``level:name``."""
+        with self._lock:
+            self._sync_daily()
+            items: List[Tuple[str, _Bucket]] = [("daily", self._daily)]
+            items += [(f"{level}:{name}", bucket) for (level, name), bucket in self._buckets.items()]
+            return {
+                key: {"limit": bucket.limit, "used": bucket.used, "reserved": bucket.reserved}
+                for key, bucket in items
+            }
+
+    def _bucket(self, key: Tuple[str, str]) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            level, name = key
+            if level == "project":
+                limit = self.config.per_project_tokens
+            elif level == "task":
+                limit = self.config.per_task_tokens
+            else:
+                limit = self.config.adapter_tokens.get(name)
+            bucket = self._buckets[key] = _Bucket(limit)
+        return bucket
+
+    def _path(self, reservation: Reservation) -> List[_Bucket]:
+        return [self._daily] + [self._bucket(key) for key in reservation.keys]
+
+    def _sync_daily(self) -> None:
+        if self.daily_usage is not None:
+            self._daily.used = self.daily_usage()
+
+    def _roll(self) -> None:
+        """Start a new day: zero usage, keep in-flight reservations. Caller holds the lock."""
+        today = _utc_today()
+        if today == self._day:
+            return
+        self._day = today
+        self._daily.used = 0
+        for key in [key for key, bucket in self._buckets.items() if not bucket.reserved]:
+            del self._buckets[key]
+        for bucket in self._buckets.values():
+            bucket.used = 0
@@ -0,0 +1,185 @@
+"""Token estimates learned from what steps actually cost.
+
+Runners report the tokens each step used in the result's ``cost`` field and
+the orchestrator records them in the ledger together with the step's adapter
+type and action. ``TokenEstimator`` keeps streaming statistics per
+``(adapter, action)`` and per adapter:
+
+* an exponentially weighted moving average, the expected cost of the next
+  step, used for dispatch admission so typical steps are not parked on a
+  worst-case guess;
+* a high percentile (p95 by default) over a window of recent samples, used
+  where a step must not be under-budgeted (plan estimates, downscoping and
+  ``budget_tokens``).
+
+Until a key has ``min_samples`` observations the estimator falls back to the
+adapter-level statistics and then to the static ``defaults`` table.
+Entries the ledger marks as ``estimated`` were never measured and are not
+learned from.
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .ledger import CostLedger
+
+
+EWMA_ALPHA = 0.2  # weight of the newest sample
+PERCENTILE = 0.95
+WINDOW = 200  # recent samples kept per key for the percentile
+MIN_SAMPLES = 5  # observations before a key's own statistics are trusted
+HISTORY_DAYS = 14  # ledger history replayed on load
+FALLBACK_TOKENS = 300  # for adapters missing from the defaults table
+
+Key = Tuple[Optional[str], Optional[str]]
+
+
+def step_kind(step: Any) -> Key:
+    """Return ``(adapter type, action)`` for a ``Step`` or a step dict."""
+    if isinstance(step, dict):
+        adapter, args = step.get("adapter"), step.get("args")
+    else:
+        adapter, args = getattr(step, "adapter", None), getattr(step, "args", None)
+    adapter_type = adapter.get("type") if isinstance(adapter, dict) else None
+    action = args.get("action") if isinstance(args, dict) else None
+    return adapter_type, action
+
+
+class _Stats:
+    __slots__ = ("count", "ewma", "recent", "_upper")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.ewma = 0.0
+        self.recent: Deque[int] = deque(maxlen=WINDOW)
+        self._upper: Optional[int] = None
+
+    def __copy__(self) -> "_Stats":
+        # The sample window is copied too, so the copies learn independently
+        stats = _Stats()
+        stats.count, stats.ewma, stats._upper = self.count, self.ewma, self._upper
+        stats.recent.extend(self.recent)
+        return stats
+
+    def add(self, tokens: int, alpha: float) -> None:
+        self.ewma = float(tokens) if self.count == 0 else alpha * tokens + (1 - alpha) * self.ewma
+        self.count += 1
+        self.recent.append(tokens)
+        self._upper = None
+
+    def upper(self, percentile: float) -> int:
+        # Sorted lazily: estimates are read far less often than learned
+        if self._upper is None:
+            ordered = sorted(self.recent)
+            self._upper = ordered[min(len(ordered) - 1, math.ceil(percentile * len(ordered)) - 1)]
+        return self._upper
+
+
+class TokenEstimator:
+    """Per-(adapter, action) token statistics with static fallbacks."""
+
+    def __init__(
+        self,
+        defaults: Optional[Dict[str, int]] = None,
+        alpha: float = EWMA_ALPHA,
+        percentile: float = PERCENTILE,
+        min_samples: int = MIN_SAMPLES,
+    ):
+        self.defaults = dict(defaults or {})
+        self.alpha = alpha
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._stats: Dict[Key, _Stats] = {}
+        self._lock = threading.Lock()
+        self.version = 0  # bumped on every observation; lets callers cache estimates
+
+    def observe(self, adapter: Optional[str], action: Optional[str], tokens: int) -> None:
+        """Learn from one measured step."""
+        with self._lock:
+            keys = [(adapter, None)] if action is None else [(adapter, action), (adapter, None)]
+            for key in keys:
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = _Stats()
+                stats.add(int(tokens), self.alpha)
+            self.version += 1
+
+    def expected(self, adapter: Optional[str], action: Optional[str] = None) -> int:
+        """Typical cost of the next step (EWMA)."""
+        with self._lock:
+            stats = self._trusted(adapter, action)
+            if stats is None:
+                return self._default(adapter)
+            return int(math.ceil(stats.ewma))
+
+    def upper(self, adapter: Optional[str], action: Optional[str] = None) -> int:
+        """Cost the next step stays under with high probability (percentile)."""
+        with self._lock:
+            stats = self._trusted(adapter, action)
+            if stats is None:
+                return self._default(adapter)
+            # Never below the mean: the window can lag a recent jump
+            return max(stats.upper(self.percentile), int(math.ceil(stats.ewma)))
+
+    def load(self, ledger: CostLedger, days: int = HISTORY_DAYS) -> int:
+        """Replay measured entries from the last ``days`` of ``ledger``.
+
+        Returns the number of entries learned from.
+        """
+        end = datetime.now(timezone.utc).date()
+        start = end - timedelta(days=days)
+        learned = 0
+        for record in ledger.iter_entries(start, end):
+            if record.get("estimated") or not record.get("adapter"):
+                continue
+            tokens = record.get("in_tokens", 0) + record.get("out_tokens", 0)
+            self.observe(record["adapter"], record.get("action"), tokens)
+            learned += 1
+        return learned
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current statistics keyed by ``adapter`` or ``adapter/action``."""
+        with self._lock:
+            return {
+                (adapter or "") + (f"/{action}" if action else ""): {
+                    "samples": stats.count,
+                    "ewma": round(stats.ewma, 1),
+                    "upper": stats.upper(self.percentile),
+                }
+                for (adapter, action), stats in self._stats.items()
+            }
+
+    def assign(self, other: "TokenEstimator") -> None:
+        """Take over the settings and statistics of ``other`` (e.g. a copy sent to a worker process)."""
+        with self._lock:
+            self.defaults = dict(other.defaults)
+            self.alpha, self.percentile, self.min_samples = other.alpha, other.percentile, other.min_samples
+            self._stats = {key: copy.copy(stats) for key, stats in other._stats.items()}
+            self.version += 1
+
+    def __getstate__(self) -> Dict[str, Any]:
+        with self._lock:
+            state = dict(self.__dict__)
+            state["_stats"] = {key: copy.copy(stats) for key, stats in self._stats.items()}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _trusted(self, adapter: Optional[str], action: Optional[str]) -> Optional[_Stats]:
+        for key in ((adapter, action), (adapter, None)):
+            stats = self._stats.get(key)
+            if stats is not None and stats.count >= self.min_samples:
+                return stats
+        return None
+
+    def _default(self, adapter: Optional[str]) -> int:
+        return self.defaults.get(adapter, FALLBACK_TOKENS)
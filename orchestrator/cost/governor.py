@@ -1,16 +1,23 @@
 """Cost governor and plan estimation utilities.
 
 This module estimates token usage for plans and steps, checks against
-configured caps, and downsizes plans when necessary.
+configured caps, and downsizes plans when necessary. Step estimates come from
+``default_estimator``, which starts from ``DEFAULT_STEP_TOKENS`` and learns
+from the tokens runners report (see ``estimator``). Work that does not fit
+today's budget is split into future budget windows by ``plan_budget_windows``.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Dict, Any, List, Tuple
-from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set, Tuple
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import reduce
+from math import gcd
 
 from ..core.models import Plan, Step
+from ..scheduler import QUIET_END_HOUR, QUIET_START_HOUR
+from .estimator import TokenEstimator, step_kind
 
 
 DEFAULT_STEP_TOKENS: Dict[str, int] = {
@@ -26,6 +33,9 @@ DEFAULT_STEP_TOKENS: Dict[str, int] = {
     "docs": 150,
 }
 
+# Shared by the planner, the governor and dispatch admission
+default_estimator = TokenEstimator(DEFAULT_STEP_TOKENS)
+
 
 @dataclass
 class PlanEstimate:
@@ -33,38 +43,246 @@ class PlanEstimate:
     step_tokens: Dict[str, int]
 
 
-def estimate_step_tokens(step: Step) -> int:
-    """Estimate tokens for a single step based on adapter type."""
-    adapter_type = step.adapter.get("type") if isinstance(step.adapter, dict) else None
-    return DEFAULT_STEP_TOKENS.get(adapter_type, 300)
+def estimate_step_tokens(step: Step, estimator: Optional[TokenEstimator] = None) -> int:
+    """Estimate tokens for a single step based on adapter type and action.
+
+    Uses the estimator's high percentile so expensive steps are not
+    under-budgeted.
+    """
+    return (estimator or default_estimator).upper(*step_kind(step))
 
 
-def estimate_plan(plan: Plan) -> PlanEstimate:
+def estimate_plan(plan: Plan, estimator: Optional[TokenEstimator] = None) -> PlanEstimate:
     """Return token estimate for an entire plan."""
     totals = {}
     total = 0
     for step in plan.steps:
-        est = estimate_step_tokens(step)
+        est = estimate_step_tokens(step, estimator)
         totals[step.step_id] = est
         total += est
     return PlanEstimate(total_tokens=total, step_tokens=totals)
 
 
-def downscope_plan(plan: Plan, token_cap: int) -> Plan:
+def downscope_plan(plan: Plan, token_cap: int, estimator: Optional[TokenEstimator] = None) -> Plan:
     """Downscope a plan to fit within the per-task token cap.
 
-    Steps beyond the cap are removed. At least one step remains.
+    Keeps the subset of steps with the most value that fits under the cap,
+    where a step is worth ``1 + max(priority, 0)``. A step is only kept
+    together with the steps it ``depends_on``. When every step has at most
+    one dependency inside the plan the result is optimal (0/1 knapsack, or
+    tree knapsack with dependencies), solved by dynamic programming over
+    token costs scaled by their common divisor. Plans whose table would
+    exceed ``DP_MAX_CELLS``, or whose dependencies are not a forest, use a
+    greedy pass by value per token instead. Steps keep their original
+    order. At least one step remains.
     """
-    est = estimate_plan(plan)
-    running_total = 0
-    new_steps: List[Step] = []
-    for step in plan.steps:
-        step_tokens = est.step_tokens.get(step.step_id, 0)
-        if running_total + step_tokens > token_cap:
-            break
-        new_steps.append(step)
-        running_total += step_tokens
-    if not new_steps:
+    est = estimate_plan(plan, estimator)
+    steps = plan.steps
+    costs = [est.step_tokens.get(step.step_id, 0) for step in steps]
+    values = [1 + max(step.priority, 0) for step in steps]
+    deps = _dependencies(steps)
+    keep = _solve_forest(costs, values, deps, token_cap)
+    if keep is None:
+        keep = _solve_greedy(costs, values, deps, token_cap)
+    if not keep:
         # Always keep at least one step to avoid empty plan
-        new_steps.append(plan.steps[0])
-    return Plan(plan_id=plan.plan_id, gates=plan.gates, steps=new_steps)
\ No newline at end of file
+        keep = {next((i for i, parents in enumerate(deps) if not parents), 0)}
+    new_steps = [step for i, step in enumerate(steps) if i in keep]
+    return Plan(plan_id=plan.plan_id, gates=plan.gates, steps=new_steps)
+
+
+# Largest DP table (steps x scaled token budget) solved exactly
+DP_MAX_CELLS = 4_000_000
+
+
+def _dependencies(steps: List[Step]) -> List[List[int]]:
+    """Indexes of each step's dependencies; ids outside the plan are ignored."""
+    index = {step.step_id: i for i, step in enumerate(steps)}
+    return [
+        sorted({index[dep] for dep in step.depends_on if dep in index and index[dep] != i})
+        for i, step in enumerate(steps)
+    ]
+
+
+def _solve_forest(costs: List[int], values: List[int], deps: List[List[int]], cap: int) -> Optional[Set[int]]:
+    """Exact selection when each step depends on at most one other step.
+
+    Steps are laid out in depth-first preorder of the dependency forest, so a
+    subtree occupies a contiguous run ending at ``after[i]``. Then
+    ``best[i][c]`` (most value from positions ``i..`` within ``c``) either
+    skips position ``i`` and its whole subtree or takes it and continues at
+    ``i + 1``. Returns None when the problem does not fit that shape or size.
+    """
+    n = len(costs)
+    if any(len(parents) > 1 for parents in deps) or cap < 0:
+        return None
+    scale = reduce(gcd, costs, 0) or 1
+    capacity = cap // scale
+    if (n + 1) * (capacity + 1) > DP_MAX_CELLS:
+        return None
+    children: List[List[int]] = [[] for _ in range(n)]
+    for i, parents in enumerate(deps):
+        if parents:
+            children[parents[0]].append(i)
+    order: List[int] = []  # preorder position -> step index
+    after: List[int] = []  # preorder position -> first position past its subtree
+    for root in (i for i in range(n) if not deps[i]):
+        stack = [(root, -1)]
+        while stack:
+            node, pos = stack.pop()
+            if pos >= 0:
+                after[pos] = len(order)
+                continue
+            stack.append((node, len(order)))
+            order.append(node)
+            after.append(0)
+            stack.extend((child, -1) for child in reversed(children[node]))
+    if len(order) < n:
+        return None  # a dependency cycle; nothing in it has a root
+    weights = [costs[node] // scale for node in order]
+    best: List[List[int]] = [[]] * (n + 1)
+    best[n] = [0] * (capacity + 1)
+    for i in range(n - 1, -1, -1):
+        skip, rest = best[after[i]], best[i + 1]
+        w, v = weights[i], values[order[i]]
+        if w > capacity:
+            best[i] = skip
+            continue
+        best[i] = skip[:w] + [max(a, b + v) for a, b in zip(skip[w:], rest)]
+    keep: Set[int] = set()
+    i, c = 0, capacity
+    while i < n:
+        if best[i][c] == best[after[i]][c]:
+            i = after[i]  # skipping is as good; prefer fewer tokens
+        else:
+            keep.add(order[i])
+            c -= weights[i]
+            i += 1
+    return keep
+
+
+def _solve_greedy(costs: List[int], values: List[int], deps: List[List[int]], cap: int) -> Set[int]:
+    """Take steps by value per token of their dependency closure while they fit."""
+    n = len(costs)
+
+    def closure(i: int, exclude: Set[int]) -> Set[int]:
+        found: Set[int] = set()
+        stack = [i]
+        while stack:
+            node = stack.pop()
+            if node in found or node in exclude:
+                continue
+            found.add(node)
+            stack.extend(deps[node])
+        return found
+
+    def ratio(i: int) -> float:
+        members = closure(i, set())
+        cost = sum(costs[m] for m in members)
+        return sum(values[m] for m in members) / cost if cost else float("inf")
+
+    keep: Set[int] = set()
+    remaining = cap
+    for i in sorted(range(n), key=lambda i: (-ratio(i), i)):
+        if i in keep:
+            continue
+        members = closure(i, keep)
+        cost = sum(costs[m] for m in members)
+        if cost <= remaining:
+            keep |= members
+            remaining -= cost
+    return keep
+
+
+@dataclass
+class BudgetWindow:
+    """Steps to run from ``start``, with the tokens reserved for them on ``day``."""
+
+    start: datetime
+    day: date
+    indexes: List[int] = field(default_factory=list)
+    tokens: int = 0
+
+
+def plan_budget_windows(
+    step_tokens: List[int],
+    now: datetime,
+    daily_cap: int,
+    per_task_cap: int,
+    used_today: int = 0,
+    reserved: Optional[Dict[date, int]] = None,
+    max_days: int = 366,
+    tasks: Optional[List[Optional[str]]] = None,
+    task_used: Optional[Dict[str, int]] = None,
+    quiet_tz: Optional[tzinfo] = None,
+    room_today: Optional[int] = None,
+) -> List[BudgetWindow]:
+    """Split steps, in order, into the earliest budget windows they fit.
+
+    Days are budget days: UTC dates, as for ``BudgetEngine`` and the ledger
+    (a naive ``now`` is taken as UTC). Window 0 opens ``now`` with whatever
+    is left of today's cap after ``used_today``; later windows open when
+    each following day starts with the full daily cap. A window that would
+    open inside quiet hours, which are local to ``quiet_tz`` (default: the
+    system's local time), opens when they end. Tokens already ``reserved``
+    for a day by earlier spillover are not available.
+
+    ``tasks`` names each step's task (None: the step has no task cap). A
+    task gets at most ``per_task_cap`` per day, counting ``task_used`` (its
+    usage so far) on today's window; without ``tasks`` all steps count as
+    one task. ``room_today`` further caps today's window: pass the room left
+    in the bucket that refused the first step, so that a full task, project
+    or adapter bucket moves the steps to the next day even when the daily
+    cap has room. Order is kept so dependencies still run first. A step larger
+    than any window gets a window to itself. Raises ValueError if the steps
+    do not fit in ``max_days`` days.
+    """
+    reserved = reserved or {}
+    if tasks is None:
+        tasks = [""] * len(step_tokens)
+    now = now.astimezone(timezone.utc) if now.tzinfo else now.replace(tzinfo=timezone.utc)
+    today = now.date()
+    windows: List[BudgetWindow] = []
+    window = _budget_window(now, quiet_tz)
+    room = daily_cap - reserved.get(window.day, 0)
+    used: Dict[str, int] = {}
+    if window.day == today:
+        room -= used_today
+        if room_today is not None:
+            room = min(room, room_today)
+        used = dict(task_used or {})
+    for i, tokens in enumerate(step_tokens):
+        task = tasks[i]
+        while True:
+            fits = room if task is None else min(room, per_task_cap - used.get(task, 0))
+            if tokens <= fits:
+                break
+            # A step that could never fit better than in an empty window
+            # with the full caps gets this one to itself
+            full = daily_cap if task is None else min(daily_cap, per_task_cap)
+            if not window.indexes and fits >= full:
+                break
+            if window.indexes:
+                windows.append(window)
+            day = window.day + timedelta(days=1)
+            if (day - today).days > max_days:
+                raise ValueError(f"steps do not fit in the next {max_days} budget windows")
+            window = _budget_window(datetime.combine(day, time(), timezone.utc), quiet_tz)
+            room = daily_cap - reserved.get(window.day, 0)
+            used = {}
+        window.indexes.append(i)
+        window.tokens += tokens
+        room -= tokens
+        if task is not None:
+            used[task] = used.get(task, 0) + tokens
+    if window.indexes:
+        windows.append(window)
+    return windows
+
+
+def _budget_window(at: datetime, quiet_tz: Optional[tzinfo]) -> BudgetWindow:
+    """An empty window opening at ``at`` or, inside quiet hours, when they end."""
+    local = at.astimezone(quiet_tz)
+    if QUIET_START_HOUR <= local.hour < QUIET_END_HOUR:
+        local = local.replace(hour=QUIET_END_HOUR, minute=0, second=0, microsecond=0)
+    return BudgetWindow(local, local.astimezone(timezone.utc).date())
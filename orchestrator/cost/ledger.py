@@ -1,16 +1,68 @@
 """Cost ledger for recording token and dollar usage.
 
 Writes entries to a JSONL file and provides aggregated totals for the current day.
+
+Per-day totals are kept in memory. The file is scanned once when the ledger is
+created; after that only bytes appended since the last read are folded in, so
+``totals_today`` costs a ``stat`` call rather than a full re-read. Appends made
+by other ``CostLedger`` instances (or processes) on the same file are picked up
+the same way, and a truncated or replaced file triggers a rebuild.
+
+Storage is partitioned by UTC day. ``ledger_path`` is the active segment and
+only holds days that are still open. Once a day has passed, ``rotate`` moves
+its entries into ``<ledger>.d/YYYY-MM-DD.jsonl.gz`` and records a summary
+(totals overall, per task_id and per project) in ``<ledger>.d/index.json``. Rotation runs
+on construction and on the first append of each new day, and a rotation cut
+short by a crash is completed (or undone) there too. Range queries answer
+totals from the summaries without opening any segment; only entry-level
+queries (``entries_for_step``) decompress segments, and only those inside the
+requested date range.
+
+Appends can be group-committed. With ``durability="write"`` (the default)
+every ``append`` is written to the file before it returns. With ``"group"``
+entries are buffered and written together once ``flush_entries`` are pending
+or ``flush_interval`` seconds after the first buffered entry, whichever comes
+first; ``"fsync"`` does the same and also fsyncs each commit. Buffered entries
+are counted by the totals of the instance that holds them straight away, and
+are written out on ``flush``, ``close``, interpreter exit and before reads
+that go to disk. Other instances see them once they are committed.
+
+Several processes (the service and the scheduler, say) can share one ledger.
+Commits and rotation hold an exclusive ``flock`` on ``<ledger>.d/lock``, so
+lines from different writers never interleave. After each commit the writer
+publishes today's totals, together with the size and identity of the active
+file they cover, to ``<ledger>.d/counters``, a small memory-mapped file.
+``totals_today`` reads those counters and only falls back to folding the file
+when they do not match it (another day, a rotated or deleted file, or a
+writer that died between writing and publishing). Locking needs ``fcntl``;
+without it (Windows) the ledger still works but is only safe for one process.
 """
 
+import atexit
+import gzip
 import json
+import mmap
 import os
-from dataclasses import dataclass, asdict
-from datetime import datetime, timezone
-from typing import Dict, Any
+import struct
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 
 LEDGER_PATH = os.path.join("memory", "cost_ledger.jsonl")
+DURABILITY_LEVELS = ("write", "group", "fsync")
+FLUSH_ENTRIES = 256  # buffered entries that force a commit
+FLUSH_INTERVAL = 0.05  # seconds a buffered entry may wait for its commit
+
+# generation, day ordinal, st_dev, st_ino, bytes covered, in_tokens, out_tokens, usd
+_COUNTERS = struct.Struct("<Qqqqqqqd")
 
 
 @dataclass
@@ -21,16 +73,158 @@ class LedgerEntry:
     out_tokens: int
     usd: float
     ts: str  # ISO timestamp
+    adapter: Optional[str] = None
+    action: Optional[str] = None
+    estimated: bool = False  # tokens were the dispatch estimate, not measured
+    project: Optional[str] = None
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"in_tokens": 0, "out_tokens": 0, "usd": 0.0}
+
+
+def _empty_summary() -> Dict[str, Any]:
+    summary = _empty_totals()
+    summary["entries"] = 0
+    summary["tasks"] = {}
+    summary["projects"] = {}
+    return summary
+
+
+def _add(totals: Dict[str, Any], record: Dict[str, Any]) -> None:
+    totals["in_tokens"] += record.get("in_tokens", 0)
+    totals["out_tokens"] += record.get("out_tokens", 0)
+    totals["usd"] += record.get("usd", 0.0)
+
+
+def _add_to_summary(summary: Dict[str, Any], record: Dict[str, Any]) -> None:
+    _add(summary, record)
+    summary["entries"] += 1
+    task_id = str(record.get("task_id", ""))
+    task = summary["tasks"].get(task_id)
+    if task is None:
+        task = summary["tasks"][task_id] = _empty_totals()
+    _add(task, record)
+    project_name = record.get("project")
+    if project_name is not None:
+        # Summaries written before projects were recorded have no such map
+        projects = summary.setdefault("projects", {})
+        project = projects.get(project_name)
+        if project is None:
+            project = projects[project_name] = _empty_totals()
+        _add(project, record)
+
+
+def _record_day(record: Dict[str, Any], default: date) -> Optional[date]:
+    ts = record.get("ts")
+    if not ts:
+        return default
+    try:
+        return datetime.fromisoformat(ts).astimezone(timezone.utc).date()
+    except ValueError:
+        return None
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class _SharedCounters:
+    """Today's totals for the active file, shared between processes.
+
+    Writers hold the ledger's file lock. Readers don't lock: the generation
+    is odd while a write is in progress and changes with every write, so a
+    reader retries until it sees the same even generation on both sides.
+    """
+
+    def __init__(self, path: str):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _COUNTERS.size:
+                os.ftruncate(fd, _COUNTERS.size)
+            self._map = mmap.mmap(fd, _COUNTERS.size)
+        finally:
+            os.close(fd)
+
+    def read(self) -> Optional[Tuple[Any, ...]]:
+        for _ in range(100):
+            values = _COUNTERS.unpack_from(self._map)
+            generation = values[0]
+            if generation % 2 == 0 and _COUNTERS.unpack_from(self._map)[0] == generation:
+                return values[1:]
+        return None
+
+    def write(self, day: date, file_id: Optional[Tuple[int, int]], offset: int, totals: Dict[str, Any]) -> None:
+        generation = _COUNTERS.unpack_from(self._map)[0] | 1
+        dev, ino = file_id or (0, 0)
+        _COUNTERS.pack_into(
+            self._map, 0, generation, day.toordinal(), dev, ino, offset,
+            int(totals["in_tokens"]), int(totals["out_tokens"]), float(totals["usd"]),
+        )
+        struct.pack_into("<Q", self._map, 0, generation + 1)
 
 
 class CostLedger:
-    def __init__(self, ledger_path: str = LEDGER_PATH):
+    def __init__(
+        self,
+        ledger_path: str = LEDGER_PATH,
+        durability: str = "write",
+        flush_entries: int = FLUSH_ENTRIES,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {DURABILITY_LEVELS}, got {durability!r}")
         self.ledger_path = ledger_path
+        self.durability = durability
+        self.flush_entries = flush_entries
+        self.flush_interval = flush_interval
+        self.segments_dir = os.path.splitext(ledger_path)[0] + ".d"
+        self.index_path = os.path.join(self.segments_dir, "index.json")
+        self.lock_path = os.path.join(self.segments_dir, "lock")
+        self.counters_path = os.path.join(self.segments_dir, "counters")
+        self.manifest_path = os.path.join(self.segments_dir, "rotation.json")
         # Ensure directory exists
         os.makedirs(os.path.dirname(ledger_path), exist_ok=True)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self._lock_file = open(self.lock_path, "a+b")
+        self._counters = _SharedCounters(self.counters_path)
+        # Summaries of days still in the active file
+        self._daily: Dict[date, Dict[str, Any]] = {}
+        self._offset = 0  # bytes of the file already folded into _daily
+        self._file_id: Optional[Tuple[int, int]] = None
+        # Summaries of closed days, from index.json
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._index_mtime: Optional[float] = None
+        self._rotated_on: Optional[date] = None
+        # Entries appended but not yet committed, and their per-day summaries
+        self._pending: List[str] = []
+        self._pending_daily: Dict[date, Dict[str, Any]] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        with self._lock, self._file_lock():
+            self._rotate(_utc_today())
+            self._refresh()
+            self._publish()
+        if durability != "write":
+            atexit.register(self.flush)
+
+    def append(
+        self,
+        task_id: str,
+        step_id: str,
+        in_tokens: int,
+        out_tokens: int,
+        usd: float,
+        adapter: Optional[str] = None,
+        action: Optional[str] = None,
+        estimated: bool = False,
+        project: Optional[str] = None,
+    ) -> None:
+        """Append a new ledger entry as a JSONL line.
 
-    def append(self, task_id: str, step_id: str, in_tokens: int, out_tokens: int, usd: float) -> None:
-        """Append a new ledger entry as a JSONL line."""
+        Written before returning with ``durability="write"``; otherwise
+        buffered until the next group commit.
+        """
         entry = LedgerEntry(
             task_id=task_id,
             step_id=step_id,
@@ -38,35 +232,385 @@ class CostLedger:
             out_tokens=out_tokens,
             usd=usd,
             ts=datetime.now(timezone.utc).isoformat(),
+            adapter=adapter,
+            action=action,
+            estimated=estimated,
+            project=project,
         )
-        with open(self.ledger_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(asdict(entry)) + "\n")
+        record = dict(vars(entry))  # flat fields; cheaper than asdict's deep copy
+        with self._lock:
+            today = _utc_today()
+            if self._rotated_on != today:
+                self._commit()
+                with self._file_lock():
+                    self._rotate(today)
+                    self._refresh()
+                    self._publish()
+            self._pending.append(json.dumps(record) + "\n")
+            summary = self._pending_daily.get(today)
+            if summary is None:
+                summary = self._pending_daily[today] = _empty_summary()
+            _add_to_summary(summary, record)
+            if self.durability == "write" or len(self._pending) >= self.flush_entries:
+                self._commit()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Commit any buffered entries to the ledger file."""
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        """Flush buffered entries; the ledger stays usable afterwards."""
+        self.flush()
+        if self.durability != "write":
+            atexit.unregister(self.flush)
 
     def totals_today(self) -> Dict[str, Any]:
-        """Return aggregated token and USD totals for the current UTC date."""
-        totals = {
-            "in_tokens": 0,
-            "out_tokens": 0,
-            "usd": 0.0,
-        }
-        today = datetime.now(timezone.utc).date()
+        """Return aggregated token and USD totals for the current UTC date.
+
+        Answered from the shared counters when they describe the active file
+        as it is now, so appends from other processes are not re-read.
+        """
+        today = _utc_today()
+        totals = self._shared_totals(today)
+        if totals is None:
+            with self._lock, self._file_lock():
+                # Stale counters: fold the file and publish a fresh view
+                self._refresh()
+                self._publish()
+            return self.totals_for(today)
+        with self._lock:
+            pending = self._pending_daily.get(today)
+            if pending is not None:
+                _add(totals, pending)
+        return totals
+
+    def totals_for(self, day: date) -> Dict[str, Any]:
+        """Return aggregated totals for a UTC date."""
+        return self.totals_between(day, day)
+
+    def totals_between(
+        self, start: date, end: date, task_id: Optional[str] = None, project: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Return totals for the UTC dates ``start``..``end`` inclusive.
+
+        With ``task_id`` (or ``project``), only that task's (or project's)
+        entries are counted. Answered from per-day summaries; no segment is
+        read.
+        """
+        totals = _empty_totals()
+        for summary in self._summaries(start, end):
+            if task_id is not None:
+                part = summary["tasks"].get(task_id)
+            elif project is not None:
+                part = summary.get("projects", {}).get(project)
+            else:
+                part = summary
+            if part is not None:
+                _add(totals, part)
+        return totals
+
+    def totals_by_task(self, start: date, end: date) -> Dict[str, Dict[str, Any]]:
+        """Return per-task totals for the UTC dates ``start``..``end`` inclusive."""
+        by_task: Dict[str, Dict[str, Any]] = {}
+        for summary in self._summaries(start, end):
+            for task_id, task_totals in summary["tasks"].items():
+                totals = by_task.get(task_id)
+                if totals is None:
+                    totals = by_task[task_id] = _empty_totals()
+                _add(totals, task_totals)
+        return by_task
+
+    def entries_for_step(
+        self,
+        step_id: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        task_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the raw entries recorded for ``step_id``.
+
+        Only segments for days inside ``start``..``end`` (and, with ``task_id``,
+        only days on which that task recorded anything) are decompressed.
+        """
+        return [
+            record
+            for record in self._iter_entries(start, end, task_id)
+            if record.get("step_id") == step_id and (task_id is None or record.get("task_id") == task_id)
+        ]
+
+    def iter_entries(self, start: Optional[date] = None, end: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+        """Yield raw entries for the UTC dates ``start``..``end``, oldest segment first."""
+        return self._iter_entries(start, end, None)
+
+    def rotate(self) -> None:
+        """Move closed days out of the active file into compressed day segments."""
+        with self._lock:
+            self._commit()
+            with self._file_lock():
+                self._rotate(_utc_today())
+                self._refresh()
+                self._publish()
+
+    # ------------------------------------------------------------------
+    # Group commit
+
+    def _commit(self) -> None:
+        """Write buffered entries with a single ``write``. Caller holds the lock."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        with self._file_lock():
+            with open(self.ledger_path, "a", encoding="utf-8") as f:
+                f.write("".join(self._pending))
+                if self.durability == "fsync":
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._pending.clear()
+            self._pending_daily.clear()
+            # Folding reads back just the new lines (and any other writer's)
+            self._refresh()
+            self._publish()
+
+    # ------------------------------------------------------------------
+    # Cross-process coordination
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the exclusive advisory lock shared by every writer of the file."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _publish(self) -> None:
+        """Write today's folded totals to the shared counters. Caller holds both locks."""
+        today = _utc_today()
+        summary = self._daily.get(today) or _empty_totals()
+        self._counters.write(today, self._file_id, self._offset, summary)
+
+    def _shared_totals(self, today: date) -> Optional[Dict[str, Any]]:
+        """Today's committed totals from the shared counters, or None if stale."""
+        values = self._counters.read()
+        if values is None:
+            return None
+        day, dev, ino, offset, in_tokens, out_tokens, usd = values
+        if day != today.toordinal():
+            return None
+        try:
+            st = os.stat(self.ledger_path)
+        except FileNotFoundError:
+            return None
+        if (st.st_dev, st.st_ino) != (dev, ino) or st.st_size != offset:
+            return None
+        return {"in_tokens": in_tokens, "out_tokens": out_tokens, "usd": usd}
+
+    # ------------------------------------------------------------------
+    # Active file aggregation
+
+    def _refresh(self) -> None:
+        """Fold any bytes appended since the last call into the daily totals."""
+        try:
+            st = os.stat(self.ledger_path)
+        except FileNotFoundError:
+            self._reset(None)
+            return
+        file_id = (st.st_dev, st.st_ino)
+        if file_id != self._file_id or st.st_size < self._offset:
+            # New, replaced or truncated file: rebuild from the start
+            self._reset(file_id)
+        if st.st_size == self._offset:
+            return
+        with open(self.ledger_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        # Only consume complete lines; a partial line is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._fold(line)
+        self._offset += end
+
+    def _reset(self, file_id: Optional[Tuple[int, int]]) -> None:
+        self._daily.clear()
+        self._offset = 0
+        self._file_id = file_id
+
+    def _fold(self, line: bytes) -> None:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        day = _record_day(record, _utc_today())
+        if day is None:
+            return
+        summary = self._daily.get(day)
+        if summary is None:
+            summary = self._daily[day] = _empty_summary()
+        _add_to_summary(summary, record)
+
+    # ------------------------------------------------------------------
+    # Segments and index
+
+    def _segment_path(self, day: date) -> str:
+        return os.path.join(self.segments_dir, f"{day.isoformat()}.jsonl.gz")
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Return the closed-day index, re-reading it if another instance rotated."""
+        try:
+            mtime = os.stat(self.index_path).st_mtime
+        except FileNotFoundError:
+            self._index, self._index_mtime = {}, None
+            return self._index
+        if mtime != self._index_mtime:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._index = json.load(f)
+            self._index_mtime = mtime
+        return self._index
+
+    def _summaries(self, start: date, end: date) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            index = self._load_index()
+            active = dict(self._daily)
+            pending = dict(self._pending_daily)
+        day = start
+        while day <= end:
+            # A closed day can also have late entries not yet rotated
+            for summary in (index.get(day.isoformat()), active.get(day), pending.get(day)):
+                if summary is not None:
+                    yield summary
+            day += timedelta(days=1)
+
+    def _iter_entries(
+        self, start: Optional[date], end: Optional[date], task_id: Optional[str]
+    ) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            self._commit()
+            self._refresh()
+            index = self._load_index()
+        for key in sorted(index):
+            day = date.fromisoformat(key)
+            if (start is not None and day < start) or (end is not None and day > end):
+                continue
+            if task_id is not None and task_id not in index[key]["tasks"]:
+                continue
+            with gzip.open(self._segment_path(day), "rb") as f:
+                for line in f:
+                    yield json.loads(line)
         if not os.path.exists(self.ledger_path):
-            return totals
-        with open(self.ledger_path, "r", encoding="utf-8") as f:
+            return
+        today = _utc_today()
+        with open(self.ledger_path, "rb") as f:
             for line in f:
                 try:
-                    record = json.loads(line.strip())
+                    record = json.loads(line)
                 except json.JSONDecodeError:
                     continue
-                ts = record.get("ts")
-                if ts:
-                    try:
-                        dt = datetime.fromisoformat(ts).astimezone(timezone.utc)
-                    except ValueError:
-                        continue
-                    if dt.date() != today:
-                        continue
-                totals["in_tokens"] += record.get("in_tokens", 0)
-                totals["out_tokens"] += record.get("out_tokens", 0)
-                totals["usd"] += record.get("usd", 0.0)
-        return totals
\ No newline at end of file
+                day = _record_day(record, today)
+                if day is None or (start is not None and day < start) or (end is not None and day > end):
+                    continue
+                yield record
+
+    def _rotate(self, today: date) -> None:
+        """Move entries for days before ``today`` into their day segments.
+
+        The new segments, the new index and the rewritten active file are
+        first written next to their targets, and a manifest naming the new
+        active file is saved. Replacing the active file is the commit point:
+        a crash before it leaves the old files in place, and one after it is
+        rolled forward by ``_recover`` on the next rotation, so a day is
+        never counted both from a segment and from the active file. Caller
+        holds the lock.
+        """
+        self._rotated_on = today
+        self._recover()
+        if not os.path.exists(self.ledger_path):
+            return
+        with open(self.ledger_path, "rb") as f:
+            data = f.read()
+        keep: List[bytes] = []
+        closed: Dict[date, List[bytes]] = {}
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                keep.append(line)  # partial write; leave it for the writer
+                continue
+            try:
+                day = _record_day(json.loads(line), today)
+            except json.JSONDecodeError:
+                day = None
+            if day is None or day >= today:
+                keep.append(line)
+            else:
+                closed.setdefault(day, []).append(line)
+        if not closed:
+            return
+        os.makedirs(self.segments_dir, exist_ok=True)
+        index = dict(self._load_index())
+        for day, lines in sorted(closed.items()):
+            path = self._segment_path(day)
+            existing = b""
+            if os.path.exists(path):
+                with gzip.open(path, "rb") as f:
+                    existing = f.read()
+            with gzip.open(path + ".tmp", "wb") as f:
+                f.write(existing)
+                f.writelines(lines)
+            summary = index.get(day.isoformat()) or _empty_summary()
+            for line in lines:
+                _add_to_summary(summary, json.loads(line))
+            index[day.isoformat()] = summary
+        with open(self.index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f, sort_keys=True)
+        with open(self.ledger_path + ".tmp", "wb") as f:
+            f.writelines(keep)
+            st = os.fstat(f.fileno())
+        manifest = {"active": [st.st_dev, st.st_ino], "days": sorted(day.isoformat() for day in closed)}
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        os.replace(self.ledger_path + ".tmp", self.ledger_path)
+        self._finish_rotation(manifest)
+
+    def _recover(self) -> None:
+        """Complete or undo a rotation interrupted by a crash. Caller holds the lock."""
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        try:
+            st = os.stat(self.ledger_path)
+            committed = [st.st_dev, st.st_ino] == manifest["active"]
+        except FileNotFoundError:
+            committed = False
+        if committed:
+            self._finish_rotation(manifest)
+            return
+        # The active file was never replaced: drop what was staged
+        staged = [self._segment_path(date.fromisoformat(day)) + ".tmp" for day in manifest["days"]]
+        for path in staged + [self.index_path + ".tmp", self.ledger_path + ".tmp", self.manifest_path]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _finish_rotation(self, manifest: Dict[str, Any]) -> None:
+        """Move the staged segments and index of a committed rotation into place."""
+        for day in manifest["days"]:
+            path = self._segment_path(date.fromisoformat(day))
+            if os.path.exists(path + ".tmp"):
+                os.replace(path + ".tmp", path)
+        if os.path.exists(self.index_path + ".tmp"):
+            os.replace(self.index_path + ".tmp", self.index_path)
+        os.remove(self.manifest_path)
+        self._index_mtime = None  # re-read on the next query
@@ -0,0 +1,283 @@
+"""Indexed dispatch queue for orchestrator steps.
+
+Steps are grouped into per-project lanes. Each lane is a binary heap ordered
+by priority (higher first) and then by enqueue order, so dispatch within a
+project is priority-aware and FIFO among equals. Lanes are served round-robin
+so that one very large plan cannot starve the other projects.
+
+An index keyed by ``step_id`` supports ``peek``, ``cancel``, ``replace`` and
+``update`` without scanning the queue. Step ids repeat across plans (every
+plan from a template has the same ones), so each of these can be limited to
+one ``lane``. Cancelled entries are marked and discarded lazily when they
+reach the top of their lane. Enqueue is O(log n) and dequeue is amortised
+O(log n).
+
+The queue is shared by the ``/enqueue`` endpoint (which FastAPI runs in a
+worker thread) and the WebSocket dispatch loop, so all operations are guarded
+by a lock. Dispatch loops that find the queue empty await ``get()``; each
+``push`` wakes one waiter through its event loop, so idle connections cost
+nothing and a new step is picked up as soon as it is enqueued.
+
+An optional ``journal`` callable is invoked under the lock for every change
+(``push``, ``restore``, ``pop``, ``cancel``, ``clear``; ``replace`` and
+``update`` are journaled as a ``restore`` at the same position) so that a
+write-ahead log sees queue events in exactly the order they happened.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+DEFAULT_LANE = "default"
+
+# Positions within a heap entry. Entries are lists so they can be marked as
+# removed in place: [neg_priority, seq, step_id, step, lane]
+_STEP = 3
+_LANE = 4
+
+
+class QueuedStep(NamedTuple):
+    """A step popped from the queue together with its queue position."""
+
+    step: Dict[str, Any]
+    lane: str
+    priority: int
+    seq: int
+
+
+Journal = Callable[[str, Optional[QueuedStep]], None]
+
+
+class DispatchQueue:
+    """Priority-aware queue of step dicts with per-project lanes."""
+
+    def __init__(self, journal: Optional[Journal] = None) -> None:
+        self.journal = journal
+        self._lanes: Dict[str, List[list]] = {}
+        self._active: Deque[str] = deque()
+        self._index: Dict[str, List[list]] = {}
+        self._next_seq = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, step_id: object) -> bool:
+        return step_id in self._index
+
+    def push(self, step: Dict[str, Any], lane: str = DEFAULT_LANE, priority: int = 0) -> int:
+        """Enqueue a step in the given lane.
+
+        Higher ``priority`` values are dispatched first within a lane. Steps
+        sharing a ``step_id`` are kept side by side; ``peek`` and ``cancel``
+        address all of them. Returns the step's position (``seq``).
+        """
+        return self._insert("push", step, lane, priority, None)
+
+    def restore(self, queued: QueuedStep) -> None:
+        """Put a popped step back at its original position in its lane.
+
+        Used when a dispatched step has to be retried (for example after its
+        runner disconnected) so it is not sent behind later arrivals.
+        """
+        self._insert("restore", queued.step, queued.lane, queued.priority, queued.seq)
+
+    def _insert(self, event: str, step: Dict[str, Any], lane: str, priority: int, seq: Optional[int]) -> int:
+        step_id = str(step.get("step_id", ""))
+        with self._lock:
+            if seq is None:
+                seq = self._next_seq
+            self._next_seq = max(self._next_seq, seq + 1)
+            entry = [-priority, seq, step_id, step, lane]
+            if self.journal is not None:
+                self.journal(event, QueuedStep(step, lane, priority, seq))
+            heap = self._lanes.get(lane)
+            if heap is None:
+                heap = self._lanes[lane] = []
+                self._active.append(lane)
+            heapq.heappush(heap, entry)
+            self._index.setdefault(step_id, []).append(entry)
+            self._size += 1
+            self._wake_one()
+        return seq
+
+    def pop(self) -> Optional[Dict[str, Any]]:
+        """Remove and return the next step to dispatch, or None if empty."""
+        queued = self.pop_entry()
+        return queued.step if queued is not None else None
+
+    def pop_entry(self) -> Optional[QueuedStep]:
+        """Like ``pop`` but also return the lane, priority and position."""
+        with self._lock:
+            while self._active:
+                lane = self._active[0]
+                heap = self._lanes[lane]
+                while heap and heap[0][_STEP] is None:
+                    heapq.heappop(heap)
+                if not heap:
+                    self._active.popleft()
+                    del self._lanes[lane]
+                    continue
+                entry = heapq.heappop(heap)
+                # Rotate so the next pop serves another project
+                self._active.rotate(-1)
+                self._unindex(entry)
+                self._size -= 1
+                queued = QueuedStep(entry[_STEP], lane, -entry[0], entry[1])
+                if self.journal is not None:
+                    self.journal("pop", queued)
+                return queued
+            return None
+
+    async def get(self) -> Dict[str, Any]:
+        """Wait until a step is available, then remove and return it."""
+        return (await self.get_entry()).step
+
+    async def get_entry(self) -> QueuedStep:
+        """Wait until a step is available and return it with its queue position."""
+        loop = asyncio.get_running_loop()
+        while True:
+            queued = self.pop_entry()
+            if queued is not None:
+                return queued
+            waiter = loop.create_future()
+            with self._lock:
+                if self._size:
+                    # A push slipped in between pop() and taking the lock
+                    continue
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._waiters.remove((loop, waiter))
+                    except ValueError:
+                        # Already woken; hand the wakeup to the next waiter
+                        if self._size:
+                            self._wake_one()
+                raise
+
+    def peek(self, step_id: str, lane: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the earliest queued step with ``step_id`` (in ``lane``, if given) without removing it."""
+        with self._lock:
+            entries = self._entries(step_id, lane)
+            if not entries:
+                return None
+            return entries[0][_STEP]
+
+    def cancel(self, step_id: str, lane: Optional[str] = None) -> int:
+        """Remove every queued step with ``step_id`` (in ``lane``, if given). Returns the number removed."""
+        with self._lock:
+            entries = self._entries(step_id, lane)
+            for entry in entries:
+                if self.journal is not None:
+                    self.journal("cancel", QueuedStep(entry[_STEP], entry[_LANE], -entry[0], entry[1]))
+                self._unindex(entry)
+                entry[_STEP] = None
+            self._size -= len(entries)
+            return len(entries)
+
+    def replace(self, step_id: str, step: Dict[str, Any], lane: Optional[str] = None) -> int:
+        """Swap the body of every queued step with ``step_id`` (in ``lane``, if given) for ``step``.
+
+        The steps keep their lane, priority and position. Returns the number
+        replaced.
+        """
+        return self._rewrite(step_id, lane, lambda _: step)
+
+    def update(self, step_id: str, fields: Dict[str, Any], lane: Optional[str] = None) -> int:
+        """Like ``replace`` but merge ``fields`` into each step's own body."""
+        return self._rewrite(step_id, lane, lambda body: {**body, **fields})
+
+    def _rewrite(
+        self, step_id: str, lane: Optional[str], rewrite: Callable[[Dict[str, Any]], Dict[str, Any]]
+    ) -> int:
+        with self._lock:
+            entries = self._entries(step_id, lane)
+            for entry in entries:
+                entry[_STEP] = rewrite(entry[_STEP])
+                if self.journal is not None:
+                    self.journal("restore", QueuedStep(entry[_STEP], entry[_LANE], -entry[0], entry[1]))
+            return len(entries)
+
+    def lane_steps(self, lane: str) -> List[Dict[str, Any]]:
+        """Snapshot of the steps queued in ``lane``, in no particular order."""
+        with self._lock:
+            return [entry[_STEP] for entry in self._lanes.get(lane, ()) if entry[_STEP] is not None]
+
+    def drain_lane(self, lane: str) -> List[QueuedStep]:
+        """Remove every queued step in ``lane`` and return them in dispatch order."""
+        with self._lock:
+            heap = self._lanes.pop(lane, None)
+            if heap is None:
+                return []
+            self._active.remove(lane)
+            drained: List[QueuedStep] = []
+            for entry in sorted((e for e in heap if e[_STEP] is not None), key=lambda e: (e[0], e[1])):
+                queued = QueuedStep(entry[_STEP], lane, -entry[0], entry[1])
+                if self.journal is not None:
+                    self.journal("cancel", queued)
+                self._unindex(entry)
+                drained.append(queued)
+            self._size -= len(drained)
+            return drained
+
+    def clear(self) -> None:
+        with self._lock:
+            if self.journal is not None:
+                self.journal("clear", None)
+            self._lanes.clear()
+            self._active.clear()
+            self._index.clear()
+            self._size = 0
+
+    def lane_sizes(self) -> Dict[str, int]:
+        """Return the number of live steps queued in each lane."""
+        sizes: Dict[str, int] = {}
+        with self._lock:
+            for entries in self._index.values():
+                for entry in entries:
+                    sizes[entry[_LANE]] = sizes.get(entry[_LANE], 0) + 1
+        return sizes
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over a snapshot of the queued steps in no particular order."""
+        with self._lock:
+            snapshot = [entry[_STEP] for entries in self._index.values() for entry in entries]
+        return iter(snapshot)
+
+    def _wake_one(self) -> None:
+        # Caller holds the lock. Futures may belong to another thread's loop.
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(_resolve, waiter)
+            return
+
+    def _entries(self, step_id: str, lane: Optional[str]) -> List[list]:
+        # Caller holds the lock
+        entries = self._index.get(step_id) or []
+        if lane is None:
+            return list(entries)
+        return [entry for entry in entries if entry[_LANE] == lane]
+
+    def _unindex(self, entry: list) -> None:
+        entries = self._index[entry[2]]
+        if len(entries) == 1:
+            del self._index[entry[2]]
+        else:
+            entries.remove(entry)
+
+
+def _resolve(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
@@ -1,11 +1,30 @@
 """Consent bundle resolver.
 
-This module provides a simple mechanism to construct or fetch a consent bundle
-for a project. In a full implementation, consent would be persisted per
-project; here we return default values.
+This module provides per-project consent bundles (see ``consent_bundle.md``).
+A project starts with ``DEFAULT_CONSENT``; ``ConsentStore.update`` changes
+some of its fields, bumps the bundle's version and writes it to
+``<store_dir>/<key>.json`` (atomically, via a temporary file) together with a
+short history of changes.
+
+Reads are served from a process-local cache: each project's file is read at
+most once, and later ``get`` calls return the cached bundle as a read-only
+mapping without copying or touching the disk, so hot paths such as dispatch
+admission can consult it per step. Updates made through the store refresh
+the cache and call the listeners registered with ``subscribe``. Updates
+written by another process are picked up after ``refresh``.
 """
 
-from typing import Dict, Any
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from ..core.codec import dumps, loads
+from ..core.validators import ValidationError
 
 
 DEFAULT_CONSENT: Dict[str, Any] = {
@@ -19,8 +38,187 @@ DEFAULT_CONSENT: Dict[str, Any] = {
     "max_daily_third_party_usd": 0.00,
 }
 
+# Allowed values of the string fields; the other fields are booleans or amounts
+CONSENT_CHOICES: Dict[str, Tuple[str, ...]] = {
+    "allow_email_access": ("none", "read-only", "full"),
+    "allow_2fa": ("none", "email_code", "totp"),
+}
+
+CONSENT_DIR = os.path.join("memory", "consent")
+MAX_HISTORY = 50
+
+ConsentListener = Callable[[str, Mapping[str, Any], int], None]
+
+
+class ConsentStore:
+    """Persisted, versioned consent bundles with a process-local cache."""
+
+    def __init__(self, store_dir: Optional[str] = CONSENT_DIR):
+        self.store_dir = store_dir
+        # project -> (version, read-only bundle)
+        self._cache: Dict[str, Tuple[int, Mapping[str, Any]]] = {}
+        self._listeners: List[ConsentListener] = []
+        self._lock = threading.Lock()
+
+    def get(self, project: str) -> Mapping[str, Any]:
+        """The project's consent bundle (read-only; copy it to modify)."""
+        entry = self._cache.get(project)
+        if entry is None:
+            entry = self._load(project)
+        return entry[1]
+
+    def version(self, project: str) -> int:
+        """The bundle's version: 0 for the defaults, bumped by every update."""
+        entry = self._cache.get(project)
+        if entry is None:
+            entry = self._load(project)
+        return entry[0]
+
+    def update(self, project: str, changes: Dict[str, Any]) -> int:
+        """Change fields of a project's bundle and return its new version.
+
+        Raises ValidationError, listing every problem, for unknown fields or
+        values of the wrong type; nothing is changed in that case.
+        """
+        errors = consent_errors(changes)
+        if errors:
+            raise ValidationError(errors)
+        with self._lock:
+            version, current = self._cache.get(project) or self._read(project)
+            bundle = dict(current)
+            bundle.update(changes)
+            version += 1
+            history = self._history(project)
+            history.append({"version": version, "changes": changes, "at": _now()})
+            self._write(project, version, bundle, history[-MAX_HISTORY:])
+            entry = (version, MappingProxyType(bundle))
+            self._cache[project] = entry
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(project, entry[1], version)
+        return version
+
+    def subscribe(self, listener: ConsentListener) -> Callable[[], None]:
+        """Call ``listener(project, bundle, version)`` after every update.
+
+        Returns a function that unsubscribes it.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def history(self, project: str) -> List[Dict[str, Any]]:
+        """The recorded changes of a project's bundle, oldest first (reads the disk)."""
+        with self._lock:
+            return self._history(project)
+
+    def refresh(self, project: Optional[str] = None) -> None:
+        """Drop cached bundles (one project or all) so the next read reloads them."""
+        with self._lock:
+            if project is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(project, None)
+
+    def _load(self, project: str) -> Tuple[int, Mapping[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(project)
+            if entry is None:
+                entry = self._cache[project] = self._read(project)
+            return entry
+
+    def _path(self, project: str) -> str:
+        key = hashlib.sha256(project.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.store_dir, f"{key}.json")
+
+    def _record(self, project: str) -> Optional[Dict[str, Any]]:
+        if not self.store_dir:
+            return None
+        try:
+            with open(self._path(project), "rb") as f:
+                data = loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("project") != project:
+            return None
+        return data
+
+    def _read(self, project: str) -> Tuple[int, Mapping[str, Any]]:
+        data = self._record(project)
+        bundle = dict(DEFAULT_CONSENT)
+        if data is None:
+            return 0, MappingProxyType(bundle)
+        # Fields added to DEFAULT_CONSENT after the file was written keep their defaults
+        bundle.update(data.get("consent") or {})
+        return int(data.get("version", 0)), MappingProxyType(bundle)
+
+    def _history(self, project: str) -> List[Dict[str, Any]]:
+        data = self._record(project)
+        return list(data.get("history") or []) if data is not None else []
+
+    def _write(self, project: str, version: int, bundle: Dict[str, Any], history: List[Dict[str, Any]]) -> None:
+        if not self.store_dir:
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(project)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        record = {"project": project, "version": version, "consent": bundle, "history": history}
+        with open(tmp, "wb") as f:
+            f.write(dumps(record))
+        os.replace(tmp, path)
+
+
+def consent_errors(changes: Dict[str, Any]) -> List[str]:
+    """Problems with a set of consent changes; empty if they are valid."""
+    errors = []
+    for name, value in changes.items():
+        default = DEFAULT_CONSENT.get(name)
+        if name not in DEFAULT_CONSENT:
+            errors.append(f"Unknown consent field: {name}")
+        elif name in CONSENT_CHOICES:
+            if value not in CONSENT_CHOICES[name]:
+                errors.append(f"{name} must be one of {', '.join(CONSENT_CHOICES[name])}, not {value!r}")
+        elif isinstance(default, bool):
+            if not isinstance(value, bool):
+                errors.append(f"{name} must be true or false")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            errors.append(f"{name} must be a non-negative amount")
+    return errors
+
+
+def admission_refusal(step: Dict[str, Any], consent: Mapping[str, Any]) -> Optional[str]:
+    """Why ``consent`` forbids dispatching ``step`` at all, or None if it allows it."""
+    adapter = step.get("adapter") or {}
+    args = step.get("args") or {}
+    if adapter.get("type") == "finance" and args.get("mode") == "live" and not consent.get("live_trading", False):
+        return "Live trading is not enabled for this project"
+    return None
+
+
+def spend_refusal(consent: Mapping[str, Any], llm_usd_today: float) -> Optional[str]:
+    """Why the project's LLM spend today rules out dispatching now, or None.
+
+    Unlike ``admission_refusal`` this only lasts until the UTC day ends.
+    """
+    cap = consent.get("max_daily_llm_usd")
+    if cap is not None and llm_usd_today >= cap:
+        return f"Daily LLM spend of ${llm_usd_today:.2f} has reached the ${cap:.2f} consent limit"
+    return None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+default_store = ConsentStore()
+
 
 def resolve_consent(project_name: str) -> Dict[str, Any]:
-    """Return the consent bundle for a project. Currently returns defaults."""
-    # In a full implementation, this would load from storage or prompt the user.
-    return DEFAULT_CONSENT.copy()
\ No newline at end of file
+    """Return (a copy of) the consent bundle for a project from the default store."""
+    return dict(default_store.get(project_name))
@@ -2,48 +2,125 @@
 
 This class orchestrates the intake flow: computing information quality, generating
 questions, applying answers, and determining readiness.
+
+``assess`` and ``collect_answers`` work on a spec the caller holds. The
+``*_session`` methods keep the spec and the intake token usage in a
+``SessionStore`` keyed by project instead, so one manager can serve many
+concurrent intakes and they survive a restart. A session's IQS is memoized
+per spec version and consent, and is carried over when an answer only sets
+fields the score does not read.
+
+Which questions to ask, and whether asking more is worth it, comes from
+``question_planner.plan_questions``.
 """
 
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 
-from .iqs import compute_iqs
+from ..cost.budget import load_budget_config
+from .iqs import compute_iqs, consent_key
+from .mvi import REQUIRED_FIELD_SETS, primary_domain
+from .question_planner import READY_IQS, plan_questions
 from .questioner import generate_questions, apply_answers
-from .consent import resolve_consent
+from .consent import ConsentStore, default_store
+from .sessions import IntakeSession, SessionStore
+
+
+Assessment = Tuple[float, List[Dict[str, Any]], bool]
+
+# Tokens charged per answered field (placeholder until answers are metered)
+TOKENS_PER_ANSWER = 50
+# Share of the per-task token cap the intake may spend, and the smallest IQS
+# gain worth another round of questions
+INTAKE_BUDGET_RATIO = 0.15
+MIN_EXPECTED_GAIN = 10
 
 
 class IntakeManager:
-    def __init__(self, per_task_token_cap: int = 8000):
-        self.per_task_token_cap = per_task_token_cap
+    def __init__(
+        self,
+        per_task_token_cap: Optional[int] = None,
+        sessions: Optional[SessionStore] = None,
+        consents: Optional[ConsentStore] = None,
+    ):
+        # Defaults to the per-task cap in config/budget.toml
+        self.per_task_token_cap = per_task_token_cap or load_budget_config().per_task_tokens
         self.token_usage = 0
+        # Memory-only sessions unless a store with a directory is given
+        self.sessions = sessions if sessions is not None else SessionStore(None)
+        self.consents = consents if consents is not None else default_store
 
-    def assess(self, spec: Dict[str, Any], consent: Dict[str, Any]) -> Tuple[float, List[Dict[str, Any]], bool]:
+    def assess(self, spec: Dict[str, Any], consent: Dict[str, Any]) -> Assessment:
         """Compute IQS, generate questions if needed, and determine if ready.
 
         Returns a tuple (iqs, questions, ready).
         """
-        iqs = compute_iqs(spec, consent)
-        questions: List[Dict[str, Any]] = []
-        ready = False
-        # Determine expected gain: if missing fields remain, approximate gain.
-        domain = spec.get("domains", [None])[0]
-        missing_count = 0
-        from .mvi import MVI_DEFINITIONS
-        if domain in MVI_DEFINITIONS:
-            required = MVI_DEFINITIONS[domain]
-            missing_count = len([f for f in required if not spec.get("parameters", {}).get(f)])
-        expected_gain = (missing_count / (len(required) or 1)) * 40  # approximate
-        # Stop if IQS ≥ 80 or expected gain < 10 or token usage ≥ 15% of cap
-        if iqs >= 80 or expected_gain < 10 or (self.token_usage / self.per_task_token_cap) >= 0.15:
-            ready = True
-        else:
-            questions = generate_questions(spec)
-        return iqs, questions, ready
+        return self._assess(spec, consent, compute_iqs(spec, consent), self.token_usage)
 
     def collect_answers(self, spec: Dict[str, Any], answers: Dict[str, Any]) -> Dict[str, Any]:
         """Apply user answers to the spec and update token usage (placeholder)."""
         # Increment token usage by a small constant per answer to simulate consumption
-        self.token_usage += 50 * len(answers)
+        self.token_usage += TOKENS_PER_ANSWER * len(answers)
         return apply_answers(spec, answers)
 
+    def start_session(self, project: str, spec: Dict[str, Any]) -> IntakeSession:
+        """Begin (or restart) the intake for ``project`` with ``spec``."""
+        return self.sessions.create(project, spec)
+
+    def assess_session(self, project: str, consent: Optional[Dict[str, Any]] = None) -> Assessment:
+        """``assess`` the spec of a project's session.
+
+        ``consent`` defaults to the project's consent bundle. Raises KeyError
+        if the project has no session.
+        """
+        if consent is None:
+            # Cached and read-only; scoring never modifies it
+            consent = self.consents.get(project)
+        key = consent_key(consent)
+
+        def score(session: IntakeSession) -> Tuple[Dict[str, Any], float, int]:
+            memo = session.iqs_memo
+            if memo is not None and memo[0] == session.version and memo[1] == key:
+                iqs = memo[2]
+            else:
+                iqs = compute_iqs(session.spec, consent)
+                session.iqs_memo = (session.version, key, iqs)
+            return session.spec, iqs, session.token_usage
+
+        spec, iqs, token_usage = self.sessions.update(project, score)
+        return self._assess(spec, consent, iqs, token_usage)
+
+    def answer_session(self, project: str, answers: Dict[str, Any]) -> IntakeSession:
+        """Apply ``answers`` to a project's session and charge their tokens.
+
+        Raises KeyError if the project has no session.
+        """
+
+        def answer(session: IntakeSession) -> IntakeSession:
+            required = REQUIRED_FIELD_SETS.get(primary_domain(session.spec), frozenset())
+            apply_answers(session.spec, answers)
+            session.version += 1
+            session.token_usage += TOKENS_PER_ANSWER * len(answers)
+            memo = session.iqs_memo
+            if memo is not None and memo[0] == session.version - 1 and required.isdisjoint(answers):
+                # Only fields outside the MVI changed, so the score still holds
+                session.iqs_memo = (session.version, memo[1], memo[2])
+            return session
+
+        return self.sessions.update(project, answer)
+
     def get_consent(self, project_name: str) -> Dict[str, Any]:
-        return resolve_consent(project_name)
\ No newline at end of file
+        return dict(self.consents.get(project_name))
+
+    def _assess(self, spec: Dict[str, Any], consent: Dict[str, Any], iqs: float, token_usage: int) -> Assessment:
+        questions: List[Dict[str, Any]] = []
+        ready = False
+        intake_budget = INTAKE_BUDGET_RATIO * self.per_task_token_cap
+        # Ask only what the rest of the intake budget can pay for
+        affordable = max(0, int((intake_budget - token_usage) // TOKENS_PER_ANSWER))
+        batch = plan_questions(spec, consent, iqs, max_answers=affordable)
+        # Stop if IQS ≥ 80 or expected gain < 10 or token usage ≥ 15% of cap
+        if iqs >= READY_IQS or batch.gain < MIN_EXPECTED_GAIN or token_usage >= intake_budget:
+            ready = True
+        else:
+            questions = generate_questions(spec, fields=batch.fields)
+        return iqs, questions, ready
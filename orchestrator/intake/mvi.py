@@ -3,9 +3,12 @@
 This module lists the required fields for each supported domain. The intake
 manager uses these definitions to determine completeness and to generate
 appropriate questions.
+
+``REQUIRED_FIELDS`` and ``REQUIRED_FIELD_SETS`` are frozen copies built once
+at import, so the per-request code paths neither copy nor rescan the lists.
 """
 
-from typing import Dict, List
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
 
 # Required parameters per domain
@@ -55,4 +58,19 @@ MVI_OPTIONS: Dict[str, List[str]] = {
     "asset_source": ["user_provided", "auto_generate"],
     "cadence": ["one-time", "weekly", "monthly"],
     "pricing_rule": ["cost_plus_markup", "fixed_price"],
-}
\ No newline at end of file
+}
+
+# Frozen views of MVI_DEFINITIONS: ordered (for questions) and as sets (for lookups)
+REQUIRED_FIELDS: Dict[str, Tuple[str, ...]] = {domain: tuple(fields) for domain, fields in MVI_DEFINITIONS.items()}
+REQUIRED_FIELD_SETS: Dict[str, FrozenSet[str]] = {domain: frozenset(fields) for domain, fields in MVI_DEFINITIONS.items()}
+
+
+def primary_domain(spec: Dict[str, Any]) -> Optional[str]:
+    """The first domain of a spec, which selects its MVI fields."""
+    domains = spec.get("domains") or [None]
+    return domains[0]
+
+
+def missing_fields(domain: Optional[str], parameters: Dict[str, Any]) -> List[str]:
+    """Required fields of ``domain`` without a (truthy) value, in declaration order."""
+    return [field for field in REQUIRED_FIELDS.get(domain, ()) if not parameters.get(field)]
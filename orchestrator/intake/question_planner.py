@@ -0,0 +1,113 @@
+"""Choose which missing MVI fields to ask about next.
+
+Every answered field costs intake tokens, and every round of questions
+costs a turn with the user. ``plan_questions`` ranks a spec's missing MVI
+fields by
+
+1. their marginal IQS gain: the score with the field filled in minus the
+   current score;
+2. how many plan steps they feed: the steps of the spec's templates bound
+   to the field, plus every step that depends on those;
+3. their order in ``MVI_DEFINITIONS``.
+
+It then takes the shortest prefix of that ranking that lifts the IQS to the
+readiness threshold. When that prefix fits in one batch, the round asks only
+those questions. Otherwise the round asks a full batch and ``rounds``
+estimates how many more rounds are needed. ``max_answers`` caps the batch to
+what the remaining intake token budget can pay for.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..plan_templates import templates_for
+from .iqs import compute_iqs
+from .mvi import missing_fields, primary_domain
+
+
+READY_IQS = 80.0
+MAX_ITEMS = 5
+
+# Placeholder value for a field assumed answered when estimating gains
+_FILLED = True
+
+
+@dataclass(slots=True)
+class QuestionBatch:
+    """The fields to ask about this round and what answering them is worth."""
+
+    fields: List[str] = field(default_factory=list)
+    iqs: float = 0.0  # current score
+    expected_iqs: float = 0.0  # score once ``fields`` are answered
+    rounds: int = 0  # rounds estimated to reach READY_IQS; 0 if already there, -1 if out of reach
+
+    @property
+    def gain(self) -> float:
+        return round(self.expected_iqs - self.iqs, 2)
+
+
+def step_counts(spec: Dict[str, Any], fields: List[str]) -> Dict[str, int]:
+    """Number of plan steps each field feeds, directly or through dependencies."""
+    templates = templates_for(spec.get("domains") or [])
+    return {name: sum(len(t.downstream({name})) for t in templates) for name in fields}
+
+
+def rank_fields(
+    spec: Dict[str, Any], consent: Dict[str, Any], iqs: Optional[float] = None
+) -> List[Tuple[str, float, int]]:
+    """Missing MVI fields as (field, marginal IQS gain, plan steps fed), best first."""
+    parameters = spec.get("parameters") or {}
+    missing = missing_fields(primary_domain(spec), parameters)
+    if not missing:
+        return []
+    if iqs is None:
+        iqs = compute_iqs(spec, consent)
+    counts = step_counts(spec, missing)
+    ranked = [
+        (name, round(_score(spec, parameters, [name], consent) - iqs, 2), counts[name], order)
+        for order, name in enumerate(missing)
+    ]
+    ranked.sort(key=lambda item: (-item[1], -item[2], item[3]))
+    return [item[:3] for item in ranked]
+
+
+def plan_questions(
+    spec: Dict[str, Any],
+    consent: Dict[str, Any],
+    iqs: Optional[float] = None,
+    max_items: int = MAX_ITEMS,
+    max_answers: Optional[int] = None,
+    threshold: float = READY_IQS,
+) -> QuestionBatch:
+    """Pick the fields to ask about this round (see the module docstring).
+
+    ``iqs`` is the spec's current score if the caller already has it.
+    """
+    if iqs is None:
+        iqs = compute_iqs(spec, consent)
+    if iqs >= threshold:
+        return QuestionBatch(iqs=iqs, expected_iqs=iqs, rounds=0)
+    ranked = [name for name, _, _ in rank_fields(spec, consent, iqs)]
+    limit = min(max_items, len(ranked))
+    if max_answers is not None:
+        limit = max(0, min(limit, max_answers))
+    parameters = spec.get("parameters") or {}
+    scores = [_score(spec, parameters, ranked[:k], consent) for k in range(1, len(ranked) + 1)]
+    needed = next((k for k, score in enumerate(scores, 1) if score >= threshold), None)
+    if needed is None:
+        rounds = -1
+    else:
+        rounds = math.ceil(needed / max_items) if max_items else -1
+    size = limit if needed is None else min(needed, limit)
+    expected = scores[size - 1] if size else iqs
+    return QuestionBatch(fields=ranked[:size], iqs=iqs, expected_iqs=expected, rounds=rounds)
+
+
+def _score(spec: Dict[str, Any], parameters: Dict[str, Any], names: List[str], consent: Dict[str, Any]) -> float:
+    filled = dict(parameters)
+    for name in names:
+        filled[name] = _FILLED
+    return compute_iqs({**spec, "parameters": filled}, consent)
@@ -1,27 +1,32 @@
 """Question generator for intake manager.
 
 Given a ProjectSpec-like dictionary, this module identifies missing MVI fields
-and produces a batch of questions. Questions are multiple-choice when
+(or takes the ones ``question_planner`` chose) and produces a batch of questions. Questions are multiple-choice when
 predefined options exist; otherwise a free-text question is generated.
 """
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
-from .mvi import MVI_DEFINITIONS, MVI_OPTIONS
+from .mvi import MVI_OPTIONS, REQUIRED_FIELDS, missing_fields, primary_domain
 
 
-def generate_questions(spec: Dict[str, Any], max_items: int = 5) -> List[Dict[str, Any]]:
+def generate_questions(
+    spec: Dict[str, Any], max_items: int = 5, fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
     """Produce a list of questions for missing MVI fields.
 
     Each question is a dictionary with keys: field, type, options, prompt.
-    Questions are limited to max_items.
+    Questions are limited to max_items. ``fields`` chooses which fields to
+    ask about, in order (see ``question_planner.plan_questions``); by
+    default they are the missing fields in declaration order.
     """
-    domain = spec.get("domains", [None])[0]
-    if domain not in MVI_DEFINITIONS:
-        return []
-    required_fields = MVI_DEFINITIONS[domain]
-    provided = spec.get("parameters", {})
-    missing = [f for f in required_fields if not provided.get(f)]
+    if fields is not None:
+        missing = fields
+    else:
+        domain = primary_domain(spec)
+        if domain not in REQUIRED_FIELDS:
+            return []
+        missing = missing_fields(domain, spec.get("parameters") or {})
     questions: List[Dict[str, Any]] = []
     for field in missing[:max_items]:
         opts = MVI_OPTIONS.get(field)
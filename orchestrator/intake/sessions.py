@@ -0,0 +1,150 @@
+"""Per-project intake sessions.
+
+An ``IntakeSession`` holds what the intake flow needs between rounds for one
+project: the spec being filled in, a ``version`` bumped on every change to
+it, the intake tokens spent so far and the last IQS computed (with the
+version and consent it was computed for, so an unchanged spec is not scored
+again).
+
+``SessionStore`` keeps recently used sessions in memory in LRU order
+(``max_entries``) and writes every change through to
+``<store_dir>/<key>.json``, a compact JSON record, atomically via a
+temporary file. Sessions evicted from memory, or left over from before a
+restart, are read back on their next use. With ``store_dir=None`` sessions
+live in memory only and eviction forgets them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from ..core.codec import dumps, loads
+
+
+INTAKE_SESSIONS_DIR = os.path.join("memory", "intake_sessions")
+MAX_ENTRIES = 4096
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class IntakeSession:
+    project: str
+    spec: Dict[str, Any]
+    version: int = 0
+    token_usage: int = 0
+    # (version, consent key, iqs) of the last score; not persisted
+    iqs_memo: Optional[Tuple[int, Any, float]] = field(default=None, compare=False)
+
+    def record(self) -> Dict[str, Any]:
+        return {"project": self.project, "spec": self.spec, "version": self.version, "token_usage": self.token_usage}
+
+
+class SessionStore:
+    """LRU of intake sessions over a directory of per-project records."""
+
+    def __init__(self, store_dir: Optional[str] = INTAKE_SESSIONS_DIR, max_entries: int = MAX_ENTRIES):
+        self.store_dir = store_dir
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, IntakeSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+
+    def get(self, project: str) -> Optional[IntakeSession]:
+        """Return the session for ``project``, or None if there is none."""
+        with self._lock:
+            return self._get(project)
+
+    def create(self, project: str, spec: Dict[str, Any]) -> IntakeSession:
+        """Start a new session for ``project``, replacing any existing one."""
+        session = IntakeSession(project=project, spec=spec)
+        with self._lock:
+            self._put(session)
+            self._write(session)
+        return session
+
+    def update(self, project: str, change: Callable[[IntakeSession], T]) -> T:
+        """Apply ``change`` to the session under the store's lock and persist it.
+
+        Raises KeyError if ``project`` has no session.
+        """
+        with self._lock:
+            session = self._get(project)
+            if session is None:
+                raise KeyError(project)
+            result = change(session)
+            self._write(session)
+            return result
+
+    def delete(self, project: str) -> bool:
+        """Forget the session for ``project``. Returns whether one existed."""
+        with self._lock:
+            found = self._entries.pop(project, None) is not None
+            if self.store_dir:
+                try:
+                    os.remove(self._path(project))
+                    found = True
+                except FileNotFoundError:
+                    pass
+            return found
+
+    def clear(self) -> None:
+        """Drop the in-memory sessions (records on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, project: str) -> Optional[IntakeSession]:
+        # Caller holds the lock
+        session = self._entries.get(project)
+        if session is None:
+            session = self._read(project)
+            if session is None:
+                return None
+            self._put(session)
+        else:
+            self._entries.move_to_end(project)
+        return session
+
+    def _put(self, session: IntakeSession) -> None:
+        self._entries[session.project] = session
+        self._entries.move_to_end(session.project)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, project: str) -> str:
+        # Project names are free text; hash them into safe file names
+        key = hashlib.sha256(project.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.store_dir, f"{key}.json")
+
+    def _read(self, project: str) -> Optional[IntakeSession]:
+        if not self.store_dir:
+            return None
+        try:
+            with open(self._path(project), "rb") as f:
+                data = loads(f.read())
+            if data["project"] != project:
+                return None
+            return IntakeSession(
+                project=project, spec=data["spec"], version=int(data["version"]), token_usage=int(data["token_usage"])
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing or torn record: no session
+            return None
+
+    def _write(self, session: IntakeSession) -> None:
+        if not self.store_dir:
+            return
+        path = self._path(session.project)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps(session.record()))
+        os.replace(tmp, path)
@@ -0,0 +1,108 @@
+"""Content-addressed cache of generated plans.
+
+Plans are keyed by ``spec_digest``, the SHA-256 of the spec's canonical
+JSON, so the same spec maps to the same entry in every process. Each entry
+records the ``fingerprint`` of what the plan was built from: the domain
+templates, their current token estimates and the per-task cap. A lookup whose
+fingerprint no longer matches is a miss and the plan is rebuilt, so editing
+a template, a cost table or learning new estimates invalidates stale plans
+without any explicit flush.
+
+Recent plans are held in memory in LRU order (``max_entries``); every plan
+is also written to ``<cache_dir>/<digest>.json`` (atomically, via a temporary
+file) so a restarted service starts warm. Callers always get their own copy
+of a cached plan.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .core.codec import dumps_text, loads, plan_from_dict
+from .core.models import Plan
+from . import planner
+from .plan_templates import canonical_json, fingerprint
+
+
+PLAN_CACHE_DIR = os.path.join("memory", "plan_cache")
+MAX_ENTRIES = 1024
+
+
+class PlanCache:
+    """LRU plus on-disk cache of ``plan_project`` results."""
+
+    def __init__(self, cache_dir: Optional[str] = PLAN_CACHE_DIR, max_entries: int = MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()  # digest -> (fingerprint, plan JSON)
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def fingerprint(self) -> str:
+        """Digest of the templates, estimates and cap plans are built from."""
+        parts = [fingerprint(), planner.PER_TASK_TOKEN_CAP]
+        return hashlib.sha256(canonical_json(parts).encode("utf-8")).hexdigest()
+
+    def get(self, project_spec: Dict[str, Any]) -> Plan:
+        """Return the plan for ``project_spec``, building it on a miss."""
+        digest = planner.spec_digest(project_spec)
+        current = self.fingerprint()
+        with self._lock:
+            cached = self._entries.get(digest)
+            if cached is None:
+                cached = self._read(digest)
+            if cached is not None and cached[0] == current:
+                self._entries[digest] = cached
+                self._entries.move_to_end(digest)
+                self.hits += 1
+                # Decoding per hit hands every caller its own containers
+                return plan_from_dict(loads(cached[1]))
+            self.misses += 1
+        plan = planner.plan_project(project_spec)
+        encoded = dumps_text(plan)
+        with self._lock:
+            self._entries[digest] = (current, encoded)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._write(digest, current, encoded)
+        return plan
+
+    def clear(self) -> None:
+        """Drop the in-memory entries (files on disk are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _read(self, digest: str) -> Optional[Tuple[str, str]]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["fingerprint"], dumps_text(data["plan"])
+        except (OSError, ValueError, KeyError):
+            # Missing or torn file: treat as a miss and rebuild
+            return None
+
+    def _write(self, digest: str, current: str, encoded: str) -> None:
+        if not self.cache_dir:
+            return
+        path = self._path(digest)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f'{{"fingerprint": {json.dumps(current)}, "plan": {encoded}}}')
+        os.replace(tmp, path)
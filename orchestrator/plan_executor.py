@@ -0,0 +1,322 @@
+"""Dependency-driven release of plan steps into the dispatch queue.
+
+A plan's steps form a DAG through their ``depends_on`` lists. ``submit``
+pushes the steps with no unfinished dependencies straight onto the
+``DispatchQueue`` and holds back the rest. Each time a step completes
+(``complete``, called when a runner returns an ``ok`` result) its dependents
+are updated, and any that have nothing left to wait for are released to the
+queue. Ready steps of the same plan are therefore dispatched in parallel to
+whichever runners have room, instead of one after another.
+
+Steps are tracked per lane (the plan's project or plan_id) and per
+submission (``run``), because step ids are only unique within a plan and
+the same plan may be submitted to a lane more than once. Every submitted
+step carries its run in the ``_run`` field (``RUN_FIELD``), which travels
+with it through the queue and the write-ahead log, so ``complete`` releases
+the dependents of the very submission that finished the step even when
+runs finish out of order. A step without a run (queued before runs were
+recorded) serves the oldest submission still waiting for its id.
+Dependencies on step ids that are not part of the submitted steps are
+treated as met, so a step that depends on work cut by downscoping or
+finished earlier is not stuck forever. A failed, blocked or parked
+dependency keeps its dependents held until it is retried and succeeds; a
+cancelled one cancels them (``cancel``).
+
+Replanning edits submissions already in progress: ``update`` rewrites held
+steps, ``drop`` removes steps cut from the plan (their dependents then treat
+them as met, as ``submit`` would), and ``extend`` adds new steps to every
+submission in the lane that still has one of their dependencies pending.
+
+Like the queue, the executor takes an optional ``journal`` callable invoked
+under its lock for every change (``hold``, ``done``, ``release``; ``update``
+is journaled as a ``release`` and a ``hold``) with a JSON-ready dict, so the
+write-ahead log can restore held steps after a restart (see ``restore``).
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .core.validators import validate_dependencies
+from .dispatch_queue import DispatchQueue
+
+
+DagJournal = Callable[[str, Dict[str, Any]], None]
+
+Key = Tuple[str, int, str]  # (lane, run, step_id)
+
+RUN_FIELD = "_run"  # submission a plan step belongs to
+
+
+class _Held:
+    __slots__ = ("step", "lane", "run", "priority", "waiting")
+
+    def __init__(self, step: Dict[str, Any], lane: str, run: int, priority: int, waiting: Set[str]) -> None:
+        self.step = step
+        self.lane = lane
+        self.run = run
+        self.priority = priority
+        self.waiting = waiting
+
+    @property
+    def key(self) -> Key:
+        return self.lane, self.run, str(self.step.get("step_id", ""))
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "lane": self.lane,
+            "run": self.run,
+            "priority": self.priority,
+            "step": self.step,
+            "waiting": sorted(self.waiting),
+        }
+
+
+class PlanExecutor:
+    """Holds plan steps until their dependencies complete."""
+
+    def __init__(self, queue: DispatchQueue, journal: Optional[DagJournal] = None) -> None:
+        self.queue = queue
+        self.journal = journal
+        self._held: Dict[Key, _Held] = {}
+        # (lane, step_id) -> run -> held steps of that run waiting for it,
+        # oldest run first
+        self._dependents: Dict[Tuple[str, str], "OrderedDict[int, List[Key]]"] = {}
+        self._next_run = 1
+        self._lock = threading.Lock()
+
+    def submit(self, steps: List[Dict[str, Any]], lane: str) -> int:
+        """Queue the ready steps of a plan and hold the others.
+
+        Raises ValueError if the steps' dependencies form a cycle, before
+        anything is queued. Returns the number of steps queued now.
+        """
+        edges = {str(step.get("step_id", "")): _deps(step) for step in steps}
+        # Dependencies outside the plan count as met
+        validate_dependencies({step_id: [d for d in deps if d in edges] for step_id, deps in edges.items()})
+        ready = []
+        with self._lock:
+            run = self._next_run
+            self._next_run += 1
+            for step in steps:
+                step = dict(step)
+                step[RUN_FIELD] = run
+                step_id = str(step.get("step_id", ""))
+                waiting = {dep for dep in edges[step_id] if dep in edges}
+                priority = int(step.get("priority", 0) or 0)
+                if waiting:
+                    self._hold(_Held(step, lane, run, priority, waiting))
+                else:
+                    ready.append((step, priority))
+        for step, priority in ready:
+            self.queue.push(step, lane=lane, priority=priority)
+        return len(ready)
+
+    def complete(self, lane: str, step_id: str, run: Optional[int] = None) -> int:
+        """Mark a step of submission ``run`` as done and queue dependents that became ready.
+
+        Pass the step's ``RUN_FIELD``; without one the oldest submission
+        waiting for ``step_id`` is served. Returns the number of steps
+        released.
+        """
+        released: List[_Held] = []
+        with self._lock:
+            runs = self._dependents.get((lane, step_id))
+            if not runs:
+                return 0
+            if run is None:
+                run = next(iter(runs))
+            elif run not in runs:
+                return 0  # nothing in that submission waits for it
+            self._finish(lane, step_id, run, released)
+        for held in released:
+            self.queue.push(held.step, lane=held.lane, priority=held.priority)
+        return len(released)
+
+    def extend(self, steps: List[Dict[str, Any]], lane: str) -> int:
+        """Add steps to the submissions in ``lane`` that still wait on their dependencies.
+
+        A dependency is pending in a submission while a step with that id is
+        held or queued under it. Each such submission gets its own copy of
+        the steps, held until their pending dependencies (and each other)
+        complete; a dependency already dispatched counts as met. With no
+        submission pending, the steps are submitted afresh. Raises ValueError
+        on a dependency cycle among ``steps``. Returns the number of steps
+        added, held or queued.
+        """
+        edges = {str(step.get("step_id", "")): _deps(step) for step in steps}
+        validate_dependencies({step_id: [d for d in deps if d in edges] for step_id, deps in edges.items()})
+        wanted = {dep for deps in edges.values() for dep in deps if dep not in edges}
+        queued = self.queue.lane_steps(lane)
+        ready = []
+        with self._lock:
+            pending: Dict[int, Set[str]] = {}
+            for held_lane, run, step_id in self._held:
+                if held_lane == lane:
+                    pending.setdefault(run, set()).add(step_id)
+            for step in queued:
+                if step.get(RUN_FIELD) is not None:
+                    pending.setdefault(int(step[RUN_FIELD]), set()).add(str(step.get("step_id", "")))
+            runs = sorted(run for run, step_ids in pending.items() if step_ids & wanted)
+            if runs:
+                for run in runs:
+                    for step in steps:
+                        step = dict(step)
+                        step[RUN_FIELD] = run
+                        step_id = str(step.get("step_id", ""))
+                        waiting = {dep for dep in edges[step_id] if dep in edges or dep in pending[run]}
+                        priority = int(step.get("priority", 0) or 0)
+                        if waiting:
+                            self._hold(_Held(step, lane, run, priority, waiting))
+                        else:
+                            ready.append((step, priority))
+        if not runs:
+            self.submit(steps, lane)
+            return len(steps)
+        for step, priority in ready:
+            self.queue.push(step, lane=lane, priority=priority)
+        return len(steps) * len(runs)
+
+    def update(self, lane: str, step_id: str, fields: Dict[str, Any]) -> int:
+        """Merge ``fields`` into every held step with ``step_id`` in ``lane``.
+
+        The steps keep their submission and what they wait for. Returns the
+        number updated.
+        """
+        with self._lock:
+            keys = [key for key in self._held if key[0] == lane and key[2] == step_id]
+            for key in keys:
+                held = self._held[key]
+                held.step = {**held.step, **fields, "step_id": step_id, RUN_FIELD: held.run}
+                if self.journal is not None:
+                    self._journal_release(key)
+                    self.journal("hold", held.record())
+            return len(keys)
+
+    def drop(self, lane: str, step_ids: Iterable[str]) -> int:
+        """Remove held steps with ``step_ids`` from ``lane`` without cancelling their dependents.
+
+        For steps cut from a plan: whatever waits for them treats them as met,
+        as ``submit`` does for dependencies outside the plan, and is queued
+        once nothing else is pending. Returns the number of held steps removed.
+        """
+        step_ids = set(step_ids)
+        released: List[_Held] = []
+        with self._lock:
+            keys = [key for key in self._held if key[0] == lane and key[2] in step_ids]
+            for key in keys:
+                self._unhold(key)
+            for step_id in step_ids:
+                for run in list(self._dependents.get((lane, step_id), ())):
+                    self._finish(lane, step_id, run, released)
+        for held in released:
+            self.queue.push(held.step, lane=held.lane, priority=held.priority)
+        return len(keys)
+
+    def cancel(self, step_id: str, lane: Optional[str] = None) -> int:
+        """Drop held steps with ``step_id`` (in ``lane``, if given, else in any
+        lane), and every held step that depends on those or on a step with
+        ``step_id`` (e.g. one cancelled in the queue), directly or
+        transitively. Returns the number removed.
+        """
+        with self._lock:
+            pending = deque(key for key in self._held if key[2] == step_id and lane in (None, key[0]))
+            # Dependents of the step wherever it is: held, queued or in flight
+            for (dep_lane, dep), runs in self._dependents.items():
+                if dep == step_id and lane in (None, dep_lane):
+                    pending.extend(key for keys in runs.values() for key in keys)
+            removed = 0
+            while pending:
+                key = pending.popleft()
+                if key not in self._held:
+                    continue
+                removed += 1
+                self._unhold(key)
+                held_lane, run, held_id = key
+                pending.extend(self._dependents.get((held_lane, held_id), {}).pop(run, []))
+            for key in [key for key, runs in self._dependents.items() if not any(runs.values())]:
+                del self._dependents[key]
+            return removed
+
+    def restore(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Hold steps again from journaled records (``WalState.held``) without journaling."""
+        with self._lock:
+            for record in sorted(records, key=lambda record: int(record.get("run", 0))):
+                run = int(record.get("run", 0))
+                step = record["step"]
+                if RUN_FIELD not in step:
+                    step = dict(step, **{RUN_FIELD: run})  # held before steps carried their run
+                held = _Held(step, record["lane"], run, int(record["priority"]), set(record["waiting"]))
+                self._index(held)
+                self._next_run = max(self._next_run, run + 1)
+
+    def held(self) -> List[Dict[str, Any]]:
+        """Held steps with the step ids each one still waits for."""
+        with self._lock:
+            return [held.record() for held in self._held.values()]
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._held):
+                self._journal_release(key)
+            self._held.clear()
+            self._dependents.clear()
+
+    def _hold(self, held: _Held) -> None:
+        # Caller holds the lock
+        if self.journal is not None:
+            self.journal("hold", held.record())
+        self._index(held)
+
+    def _index(self, held: _Held) -> None:
+        key = held.key
+        self._held[key] = held
+        for dep in held.waiting:
+            self._dependents.setdefault((held.lane, dep), OrderedDict()).setdefault(held.run, []).append(key)
+
+    def _unhold(self, key: Key) -> None:
+        # Caller holds the lock
+        held = self._held.pop(key)
+        lane, run, _ = key
+        for dep in held.waiting:
+            runs = self._dependents.get((lane, dep), {})
+            waiters = runs.get(run)
+            if waiters is not None and key in waiters:
+                waiters.remove(key)
+                if not waiters:
+                    del runs[run]
+                    if not runs:
+                        del self._dependents[(lane, dep)]
+        self._journal_release(key)
+
+    def _finish(self, lane: str, step_id: str, run: int, released: List[_Held]) -> None:
+        # Caller holds the lock; ``run`` must be waiting for ``step_id``
+        runs = self._dependents[(lane, step_id)]
+        dependents = runs.pop(run)
+        if not runs:
+            del self._dependents[(lane, step_id)]
+        if self.journal is not None:
+            self.journal("done", {"lane": lane, "run": run, "step_id": step_id})
+        for key in dependents:
+            held = self._held.get(key)
+            if held is None:
+                continue
+            held.waiting.discard(step_id)
+            if not held.waiting:
+                del self._held[key]
+                self._journal_release(key)
+                released.append(held)
+
+    def _journal_release(self, key: Key) -> None:
+        if self.journal is not None:
+            lane, run, step_id = key
+            self.journal("release", {"lane": lane, "run": run, "step_id": step_id})
+
+
+def _deps(step: Dict[str, Any]) -> List[str]:
+    return [str(dep) for dep in step.get("depends_on") or []]
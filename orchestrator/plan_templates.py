@@ -0,0 +1,491 @@
+"""Declarative plan templates per domain.
+
+``PLAN_TEMPLATES`` lists, for each domain, the steps a minimal viable plan is
+made of. A step entry names the step (the base of its ``step_id``), gives the
+``Step`` fields that differ from the defaults and may list the names of
+earlier steps it ``depends_on``. ``params`` maps step args to the spec
+parameters they are filled from (an arg is left out, or keeps its template
+value, when the spec does not set the parameter); these bindings are also
+what tells the replanner which steps a changed parameter affects. The
+templates follow the skill documents in ``/docs/skills_*.md`` and the
+required fields in ``intake/mvi.py``.
+
+Each template is compiled once into a ``CompiledTemplate``: validated
+``Step`` prototypes with dependencies resolved to positions and token
+estimates precomputed. ``instantiate`` only copies the prototypes, numbers
+their step ids and fills in the cached estimates, so planning does no
+per-step estimation. The estimates are recomputed when the estimator has
+learned from new usage since they were taken.
+
+New domains are added with ``register_template`` (or an entry in
+``PLAN_TEMPLATES``); the planner has no per-domain code. ``fingerprint``
+digests the templates together with their current estimates, so plans
+cached from them can be invalidated when either changes.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .core.models import Step
+from .core.validators import validate_step
+from .cost.estimator import TokenEstimator, step_kind
+from .cost.governor import default_estimator
+
+
+# Used when a spec names no domain with a template
+FALLBACK_DOMAIN = "generic"
+
+PLAN_TEMPLATES: Dict[str, List[Dict[str, Any]]] = {
+    "finance": [
+        {
+            "name": "fetch_data",
+            "team": "Engineering",
+            "intent": "Fetch market data for target symbols",
+            "adapter": {"type": "finance"},
+            "args": {"action": "fetch_data"},
+            "params": {"symbols": "universe", "provider": "data_provider"},
+            "priority": 1,
+        },
+        {
+            "name": "compute_diffs",
+            "team": "Engineering",
+            "intent": "Compute portfolio target differences",
+            "adapter": {"type": "files"},
+            "args": {"action": "compute_diffs"},
+            "depends_on": ["fetch_data"],
+            "priority": 1,
+        },
+        {
+            "name": "place_orders",
+            "team": "Engineering",
+            "intent": "Place paper orders to rebalance portfolio",
+            "adapter": {"type": "finance"},
+            "args": {"action": "place_orders", "mode": "paper"},
+            "params": {"broker": "broker", "per_trade_cap": "per_trade_cap", "daily_cap": "daily_cap"},
+            "needs_secrets": ["BROKER_KEY"],
+            "depends_on": ["compute_diffs"],
+            "priority": 1,
+        },
+        {
+            "name": "verify_orders",
+            "team": "QA",
+            "intent": "Verify orders have been accepted and filled",
+            "adapter": {"type": "finance"},
+            "args": {"action": "verify_orders"},
+            "needs_secrets": ["BROKER_KEY"],
+            "depends_on": ["place_orders"],
+            "priority": 1,
+        },
+        {
+            "name": "schedule_nightly",
+            "team": "Scheduler",
+            "intent": "Schedule nightly summary job",
+            "adapter": {"type": "schedule"},
+            "args": {"cron": "0 2 * * *"},
+        },
+    ],
+    "leadgen": [
+        {
+            "name": "generate_page",
+            "team": "Engineering",
+            "intent": "Generate static landing page",
+            "adapter": {"type": "files"},
+            "args": {"action": "generate_page"},
+            "params": {"output_type": "output_type", "asset_source": "asset_source"},
+            "priority": 1,
+        },
+        {
+            "name": "deploy",
+            "team": "Engineering",
+            "intent": "Deploy page to hosting platform",
+            "adapter": {"type": "web"},
+            "args": {"action": "deploy"},
+            "params": {"platform": "platform"},
+            "depends_on": ["generate_page"],
+            "priority": 1,
+        },
+        {
+            "name": "configure_form",
+            "team": "Engineering",
+            "intent": "Configure form backend to collect leads",
+            "adapter": {"type": "web"},
+            "args": {"action": "configure_form"},
+            "depends_on": ["generate_page"],
+            "priority": 1,
+        },
+        {
+            "name": "test_form",
+            "team": "QA",
+            "intent": "Test form submission and verify entry in spreadsheet",
+            "adapter": {"type": "web"},
+            "args": {"action": "test_form"},
+            "depends_on": ["deploy", "configure_form"],
+            "priority": 1,
+        },
+        {
+            "name": "schedule_updates",
+            "team": "Scheduler",
+            "intent": "Schedule periodic page refreshes",
+            "adapter": {"type": "schedule"},
+            "args": {"cron": "@weekly"},
+        },
+    ],
+    "social": [
+        {
+            "name": "prepare_content",
+            "team": "Engineering",
+            "intent": "Prepare post text, links and images",
+            "adapter": {"type": "files"},
+            "args": {"action": "prepare_content"},
+            "params": {"asset_source": "asset_source"},
+            "priority": 1,
+        },
+        {
+            "name": "create_post",
+            "team": "Engineering",
+            "intent": "Log in and create the post on the platform",
+            "adapter": {"type": "web"},
+            "args": {"action": "create_post"},
+            "params": {"platform": "platform"},
+            "needs_secrets": ["SOCIAL_LOGIN"],
+            "depends_on": ["prepare_content"],
+            "priority": 1,
+        },
+        {
+            "name": "verify_post",
+            "team": "QA",
+            "intent": "Verify the post is live and capture its URL",
+            "adapter": {"type": "web"},
+            "args": {"action": "verify_post"},
+            "depends_on": ["create_post"],
+            "priority": 1,
+        },
+        {
+            "name": "schedule_posts",
+            "team": "Scheduler",
+            "intent": "Schedule recurring posts",
+            "adapter": {"type": "schedule"},
+            "args": {"cron": "@weekly"},
+        },
+    ],
+    "jobs": [
+        {
+            "name": "find_listing",
+            "team": "Engineering",
+            "intent": "Find the target job listing and skip ones already applied to",
+            "adapter": {"type": "web"},
+            "args": {"action": "find_listing"},
+            "priority": 1,
+        },
+        {
+            "name": "gather_profile",
+            "team": "Engineering",
+            "intent": "Gather profile data and resume file",
+            "adapter": {"type": "files"},
+            "args": {"action": "gather_profile"},
+            "params": {"profile": "profile_data"},
+            "priority": 1,
+        },
+        {
+            "name": "fill_application",
+            "team": "Engineering",
+            "intent": "Fill the application form and upload the resume",
+            "adapter": {"type": "web"},
+            "args": {"action": "fill_application"},
+            "depends_on": ["find_listing", "gather_profile"],
+            "priority": 1,
+        },
+        {
+            "name": "submit_application",
+            "team": "Engineering",
+            "intent": "Submit the application",
+            "adapter": {"type": "web"},
+            "args": {"action": "submit_application"},
+            "depends_on": ["fill_application"],
+            "priority": 1,
+        },
+        {
+            "name": "verify_submission",
+            "team": "QA",
+            "intent": "Capture the confirmation and record the listing hash",
+            "adapter": {"type": "web"},
+            "args": {"action": "verify_submission"},
+            "depends_on": ["submit_application"],
+            "priority": 1,
+        },
+    ],
+    "ecommerce": [
+        {
+            "name": "prepare_listings",
+            "team": "Engineering",
+            "intent": "Prepare item descriptions and images",
+            "adapter": {"type": "files"},
+            "args": {"action": "prepare_listings"},
+            "params": {"items_count": "items_count", "asset_source": "asset_source"},
+            "priority": 1,
+        },
+        {
+            "name": "price_items",
+            "team": "Engineering",
+            "intent": "Apply the pricing rule to each item",
+            "adapter": {"type": "files"},
+            "args": {"action": "price_items"},
+            "params": {"pricing_rule": "pricing_rule"},
+            "depends_on": ["prepare_listings"],
+            "priority": 1,
+        },
+        {
+            "name": "publish_listings",
+            "team": "Engineering",
+            "intent": "Publish the listings on the store platform",
+            "adapter": {"type": "web"},
+            "args": {"action": "publish_listings"},
+            "params": {"platform": "platform"},
+            "depends_on": ["price_items"],
+            "priority": 1,
+        },
+        {
+            "name": "verify_listings",
+            "team": "QA",
+            "intent": "Verify the listings are live with the right prices",
+            "adapter": {"type": "web"},
+            "args": {"action": "verify_listings"},
+            "depends_on": ["publish_listings"],
+            "priority": 1,
+        },
+    ],
+    "outreach": [
+        {
+            "name": "load_contacts",
+            "team": "Engineering",
+            "intent": "Load contacts from the source CSV",
+            "adapter": {"type": "files"},
+            "args": {"action": "load_contacts"},
+            "params": {"source_csv": "source_csv"},
+            "priority": 1,
+        },
+        {
+            "name": "draft_messages",
+            "team": "Engineering",
+            "intent": "Draft personalised messages from the profile data",
+            "adapter": {"type": "files"},
+            "args": {"action": "draft_messages"},
+            "params": {"profile": "profile_data"},
+            "depends_on": ["load_contacts"],
+            "priority": 1,
+        },
+        {
+            "name": "send_messages",
+            "team": "Engineering",
+            "intent": "Send messages within the throttle rules",
+            "adapter": {"type": "web"},
+            "args": {"action": "send_messages"},
+            "params": {"throttle_rules": "throttle_rules"},
+            "depends_on": ["draft_messages"],
+            "priority": 1,
+        },
+        {
+            "name": "verify_sent",
+            "team": "QA",
+            "intent": "Verify messages were delivered",
+            "adapter": {"type": "web"},
+            "args": {"action": "verify_sent"},
+            "depends_on": ["send_messages"],
+            "priority": 1,
+        },
+        {
+            "name": "schedule_followups",
+            "team": "Scheduler",
+            "intent": "Schedule follow-up messages",
+            "adapter": {"type": "schedule"},
+            "args": {"cron": "@weekly"},
+        },
+    ],
+    FALLBACK_DOMAIN: [
+        {
+            "name": "generic",
+            "team": "Engineering",
+            "intent": "Perform goal",
+            "adapter": {"type": "files"},
+        },
+    ],
+}
+
+
+def canonical_json(value: Any) -> str:
+    """JSON with sorted keys and no whitespace, equal for equal values."""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class CompiledTemplate:
+    """Prebuilt step prototypes for one domain."""
+
+    def __init__(
+        self,
+        domain: str,
+        names: Sequence[str],
+        prototypes: Sequence[Step],
+        depends: Sequence[Tuple[int, ...]],
+        digest: str = "",
+        bindings: Optional[Sequence[Tuple[Tuple[str, str], ...]]] = None,
+    ):
+        self.domain = domain
+        self.digest = digest  # of the template's entries
+        self.names = tuple(names)
+        self.prototypes = tuple(prototypes)
+        self.depends = tuple(depends)
+        # Per prototype: (arg, spec parameter) pairs
+        self.bindings = tuple(bindings) if bindings is not None else ((),) * len(self.prototypes)
+        self._kinds = tuple(step_kind(step) for step in prototypes)
+        self._estimates: Tuple[int, ...] = ()
+        self._estimated_by: Optional[Tuple[int, int]] = None  # (id(estimator), version)
+
+    def estimates(self, estimator: Optional[TokenEstimator] = None) -> Tuple[int, ...]:
+        """Token estimate per prototype, recomputed only when the estimator has learned."""
+        estimator = estimator or default_estimator
+        stamp = (id(estimator), estimator.version)
+        if stamp != self._estimated_by:
+            self._estimates = tuple(estimator.upper(*kind) for kind in self._kinds)
+            self._estimated_by = stamp
+        return self._estimates
+
+    def instantiate(
+        self,
+        first: int = 1,
+        estimator: Optional[TokenEstimator] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> List[Step]:
+        """Copy the prototypes into new steps numbered from ``first``."""
+        estimates = self.estimates(estimator)
+        return [self._build(i, first, estimates[i], parameters) for i in range(len(self.prototypes))]
+
+    def build(
+        self,
+        index: int,
+        first: int = 1,
+        estimator: Optional[TokenEstimator] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> Step:
+        """Build only the step at ``index``, as ``instantiate`` would."""
+        return self._build(index, first, self.estimates(estimator)[index], parameters)
+
+    def affected(self, fields: Set[str]) -> List[int]:
+        """Indexes of the steps bound to any of the spec parameters ``fields``."""
+        return [i for i, pairs in enumerate(self.bindings) if any(param in fields for _, param in pairs)]
+
+    def downstream(self, fields: Set[str]) -> List[int]:
+        """Indexes of the steps bound to ``fields`` and of every step that depends on them."""
+        reached = set(self.affected(fields))
+        # Dependencies always point to earlier steps, so one forward pass suffices
+        for i, deps in enumerate(self.depends):
+            if i not in reached and any(j in reached for j in deps):
+                reached.add(i)
+        return sorted(reached)
+
+    def _build(self, i: int, first: int, estimate: int, parameters: Optional[Dict[str, Any]]) -> Step:
+        proto = self.prototypes[i]
+        args = dict(proto.args)
+        if parameters:
+            for arg, param in self.bindings[i]:
+                value = parameters.get(param)
+                if value is not None:
+                    args[arg] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        return Step(
+            step_id=f"{self.names[i]}-{first + i}",
+            team=proto.team,
+            intent=proto.intent,
+            adapter=dict(proto.adapter),
+            args=args,
+            needs_secrets=list(proto.needs_secrets),
+            evidence=[],
+            budget_tokens=estimate,
+            requires_human=proto.requires_human,
+            depends_on=[f"{self.names[j]}-{first + j}" for j in self.depends[i]],
+            priority=proto.priority,
+        )
+
+
+def compile_template(domain: str, entries: Sequence[Dict[str, Any]]) -> CompiledTemplate:
+    """Validate a template's entries and build its prototypes.
+
+    Raises ValueError on a duplicate step name, a dependency on a step that
+    is not earlier in the template, or a step that fails ``validate_step``.
+    """
+    if not entries:
+        raise ValueError(f"Template {domain!r} has no steps")
+    names: List[str] = []
+    prototypes: List[Step] = []
+    depends: List[Tuple[int, ...]] = []
+    bindings: List[Tuple[Tuple[str, str], ...]] = []
+    position: Dict[str, int] = {}
+    for entry in entries:
+        fields = dict(entry)
+        name = fields.pop("name")
+        if name in position:
+            raise ValueError(f"Template {domain!r} repeats step {name!r}")
+        needs = fields.pop("depends_on", [])
+        params = fields.pop("params", {})
+        missing = [dep for dep in needs if dep not in position]
+        if missing:
+            raise ValueError(f"Step {name!r} in template {domain!r} depends on unknown steps {missing}")
+        step = Step(step_id=name, **fields)
+        validate_step(step)
+        position[name] = len(names)
+        names.append(name)
+        prototypes.append(step)
+        depends.append(tuple(position[dep] for dep in needs))
+        bindings.append(tuple(sorted(params.items())))
+    digest = hashlib.sha256(canonical_json(list(entries)).encode("utf-8")).hexdigest()
+    return CompiledTemplate(domain, names, prototypes, depends, digest, bindings)
+
+
+_compiled: Dict[str, CompiledTemplate] = {
+    domain: compile_template(domain, entries) for domain, entries in PLAN_TEMPLATES.items()
+}
+_generation = 0  # bumped by register_template
+_fingerprint: Tuple[Optional[Tuple[int, int, int]], str] = (None, "")
+
+
+def register_template(domain: str, entries: Sequence[Dict[str, Any]]) -> CompiledTemplate:
+    """Add or replace the template for ``domain``."""
+    template = compile_template(domain, entries)
+    PLAN_TEMPLATES[domain] = [dict(entry) for entry in entries]
+    global _generation
+    _compiled[domain] = template
+    _generation += 1
+    return template
+
+
+def fingerprint(estimator: Optional[TokenEstimator] = None) -> str:
+    """Digest of every template and its current token estimates.
+
+    It changes when a template is registered or replaced and when learning
+    moves an estimate, but not on observations that leave estimates as they
+    were.
+    """
+    global _fingerprint
+    estimator = estimator or default_estimator
+    stamp = (_generation, id(estimator), estimator.version)
+    if _fingerprint[0] != stamp:
+        parts = [
+            [domain, template.digest, list(template.estimates(estimator))]
+            for domain, template in sorted(_compiled.items())
+        ]
+        _fingerprint = (stamp, hashlib.sha256(canonical_json(parts).encode("utf-8")).hexdigest())
+    return _fingerprint[1]
+
+
+def templates_for(domains: Sequence[str]) -> List[CompiledTemplate]:
+    """Compiled templates for ``domains`` in order, or the fallback if none match."""
+    seen = set()
+    found = []
+    for domain in domains:
+        template = _compiled.get(domain)
+        if template is not None and domain not in seen and domain != FALLBACK_DOMAIN:
+            seen.add(domain)
+            found.append(template)
+    return found or [_compiled[FALLBACK_DOMAIN]]
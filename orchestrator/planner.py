@@ -2,32 +2,61 @@
 
 This planner takes a project specification and returns a Plan object
 conforming to the schema defined in /docs/spec_task_envelope.md. It
-does not call an external LLM; instead, it uses heuristics based on
-domains to construct a minimal viable plan. If the estimated tokens
-exceed the per‑task cap, it downsizes the plan using the cost governor.
+does not call an external LLM; instead, it copies the steps of each
+requested domain's template (see ``plan_templates``) into a minimal viable
+plan. If the estimated tokens exceed the per‑task cap, it downsizes the plan
+using the cost governor.
+
+``plan_projects`` plans many specs at once: identical specs are planned
+once, and large batches are split into chunks planned on a process pool,
+with plans yielded as their chunk completes. Unpickling a plan costs about
+as much as planning it, so callers that only serialise the result should
+ask for ``encode=True`` and let the workers produce the JSON.
 """
 
 from __future__ import annotations
 
-import itertools
-from typing import Dict, Any, List
+import copy
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
+from .core.codec import dumps_text
 from .core.models import Plan, Step
 from .core.validators import validate_plan
-from .cost.governor import estimate_plan, downscope_plan, estimate_step_tokens
+from .cost.budget import load_budget_config
+from .cost.estimator import TokenEstimator
+from .cost.governor import default_estimator, downscope_plan
+from .plan_templates import PLAN_TEMPLATES, canonical_json, register_template, templates_for
+
+
+# Per‑task token cap from config/budget.toml
+PER_TASK_TOKEN_CAP = load_budget_config().per_task_tokens
 
+# Batches with fewer distinct specs than this are planned in-process: one
+# plan takes microseconds, less than shipping it to a worker and back.
+PARALLEL_MIN_SPECS = 2000
+CHUNK_SIZE = 500  # specs per worker task
 
-# Default per‑task token cap; could be loaded from config
-PER_TASK_TOKEN_CAP = 8000
 
+def spec_digest(project_spec: Dict[str, Any]) -> str:
+    """SHA-256 of the spec's canonical JSON: equal specs give equal digests in any process."""
+    return hashlib.sha256(canonical_json(project_spec).encode("utf-8")).hexdigest()
 
-def _generate_step_id(base: str, counter: itertools.count) -> str:
-    return f"{base}-{next(counter)}"
+
+def plan_id_for(project_spec: Dict[str, Any]) -> str:
+    """Stable plan id derived from the whole spec."""
+    return f"plan-{spec_digest(project_spec)[:16]}"
 
 
 def plan_project(project_spec: Dict[str, Any]) -> Plan:
     """Generate a Plan for the given project specification.
 
+    Each domain in ``domains`` that has a template contributes its steps, in
+    the order the domains are listed; a spec with no known domain gets the
+    single generic step.
+
     Args:
         project_spec: Dictionary describing the goal, domains, constraints, parameters.
 
@@ -35,284 +64,89 @@ def plan_project(project_spec: Dict[str, Any]) -> Plan:
         A Plan dataclass instance representing the tasks to perform.
     """
     domains: List[str] = project_spec.get("domains", [])
-    counter = itertools.count(1)
     steps: List[Step] = []
-    # Determine plan id based on goal or a generated id
-    plan_id = f"plan-{abs(hash(project_spec.get('goal', 'task')))%10000}"
-    # Finance domain
-    if "finance" in domains:
-        # Step: fetch market data
-        steps.append(
-            Step(
-                step_id=_generate_step_id("fetch_data", counter),
-                team="Engineering",
-                intent="Fetch market data for target symbols",
-                adapter={"type": "finance"},
-                args={"action": "fetch_data"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "finance"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: compute diffs
-        steps.append(
-            Step(
-                step_id=_generate_step_id("compute_diffs", counter),
-                team="Engineering",
-                intent="Compute portfolio target differences",
-                adapter={"type": "files"},
-                args={"action": "compute_diffs"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "files"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: place orders (paper)
-        steps.append(
-            Step(
-                step_id=_generate_step_id("place_orders", counter),
-                team="Engineering",
-                intent="Place paper orders to rebalance portfolio",
-                adapter={"type": "finance"},
-                args={"action": "place_orders", "mode": "paper"},
-                needs_secrets=["BROKER_KEY"],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "finance"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: verify orders
-        steps.append(
-            Step(
-                step_id=_generate_step_id("verify_orders", counter),
-                team="QA",
-                intent="Verify orders have been accepted and filled",
-                adapter={"type": "finance"},
-                args={"action": "verify_orders"},
-                needs_secrets=["BROKER_KEY"],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "finance"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: schedule nightly summary
-        steps.append(
-            Step(
-                step_id=_generate_step_id("schedule_nightly", counter),
-                team="Scheduler",
-                intent="Schedule nightly summary job",
-                adapter={"type": "schedule"},
-                args={"cron": "0 2 * * *"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "schedule"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-    # Lead generation domain
-    elif "leadgen" in domains:
-        # Step: generate page
-        steps.append(
-            Step(
-                step_id=_generate_step_id("generate_page", counter),
-                team="Engineering",
-                intent="Generate static landing page",
-                adapter={"type": "files"},
-                args={"action": "generate_page"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "files"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: deploy page
-        steps.append(
-            Step(
-                step_id=_generate_step_id("deploy", counter),
-                team="Engineering",
-                intent="Deploy page to hosting platform",
-                adapter={"type": "web"},
-                args={"action": "deploy"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "web"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: configure form backend
-        steps.append(
-            Step(
-                step_id=_generate_step_id("configure_form", counter),
-                team="Engineering",
-                intent="Configure form backend to collect leads",
-                adapter={"type": "web"},
-                args={"action": "configure_form"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "web"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: test form submission
-        steps.append(
-            Step(
-                step_id=_generate_step_id("test_form", counter),
-                team="QA",
-                intent="Test form submission and verify entry in spreadsheet",
-                adapter={"type": "web"},
-                args={"action": "test_form"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "web"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-        # Step: schedule updates (optional)
-        steps.append(
-            Step(
-                step_id=_generate_step_id("schedule_updates", counter),
-                team="Scheduler",
-                intent="Schedule periodic page refreshes",
-                adapter={"type": "schedule"},
-                args={"cron": "@weekly"},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "schedule"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
-    else:
-        # Fallback: one generic step
-        steps.append(
-            Step(
-                step_id=_generate_step_id("generic", counter),
-                team="Engineering",
-                intent="Perform goal",
-                adapter={"type": "files"},
-                args={},
-                needs_secrets=[],
-                evidence=[],
-                budget_tokens=estimate_step_tokens(Step(
-                    step_id="tmp",
-                    team="Engineering",
-                    intent="",
-                    adapter={"type": "files"},
-                    args={},
-                    needs_secrets=[],
-                    evidence=[],
-                    budget_tokens=0,
-                    requires_human=False,
-                )),
-                requires_human=False,
-            )
-        )
+    plan_id = plan_id_for(project_spec)
+    parameters = project_spec.get("parameters") or {}
+    for template in templates_for(domains):
+        steps.extend(template.instantiate(len(steps) + 1, parameters=parameters))
     plan = Plan(plan_id=plan_id, gates=["gate1"], steps=steps)
     # Downscope if necessary
-    estimate = estimate_plan(plan)
-    if estimate.total_tokens > PER_TASK_TOKEN_CAP:
+    if sum(step.budget_tokens for step in steps) > PER_TASK_TOKEN_CAP:
         plan = downscope_plan(plan, PER_TASK_TOKEN_CAP)
     # Validate plan structure; raise if invalid
     validate_plan(plan)
-    return plan
\ No newline at end of file
+    return plan
+
+
+def plan_projects(
+    specs: Iterable[Dict[str, Any]],
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    encode: bool = False,
+) -> Iterator[Tuple[int, Union[Plan, str]]]:
+    """Plan many specs, yielding ``(index, plan)`` pairs as plans complete.
+
+    With ``encode`` the plan is yielded as a JSON object string instead.
+
+    Specs with the same digest are planned once; each duplicate still gets
+    its own copy of the plan. Batches of at least ``PARALLEL_MIN_SPECS``
+    distinct specs are planned in chunks of ``chunk_size`` on a process pool
+    of ``workers`` processes (default: CPU count), so pairs arrive in chunk
+    completion order rather than spec order. Workers plan with this
+    process's templates, learned estimates and cap. An invalid spec raises
+    from the iterator, as ``plan_project`` would.
+    """
+    indexes: Dict[str, List[int]] = {}
+    unique: List[Tuple[str, Dict[str, Any]]] = []
+    for index, spec in enumerate(specs):
+        digest = spec_digest(spec)
+        if digest not in indexes:
+            indexes[digest] = []
+            unique.append((digest, spec))
+        indexes[digest].append(index)
+    workers = workers or os.cpu_count() or 1
+    if len(unique) < PARALLEL_MIN_SPECS or workers < 2:
+        for digest, spec in unique:
+            yield from _fan_out(indexes[digest], _plan_one(spec, encode))
+        return
+    chunks = [unique[i:i + chunk_size] for i in range(0, len(unique), chunk_size)]
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(chunks)),
+        initializer=_init_worker,
+        initargs=(default_estimator, PLAN_TEMPLATES, PER_TASK_TOKEN_CAP),
+    ) as pool:
+        futures = [pool.submit(_plan_chunk, [spec for _, spec in chunk], encode) for chunk in chunks]
+        chunk_of = {future: chunk for future, chunk in zip(futures, chunks)}
+        try:
+            for future in as_completed(futures):
+                for (digest, _), plan in zip(chunk_of[future], future.result()):
+                    yield from _fan_out(indexes[digest], plan)
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _fan_out(indexes: List[int], plan: Union[Plan, str]) -> Iterator[Tuple[int, Union[Plan, str]]]:
+    yield indexes[0], plan
+    for index in indexes[1:]:
+        # Strings are immutable; plans are copied so callers can edit them
+        yield index, plan if isinstance(plan, str) else copy.deepcopy(plan)
+
+
+def _init_worker(estimator: TokenEstimator, templates: Dict[str, List[Dict[str, Any]]], cap: int) -> None:
+    """Give a worker process the parent's planning state."""
+    global PER_TASK_TOKEN_CAP
+    default_estimator.assign(estimator)
+    for domain, entries in templates.items():
+        if PLAN_TEMPLATES.get(domain) != entries:
+            register_template(domain, entries)
+    PER_TASK_TOKEN_CAP = cap
+
+
+def _plan_one(spec: Dict[str, Any], encode: bool) -> Union[Plan, str]:
+    plan = plan_project(spec)
+    return dumps_text(plan) if encode else plan
+
+
+def _plan_chunk(specs: List[Dict[str, Any]], encode: bool) -> List[Union[Plan, str]]:
+    return [_plan_one(spec, encode) for spec in specs]
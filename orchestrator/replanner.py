@@ -0,0 +1,140 @@
+"""Incremental replanning after a spec changes.
+
+Each intake round (``IntakeManager.collect_answers``) changes some spec
+parameters. Rather than planning the whole spec again, ``replan`` uses the
+templates' parameter bindings to find the steps that read a changed
+parameter and rebuilds, re-estimates and re-validates only those. A change of
+domains alters which templates apply, so it falls back to planning the new
+spec in full and diffing the two plans by ``step_id``.
+
+The result keeps the original ``plan_id`` (it is the same piece of work) and
+comes with a ``PlanDiff`` of added, changed and removed steps.
+``apply_plan_diff`` brings the plan's lane in line with it, both in the
+queue and among the steps the ``PlanExecutor`` holds back: changed steps are
+updated in place, keeping their position and what they wait for, removed
+ones are dropped and new ones are added behind their dependencies. Only the
+plan's own lane is touched, since other plans from the same templates share
+its step ids. Steps already dispatched are left alone.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import planner
+from .core.codec import to_dict
+from .core.models import Plan, Step
+from .core.validators import validate_plan, validate_step
+from .cost.estimator import TokenEstimator
+from .cost.governor import downscope_plan
+from .plan_executor import PlanExecutor
+from .plan_templates import templates_for
+
+
+@dataclass
+class PlanDiff:
+    """Steps to add, update and remove to turn one plan into another."""
+
+    plan_id: str
+    added: List[Step] = field(default_factory=list)
+    changed: List[Step] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)  # step_ids
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+def changed_parameters(old_spec: Dict[str, Any], new_spec: Dict[str, Any]) -> Set[str]:
+    """Names of the spec parameters whose values differ."""
+    old = old_spec.get("parameters") or {}
+    new = new_spec.get("parameters") or {}
+    return {name for name in old.keys() | new.keys() if old.get(name) != new.get(name)}
+
+
+def diff_plans(old: Plan, new: Plan) -> PlanDiff:
+    """Compare two plans step by step, matching steps on ``step_id``."""
+    before = {step.step_id: step for step in old.steps}
+    after = {step.step_id for step in new.steps}
+    diff = PlanDiff(old.plan_id)
+    for step in new.steps:
+        previous = before.get(step.step_id)
+        if previous is None:
+            diff.added.append(step)
+        elif previous != step:
+            diff.changed.append(step)
+    diff.removed = [step.step_id for step in old.steps if step.step_id not in after]
+    return diff
+
+
+def replan(
+    plan: Plan,
+    old_spec: Dict[str, Any],
+    new_spec: Dict[str, Any],
+    estimator: Optional[TokenEstimator] = None,
+) -> Tuple[Plan, PlanDiff]:
+    """Update ``plan`` (built from ``old_spec``) for ``new_spec``.
+
+    Returns the new plan and the diff from ``plan``; ``plan`` itself is not
+    modified. Raises ValueError if a rebuilt step is invalid.
+    """
+    templates = templates_for(new_spec.get("domains", []))
+    if [t.domain for t in templates] != [t.domain for t in templates_for(old_spec.get("domains", []))]:
+        rebuilt = planner.plan_project(new_spec)
+        rebuilt.plan_id = plan.plan_id
+        return rebuilt, diff_plans(plan, rebuilt)
+
+    fields = changed_parameters(old_spec, new_spec)
+    if not fields:
+        return plan, PlanDiff(plan.plan_id)
+    parameters = new_spec.get("parameters") or {}
+    position = {step.step_id: i for i, step in enumerate(plan.steps)}
+    steps = list(plan.steps)
+    diff = PlanDiff(plan.plan_id)
+    first = 1
+    for template in templates:
+        for index in template.affected(fields):
+            pos = position.get(f"{template.names[index]}-{first + index}")
+            if pos is None:
+                continue  # cut when the plan was downscoped
+            step = template.build(index, first, estimator, parameters)
+            validate_step(step)
+            if step != steps[pos]:
+                steps[pos] = step
+                diff.changed.append(step)
+        first += len(template.names)
+    updated = Plan(plan_id=plan.plan_id, gates=list(plan.gates), steps=steps)
+    if sum(step.budget_tokens or 0 for step in steps) > planner.PER_TASK_TOKEN_CAP:
+        updated = downscope_plan(updated, planner.PER_TASK_TOKEN_CAP, estimator)
+        kept = {step.step_id for step in updated.steps}
+        diff.changed = [step for step in diff.changed if step.step_id in kept]
+        diff.removed = [step.step_id for step in steps if step.step_id not in kept]
+        validate_plan(updated)
+    return updated, diff
+
+
+def apply_plan_diff(executor: PlanExecutor, diff: PlanDiff, lane: Optional[str] = None) -> Dict[str, int]:
+    """Apply ``diff`` to the steps of its plan still waiting in ``lane`` (default: the plan id).
+
+    Queued and held steps are both updated. Returns how many steps were
+    added, updated and removed.
+    """
+    lane = lane or diff.plan_id
+    queue = executor.queue
+    counts = {"added": 0, "changed": 0, "removed": 0}
+    for step_id in diff.removed:
+        counts["removed"] += queue.cancel(step_id, lane=lane)
+    counts["removed"] += executor.drop(lane, diff.removed)
+    for step in diff.changed:
+        # Merged into each step, keeping fields added at enqueue time
+        # (task_id, project, its run, ...)
+        fields = to_dict(step)
+        counts["changed"] += queue.update(step.step_id, fields, lane=lane)
+        counts["changed"] += executor.update(lane, step.step_id, fields)
+    if diff.added:
+        counts["added"] = executor.extend([_queued_body(step, diff.plan_id) for step in diff.added], lane)
+    return counts
+
+
+def _queued_body(step: Step, plan_id: str) -> Dict[str, Any]:
+    return {**to_dict(step), "plan_id": plan_id}
@@ -0,0 +1,202 @@
+"""Runner registry and step leases.
+
+Every WebSocket connection on ``/ws`` registers a runner here. When a step is
+sent to a runner it is leased to that runner: the lease records who owns the
+step and when ownership lapses. Heartbeats and acknowledgements from the
+runner renew its leases. A lease ends in one of three ways:
+
+* the runner returns a result and the lease is completed;
+* the runner disconnects and all of its leases are re-queued;
+* the runner goes silent for ``lease_timeout`` seconds and the lease expires,
+  re-queueing the step for another runner.
+
+Distribution across runners is pull based. All connections draw from the
+shared ``DispatchQueue`` and only when they have capacity, and idle
+connections are woken in FIFO order, so work spreads evenly over N runners
+and an idle runner always takes the next step rather than it waiting behind
+a busy one.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .dispatch_queue import DispatchQueue, QueuedStep
+
+
+LEASE_TIMEOUT = 60.0  # seconds without a sign of life before a lease lapses
+
+
+@dataclass
+class Lease:
+    lease_id: str
+    runner_id: str
+    queued: QueuedStep
+    expires_at: float
+    acked: bool = False
+
+    @property
+    def step_id(self) -> str:
+        return str(self.queued.step.get("step_id", ""))
+
+
+@dataclass
+class RunnerInfo:
+    runner_id: str
+    connected_at: float
+    last_seen: float
+    leases: Dict[str, Lease] = field(default_factory=dict)
+    dispatched: int = 0
+    completed: int = 0
+    status: Dict[str, Any] = field(default_factory=dict)
+
+
+class RunnerRegistry:
+    """Tracks connected runners and the steps leased to each of them."""
+
+    def __init__(
+        self,
+        queue: DispatchQueue,
+        lease_timeout: float = LEASE_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.queue = queue
+        self.lease_timeout = lease_timeout
+        self.clock = clock
+        self._runners: Dict[str, RunnerInfo] = {}
+        self._leases: Dict[str, Lease] = {}
+        self._runner_ids = itertools.count(1)
+        self._lease_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def register(self, runner_id: Optional[str] = None) -> str:
+        """Register a runner connection and return its id."""
+        now = self.clock()
+        with self._lock:
+            if runner_id is None or runner_id in self._runners:
+                runner_id = f"runner-{next(self._runner_ids)}"
+            self._runners[runner_id] = RunnerInfo(runner_id=runner_id, connected_at=now, last_seen=now)
+        return runner_id
+
+    def unregister(self, runner_id: str) -> int:
+        """Remove a runner and re-queue every step it still holds."""
+        with self._lock:
+            info = self._runners.pop(runner_id, None)
+            if info is None:
+                return 0
+            leases = list(info.leases.values())
+            for lease in leases:
+                del self._leases[lease.lease_id]
+        for lease in leases:
+            self.queue.restore(lease.queued)
+        return len(leases)
+
+    def heartbeat(self, runner_id: str, status: Optional[Dict[str, Any]] = None) -> None:
+        """Record a sign of life from a runner and renew its leases."""
+        now = self.clock()
+        with self._lock:
+            info = self._runners.get(runner_id)
+            if info is None:
+                return
+            info.last_seen = now
+            if status:
+                info.status = status
+            for lease in info.leases.values():
+                lease.expires_at = now + self.lease_timeout
+
+    def lease(self, runner_id: str, queued: QueuedStep) -> Lease:
+        """Lease a popped step to a runner."""
+        with self._lock:
+            info = self._runners[runner_id]
+            lease = Lease(
+                lease_id=f"{runner_id}:{next(self._lease_ids)}",
+                runner_id=runner_id,
+                queued=queued,
+                expires_at=self.clock() + self.lease_timeout,
+            )
+            info.leases[lease.lease_id] = lease
+            info.dispatched += 1
+            self._leases[lease.lease_id] = lease
+        return lease
+
+    def ack(self, runner_id: str, step_id: str) -> bool:
+        """Mark the runner's lease on ``step_id`` as acknowledged."""
+        self.heartbeat(runner_id)
+        with self._lock:
+            info = self._runners.get(runner_id)
+            if info is None:
+                return False
+            for lease in info.leases.values():
+                if lease.step_id == step_id and not lease.acked:
+                    lease.acked = True
+                    return True
+        return False
+
+    def complete(self, lease_id: str) -> Optional[Lease]:
+        """End a lease because its result arrived.
+
+        Returns None if the lease had already expired or been re-queued, in
+        which case the result is stale.
+        """
+        with self._lock:
+            lease = self._leases.pop(lease_id, None)
+            if lease is None:
+                return None
+            info = self._runners.get(lease.runner_id)
+            if info is not None:
+                info.leases.pop(lease_id, None)
+                info.completed += 1
+                info.last_seen = self.clock()
+        return lease
+
+    def find_lease(self, runner_id: str, step_id: str) -> Optional[Lease]:
+        """Return the runner's oldest lease on ``step_id``."""
+        with self._lock:
+            info = self._runners.get(runner_id)
+            if info is None:
+                return None
+            for lease in info.leases.values():
+                if lease.step_id == step_id:
+                    return lease
+        return None
+
+    def is_active(self, lease_id: str) -> bool:
+        return lease_id in self._leases
+
+    def expire(self, now: Optional[float] = None) -> List[Lease]:
+        """Re-queue every lease whose deadline has passed."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            expired = [lease for lease in self._leases.values() if lease.expires_at <= now]
+            for lease in expired:
+                del self._leases[lease.lease_id]
+                info = self._runners.get(lease.runner_id)
+                if info is not None:
+                    info.leases.pop(lease.lease_id, None)
+        for lease in expired:
+            self.queue.restore(lease.queued)
+        return expired
+
+    def in_flight(self, runner_id: str) -> int:
+        info = self._runners.get(runner_id)
+        return len(info.leases) if info is not None else 0
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return a JSON-friendly summary of connected runners."""
+        now = self.clock()
+        with self._lock:
+            return [
+                {
+                    "runner_id": info.runner_id,
+                    "in_flight": len(info.leases),
+                    "dispatched": info.dispatched,
+                    "completed": info.completed,
+                    "idle_seconds": round(now - info.last_seen, 3),
+                    "status": info.status,
+                }
+                for info in self._runners.values()
+            ]
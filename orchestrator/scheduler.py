@@ -7,12 +7,18 @@ budget caps. It supports interval and basic cron triggers with jitter
 
 Jobs are stored in ``schedules/jobs.yaml``. Each job entry may include:
 
+* ``id``: a stable identifier, assigned when the job is first stored.
 * ``cron``: a string in the form ``"M H * * *"`` where M is minute and H is hour.
   Only minute and hour are honored; the other fields are ignored. Wildcards (``*``)
   are permitted for either the minute or hour.
 * ``interval``: an integer number of seconds between runs. When set, cron is ignored.
+* ``run_at``: a datetime for a one-shot job. The job runs once at (or after)
+  that time and is then removed. Budget spillover uses these.
 * ``task_ref``: a string identifying the task to run when the trigger fires. The
   scheduler calls a function registered for this name in ``job_functions``.
+* ``args``: an optional mapping passed to that function as keyword arguments.
+* ``reserved_tokens``: tokens the job has reserved on the budget day (UTC
+  date, like the cost ledger's) it runs; see ``reservations``.
 * ``constraints``: a mapping of additional constraints such as quiet hours.
 
 On instantiation, the scheduler loads all defined jobs from the YAML file and
@@ -21,6 +27,21 @@ executes any jobs whose ``next_run`` timestamp is in the past, provided the
 current time is outside the quiet hours (02:00–06:00 local) and the daily
 budget cap has not been exceeded.
 
+Jobs are indexed by a min-heap keyed on ``next_run``, so a tick only looks at
+the jobs that are due: O(k log n) for k due jobs out of n. Changing a job's
+``next_run`` or removing it pushes a new heap entry or forgets the job, and
+the entries this leaves behind are skipped when they reach the top (lazy
+deletion). Jobs therefore have to be changed through ``add_job``,
+``reschedule`` and ``remove_job``; ``jobs`` is a read-only tuple. The clock
+is injectable (``clock``), so schedules can be driven by a virtual time.
+
+Changes are persisted incrementally: each changed or removed job is
+appended as one JSON line to ``<jobs_path>.journal``, which ``load_jobs``
+replays on top of the YAML file. Once the journal holds more lines than
+there are jobs (and at least ``JOURNAL_COMPACT_MIN``), ``save_jobs``
+rewrites the YAML file and empties it, so persistence costs O(k) per tick
+plus an amortized O(1) per change.
+
 This scheduler does not create background threads. Instead, clients must
 periodically call ``run_pending()`` to execute due jobs. This design simplifies
 testing and integration with the orchestrator’s existing event loop.
@@ -29,13 +50,18 @@ testing and integration with the orchestrator’s existing event loop.
 from __future__ import annotations
 
 import datetime as _dt
+import heapq
+import itertools
+import json
 import os
 import random
 import threading
-from typing import Any, Callable, Dict, List, Optional
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import yaml
 
+from .cost.budget import BudgetEngine, load_budget_config
 from .cost.ledger import CostLedger
 
 # Constants for quiet hours (local time)
@@ -45,68 +71,199 @@ QUIET_END_HOUR = 6    # 06:00 local
 JITTER_MIN = 120  # 2 minutes in seconds
 JITTER_MAX = 300  # 5 minutes in seconds
 
+# Rebuild the heap once stale entries outnumber the live ones by this factor
+HEAP_COMPACT_RATIO = 2
+# Smallest journal (in lines) that is folded back into the YAML file
+JOURNAL_COMPACT_MIN = 1024
+
+# libyaml's loader and dumper when PyYAML was built with it
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YamlDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def _serialize(job: Dict[str, Any]) -> Dict[str, Any]:
+    entry = dict(job)
+    # Convert datetimes to ISO format
+    for key in ("last_run", "next_run", "run_at"):
+        if isinstance(entry.get(key), _dt.datetime):
+            entry[key] = entry[key].isoformat()
+    return entry
+
+
 class Scheduler:
     """Job scheduler that reads jobs from a YAML file and executes them."""
 
-    def __init__(self, jobs_path: str = "schedules/jobs.yaml", timezone: str = "America/Phoenix"):
+    def __init__(
+        self,
+        jobs_path: str = "schedules/jobs.yaml",
+        timezone: str = "America/Phoenix",
+        ledger: Optional[CostLedger] = None,
+        budget: Optional[BudgetEngine] = None,
+        clock: Callable[[], _dt.datetime] = _dt.datetime.now,
+    ):
+        # None keeps jobs in memory only
         self.jobs_path = jobs_path
         self.timezone = timezone  # Not currently used; placeholder for future tz handling
-        self.job_functions: Dict[str, Callable[[], None]] = {}
-        self.jobs: List[Dict[str, Any]] = []
+        self.clock = clock
+        self.job_functions: Dict[str, Callable[..., None]] = {}
         self.lock = threading.Lock()
-        # Instantiate a ledger to check daily token usage
-        self._ledger = CostLedger()
+        # id(job) -> job, in the order jobs were added
+        self._jobs: Dict[int, Dict[str, Any]] = {}
+        # (next_run, seq, id(job)); an entry is live while _seqs[id(job)] == seq
+        self._heap: List[Tuple[_dt.datetime, int, int]] = []
+        self._seqs: Dict[int, int] = {}
+        self._counter = itertools.count()
+        # Budget day -> reserved_tokens of the jobs due that day, and what
+        # each job has booked there
+        self._reserved: Dict[_dt.date, int] = {}
+        self._booked: Dict[int, Tuple[_dt.date, int]] = {}
+        # Lines in the journal, and whether the YAML file lacks job ids
+        self._journaled = 0
+        self._compact_pending = False
+        # Use the caller's ledger (the service shares its own) or open one to
+        # check daily token usage
+        self._ledger = ledger if ledger is not None else CostLedger()
+        # Daily cap comes from the shared budget engine (config/budget.toml)
+        self._budget = budget if budget is not None else BudgetEngine(
+            load_budget_config(), daily_usage=self._tokens_today
+        )
         self.load_jobs()
 
-    def register(self, name: str, fn: Callable[[], None]) -> None:
+    def register(self, name: str, fn: Callable[..., None]) -> None:
         """Register a callable to be invoked when a job with task_ref == name fires."""
         self.job_functions[name] = fn
 
+    @property
+    def jobs(self) -> Tuple[Dict[str, Any], ...]:
+        """The scheduled jobs, in the order they were added.
+
+        Read-only: change jobs with ``add_job``, ``reschedule`` and
+        ``remove_job`` so the index and the job store see the change.
+        """
+        return tuple(self._jobs.values())
+
+    @property
+    def journal_path(self) -> str:
+        return f"{self.jobs_path}.journal"
+
     def load_jobs(self) -> None:
-        """Load jobs from the YAML file and compute next_run times."""
-        if not os.path.exists(self.jobs_path):
-            # Nothing to load
-            self.jobs = []
-            return
-        with open(self.jobs_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-        self.jobs = []
-        for entry in data.get("jobs", []):
+        """Load jobs from the YAML file and its journal and compute next_run times."""
+        self._jobs = {}
+        self._heap = []
+        self._seqs = {}
+        self._reserved = {}
+        self._booked = {}
+        self._journaled = 0
+        self._compact_pending = False
+        entries: Dict[str, Dict[str, Any]] = {}
+        if self.jobs_path and os.path.exists(self.jobs_path):
+            with open(self.jobs_path, "r", encoding="utf-8") as f:
+                data = yaml.load(f, Loader=_YamlLoader) or {}
+            for entry in data.get("jobs", []):
+                if not entry.get("id"):
+                    # Written by hand or before ids; the next save adds them
+                    entry = dict(entry, id=_new_id())
+                    self._compact_pending = True
+                entries[str(entry["id"])] = entry
+        if self.jobs_path and os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final write
+                    self._journaled += 1
+                    if change["op"] == "put":
+                        entries[change["job"]["id"]] = change["job"]
+                    else:
+                        entries.pop(change["id"], None)
+        for entry in entries.values():
             job = dict(entry)  # shallow copy
             # Convert last_run and next_run to datetime objects if present
             if "last_run" in job and isinstance(job["last_run"], str):
                 job["last_run"] = _dt.datetime.fromisoformat(job["last_run"])
             if "next_run" in job and isinstance(job["next_run"], str):
                 job["next_run"] = _dt.datetime.fromisoformat(job["next_run"])
+            if "run_at" in job and isinstance(job["run_at"], str):
+                job["run_at"] = _dt.datetime.fromisoformat(job["run_at"])
             # Compute next_run if missing
             if "next_run" not in job:
                 job["next_run"] = self._compute_next_run(job)
-            self.jobs.append(job)
+            self._jobs[id(job)] = job
+            seq = next(self._counter)
+            if isinstance(job["next_run"], _dt.datetime):
+                self._seqs[id(job)] = seq
+                self._heap.append((job["next_run"], seq, id(job)))
+            self._book(job)
+        heapq.heapify(self._heap)
 
     def save_jobs(self) -> None:
-        """Persist jobs back to the YAML file. Datetimes are serialized as ISO strings."""
-        os.makedirs(os.path.dirname(self.jobs_path), exist_ok=True)
-        serialized = {"jobs": []}
-        for job in self.jobs:
-            entry = dict(job)
-            # Convert datetimes to ISO format
-            if isinstance(entry.get("last_run"), _dt.datetime):
-                entry["last_run"] = entry["last_run"].isoformat()
-            if isinstance(entry.get("next_run"), _dt.datetime):
-                entry["next_run"] = entry["next_run"].isoformat()
-            serialized["jobs"].append(entry)
-        with open(self.jobs_path, "w", encoding="utf-8") as f:
-            yaml.safe_dump(serialized, f)
-
-    def add_job(self, job: Dict[str, Any]) -> None:
-        """Add a new job to the scheduler and persist it."""
+        """Persist all jobs to the YAML file and empty the journal.
+
+        Datetimes are serialized as ISO strings.
+        """
+        if not self.jobs_path:
+            return
+        os.makedirs(os.path.dirname(self.jobs_path) or ".", exist_ok=True)
+        serialized = {"jobs": [_serialize(job) for job in self._jobs.values()]}
+        tmp = f"{self.jobs_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            yaml.dump(serialized, f, Dumper=_YamlDumper)
+        os.replace(tmp, self.jobs_path)
+        # Replaying the journal over the new file would be harmless (puts and
+        # deletes by id), so a crash before this point loses nothing
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journaled = 0
+        self._compact_pending = False
+
+    def add_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a new job to the scheduler and persist it. Returns the stored job."""
         with self.lock:
             job = dict(job)
-            # Compute initial next_run time
-            job["next_run"] = self._compute_next_run(job)
+            job.setdefault("id", _new_id())
             job.setdefault("last_run", None)
-            self.jobs.append(job)
-            self.save_jobs()
+            self._jobs[id(job)] = job
+            # Compute initial next_run time
+            self._set_next_run(job, self._compute_next_run(job))
+            self._persist([job])
+        return job
+
+    def reschedule(self, job: Dict[str, Any], next_run: _dt.datetime) -> None:
+        """Move a stored job's next run to ``next_run`` and persist it."""
+        with self.lock:
+            if id(job) not in self._jobs:
+                raise KeyError("Job is not scheduled")
+            self._set_next_run(job, next_run)
+            self._persist([job])
+
+    def remove_job(self, job: Dict[str, Any]) -> bool:
+        """Remove a stored job and persist the change. Returns whether it was scheduled."""
+        with self.lock:
+            if self._jobs.pop(id(job), None) is None:
+                return False
+            # Its heap entry goes stale and is skipped when it surfaces
+            self._seqs.pop(id(job), None)
+            self._unbook(id(job))
+            self._persist([], [job["id"]])
+            return True
+
+    def reservations(self) -> Dict[_dt.date, int]:
+        """Return tokens reserved by pending jobs, keyed by the budget day they run."""
+        with self.lock:
+            return dict(self._reserved)
+
+    def reserved_on(self, day: _dt.date) -> int:
+        """Tokens reserved by pending jobs on budget day ``day``.
+
+        Does not take the lock, so the budget engine can call it while the
+        scheduler is running jobs.
+        """
+        return self._reserved.get(day, 0)
 
     def run_pending(self) -> None:
         """Execute all jobs that are scheduled to run at or before now.
@@ -115,14 +272,15 @@ class Scheduler:
         After execution, the job's next_run time is updated and persisted. If a job
         cannot run due to quiet hours or budget caps, its next_run is deferred.
         """
-        now = _dt.datetime.now()
+        now = self.clock()
         with self.lock:
-            for job in self.jobs:
-                next_run = job.get("next_run")
-                if not isinstance(next_run, _dt.datetime):
-                    continue
-                if next_run > now:
-                    continue
+            # Take every due job before running any, so a job rescheduled to
+            # now runs at most once per tick
+            due = self._pop_due(now)
+            if not due:
+                return
+            finished: List[str] = []
+            for job in due:
                 # Check quiet hours: if current time falls within quiet hours, postpone until end
                 if self._in_quiet_hours(now):
                     # postpone to end of quiet hours; if already past the quiet end hour, defer to next day
@@ -130,32 +288,102 @@ class Scheduler:
                     if now.hour >= QUIET_END_HOUR:
                         defer_date = defer_date + _dt.timedelta(days=1)
                     defer_time = _dt.datetime.combine(defer_date, _dt.time(hour=QUIET_END_HOUR))
-                    job["next_run"] = self._apply_jitter(defer_time)
+                    self._set_next_run(job, self._apply_jitter(defer_time))
                     continue
-                # Check budget caps via ledger. totals_today returns dict with keys 'in_tokens', 'out_tokens', 'usd'.
-                totals = self._ledger.totals_today()
-                # Hardcoded daily token cap for scheduler enforcement (sum of in/out tokens)
-                DAILY_TOKENS_CAP = 25000
-                used_tokens = totals.get("in_tokens", 0) + totals.get("out_tokens", 0)
-                if used_tokens >= DAILY_TOKENS_CAP:
+                # Check the daily token cap (used plus reserved in/out tokens)
+                if self._budget.remaining() <= 0:
                     # budget exceeded; defer to next day
                     tomorrow = now + _dt.timedelta(days=1)
                     start = tomorrow.replace(hour=QUIET_END_HOUR, minute=0, second=0, microsecond=0)
-                    job["next_run"] = self._apply_jitter(start)
+                    self._set_next_run(job, self._apply_jitter(start))
                     continue
                 # Execute the job
                 task_ref = job.get("task_ref")
                 fn = self.job_functions.get(task_ref)
                 if fn:
                     try:
-                        fn()
+                        fn(**(job.get("args") or {}))
                     except Exception:
                         # Ignore exceptions in job functions to prevent scheduler crash
                         pass
                 job["last_run"] = now
-                job["next_run"] = self._compute_next_run(job)
-            # Persist updates
+                if job.get("run_at") is not None:
+                    # One-shot job: done
+                    del self._jobs[id(job)]
+                    self._unbook(id(job))
+                    finished.append(job["id"])
+                    continue
+                self._set_next_run(job, self._compute_next_run(job))
+            # Persist the jobs this tick touched
+            self._persist([job for job in due if id(job) in self._jobs], finished)
+
+    def _persist(self, changed: Iterable[Dict[str, Any]], removed: Iterable[str] = ()) -> None:
+        # Caller holds the lock. Journal the changes, or rewrite the YAML file
+        # once the journal outgrows the job list.
+        if not self.jobs_path:
+            return
+        lines = [json.dumps({"op": "put", "job": _serialize(job)}) for job in changed]
+        lines += [json.dumps({"op": "del", "id": job_id}) for job_id in removed]
+        if self._compact_pending or self._journaled + len(lines) > max(JOURNAL_COMPACT_MIN, len(self._jobs)):
             self.save_jobs()
+            return
+        os.makedirs(os.path.dirname(self.jobs_path) or ".", exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        self._journaled += len(lines)
+
+    def _set_next_run(self, job: Dict[str, Any], next_run: Any) -> None:
+        # Caller holds the lock; any older heap entry for the job goes stale
+        job["next_run"] = next_run
+        key = id(job)
+        self._book(job)
+        if not isinstance(next_run, _dt.datetime):
+            self._seqs.pop(key, None)
+            return
+        seq = next(self._counter)
+        self._seqs[key] = seq
+        heapq.heappush(self._heap, (next_run, seq, key))
+        if len(self._heap) > HEAP_COMPACT_RATIO * len(self._seqs) + 64:
+            self._heap = [entry for entry in self._heap if self._seqs.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def _book(self, job: Dict[str, Any]) -> None:
+        # Caller holds the lock; moves the job's reserved tokens to its run day
+        self._unbook(id(job))
+        tokens = job.get("reserved_tokens")
+        next_run = job.get("next_run")
+        if tokens and isinstance(next_run, _dt.datetime):
+            # Naive run times are local; budget days are UTC dates
+            day = next_run.astimezone(_dt.timezone.utc).date()
+            self._booked[id(job)] = (day, int(tokens))
+            self._reserved[day] = self._reserved.get(day, 0) + int(tokens)
+
+    def _unbook(self, key: int) -> None:
+        booked = self._booked.pop(key, None)
+        if booked is None:
+            return
+        day, tokens = booked
+        left = self._reserved[day] - tokens
+        if left:
+            self._reserved[day] = left
+        else:
+            del self._reserved[day]
+
+    def _pop_due(self, now: _dt.datetime) -> List[Dict[str, Any]]:
+        # Caller holds the lock. Due jobs leave the index until rescheduled.
+        heap = self._heap
+        seqs = self._seqs
+        due: List[Dict[str, Any]] = []
+        while heap and heap[0][0] <= now:
+            _, seq, key = heapq.heappop(heap)
+            if seqs.get(key) == seq:
+                del seqs[key]
+                due.append(self._jobs[key])
+        return due
+
+    def _tokens_today(self) -> int:
+        totals = self._ledger.totals_today()
+        return totals.get("in_tokens", 0) + totals.get("out_tokens", 0)
 
     def _apply_jitter(self, run_time: _dt.datetime) -> _dt.datetime:
         """Apply positive jitter between 2–5 minutes to a scheduled run time.
@@ -175,10 +403,19 @@ class Scheduler:
         absent, runs immediately. Applies jitter and ensures the next run is
         outside quiet hours.
         """
-        now = _dt.datetime.now()
+        now = self.clock()
         interval = job.get("interval")
         cron_expr = job.get("cron")
+        run_at = job.get("run_at")
         next_run: Optional[_dt.datetime] = None
+        if isinstance(run_at, str):
+            run_at = _dt.datetime.fromisoformat(run_at)
+        if run_at is not None:
+            # One-shot: run at the given time (never earlier), outside quiet hours
+            next_run = max(run_at, now)
+            if self._in_quiet_hours(next_run):
+                next_run = _dt.datetime.combine(next_run.date(), _dt.time(hour=QUIET_END_HOUR))
+            return next_run
         if interval is not None:
             try:
                 seconds = int(interval)
@@ -6,28 +6,142 @@ and a WebSocket for step dispatch and result collection.
 
 from __future__ import annotations
 
-from typing import List, Dict, Any
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 
+from .core.codec import dumps_text, loads, to_dict
 from .core.models import Plan, Step, StepResult
-from .cost.governor import estimate_plan, estimate_step_tokens
-from .cost.ledger import CostLedger
+from .core.validators import ValidationError, default_validator
+from .cost.estimator import step_kind
+from .cost.governor import (
+    default_estimator,
+    estimate_plan,
+    estimate_step_tokens,
+    plan_budget_windows,
+)
+from .cost.budget import BudgetEngine, Refusal, Reservation, load_budget_config
+from .cost.ledger import LEDGER_PATH, CostLedger
+from .dispatch_queue import DEFAULT_LANE, DispatchQueue, QueuedStep
+from .intake.consent import CONSENT_DIR, ConsentStore, admission_refusal, spend_refusal
+from .intake.intake_manager import IntakeManager
+from .intake.sessions import INTAKE_SESSIONS_DIR, SessionStore
+from .plan_cache import PLAN_CACHE_DIR, PlanCache
+from .plan_executor import RUN_FIELD, PlanExecutor
+from .planner import plan_projects
+from .runners import Lease, RunnerRegistry
+from .scheduler import Scheduler
+from .wal import WAL_DIR, WriteAheadLog
 
 
-app = FastAPI()
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    poller = asyncio.create_task(_run_scheduler())
+    yield
+    poller.cancel()
+    # Commit buffered ledger entries and close the log on shutdown
+    ledger.close()
+    wal.close()
 
-# In-memory store of queued steps, runs, and parked items
-queue: List[Dict[str, Any]] = []
-runs: List[Dict[str, Any]] = []
-parked: List[Dict[str, Any]] = []
 
-# Instantiate a cost ledger for recording token usage
-ledger = CostLedger()
+app = FastAPI(lifespan=_lifespan)
 
-# Budget caps (static for now; could be loaded from config)
-MAX_DAILY_TOKENS = 25000
-WARN_THRESHOLD = 0.8  # 80% usage
-STOP_THRESHOLD = 0.9  # 90% usage
+# In-memory store of queued steps, runs, and parked items, rebuilt from the
+# write-ahead log on startup. The log owns the runs and parked lists; every
+# queue change is journaled to it before it takes effect.
+wal = WriteAheadLog(os.environ.get("ORCHESTRATOR_WAL_DIR", WAL_DIR))
+_recovered = wal.recover()
+queue = DispatchQueue()
+for _queued in _recovered.pending():
+    queue.restore(_queued)
+queue.journal = wal.record_queue_event
+# Plan steps wait here until their dependencies have completed
+executor = PlanExecutor(queue)
+executor.restore(_recovered.held.values())
+executor.journal = wal.record_dag_event
+registry = RunnerRegistry(queue)
+runs: List[Dict[str, Any]] = _recovered.runs
+parked: List[Dict[str, Any]] = _recovered.parked
+
+# Instantiate a cost ledger for recording token usage. Results are recorded
+# with group commit by default ("write", "group" or "fsync"; see CostLedger).
+LEDGER_DURABILITY = os.environ.get("ORCHESTRATOR_LEDGER_DURABILITY", "group")
+ledger = CostLedger(os.environ.get("ORCHESTRATOR_LEDGER_PATH", LEDGER_PATH), durability=LEDGER_DURABILITY)
+# Learn step estimates from the tokens runners reported recently
+default_estimator.load(ledger)
+
+# Budget caps from config/budget.toml. Dispatch loops admit steps by
+# reserving their estimate on the budget engine's buckets; tokens the
+# scheduler has set aside for today's spillover windows are held back.
+budget = BudgetEngine(
+    load_budget_config(),
+    daily_usage=lambda: _tokens(ledger.totals_today()),
+    held=lambda: scheduler.reserved_on(datetime.now(timezone.utc).date()),
+)
+MAX_DAILY_TOKENS = budget.config.daily_tokens
+PER_TASK_TOKENS = budget.config.per_task_tokens
+WARN_THRESHOLD = budget.config.warn_ratio
+STOP_THRESHOLD = budget.config.stop_ratio
+
+# Plans are built by the planner and cached by the digest of their spec
+plan_cache = PlanCache(os.environ.get("ORCHESTRATOR_PLAN_CACHE_DIR", PLAN_CACHE_DIR))
+
+# Consent bundles per project; dispatch reads them from the store's cache
+consents = ConsentStore(os.environ.get("ORCHESTRATOR_CONSENT_DIR", CONSENT_DIR))
+
+# Intake sessions are keyed by project and persisted between rounds
+intake = IntakeManager(
+    PER_TASK_TOKENS, SessionStore(os.environ.get("ORCHESTRATOR_INTAKE_DIR", INTAKE_SESSIONS_DIR)), consents
+)
+
+# Steps refused for budget are handed to the scheduler as one-shot jobs that
+# re-enqueue them when their budget window opens
+SPILLOVER_TASK = "enqueue_spillover"
+SCHEDULER_POLL_SECONDS = 60
+scheduler = Scheduler(os.environ.get("ORCHESTRATOR_JOBS_PATH", "schedules/jobs.yaml"), ledger=ledger, budget=budget)
+
+
+def _tokens(totals: Dict[str, Any]) -> int:
+    return totals.get("in_tokens", 0) + totals.get("out_tokens", 0)
+
+
+def _task_of(step: Dict[str, Any]) -> Optional[str]:
+    return step.get("task_id") or step.get("plan_id")
+
+
+def _lane_usd_today(lane: str) -> float:
+    """USD the ledger has recorded today for one project's lane."""
+    today = datetime.now(timezone.utc).date()
+    return ledger.totals_between(today, today, project=lane)["usd"]
+
+
+_today = datetime.now(timezone.utc).date()
+budget.seed_tasks({task: _tokens(totals) for task, totals in ledger.totals_by_task(_today, _today).items()})
+
+
+def _enqueue_spillover(steps: List[Dict[str, Any]], lane: str) -> None:
+    for step in steps:
+        queue.push(step, lane=lane, priority=int(step.get("priority", 0) or 0))
+
+
+scheduler.register(SPILLOVER_TASK, _enqueue_spillover)
+
+
+async def _run_scheduler() -> None:
+    while True:
+        await asyncio.to_thread(scheduler.run_pending)
+        await asyncio.sleep(SCHEDULER_POLL_SECONDS)
+
+
+# Steps a runner may have outstanding at once. Runners can ask for a different
+# window with ``/ws?window=N``; requests are clamped to MAX_RUNNER_WINDOW.
+DEFAULT_RUNNER_WINDOW = 8
+MAX_RUNNER_WINDOW = 64
 
 
 @app.get("/health")
@@ -37,47 +151,154 @@ def health_check() -> Dict[str, str]:
 
 @app.post("/plan")
 def create_plan(spec: Dict[str, Any]) -> Dict[str, Any]:
-    """Generate a static minimal plan for testing purposes.
+    """Generate a plan for a project spec.
 
-    In this skeleton, we ignore the spec and return a plan with a single dummy step.
+    The plan id is derived from the spec, so posting the same spec again
+    returns the same (cached) plan.
     """
-    plan = {
-        "plan_id": "plan-1",
-        "gates": ["gate1"],
-        "steps": [
-            {
-                "step_id": "step-1",
-                "team": "Engineering",
-                "intent": "Dummy step",
-                "adapter": {"type": "web"},
-                "args": {},
-                "needs_secrets": [],
-                "evidence": [],
-                "budget_tokens": 0,
-                "requires_human": False,
-            }
-        ],
-    }
-    return plan
+    try:
+        plan = plan_cache.get(spec)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return to_dict(plan)
+
+
+@app.post("/plan/batch")
+def create_plans(specs: List[Dict[str, Any]]) -> StreamingResponse:
+    """Plan a list of specs, streaming one NDJSON line per spec.
+
+    Lines are ``{"index": i, "plan": {...}}`` in completion order, not spec
+    order. If a spec cannot be planned, a final ``{"index": null, "error":
+    ...}`` line ends the stream.
+    """
+
+    def lines():
+        try:
+            for index, encoded in plan_projects(specs, encode=True):
+                yield f'{{"index": {index}, "plan": {encoded}}}\n'
+        except (TypeError, ValueError) as exc:
+            yield json.dumps({"index": None, "error": str(exc)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _intake_state(project: str) -> Dict[str, Any]:
+    try:
+        iqs, questions, ready = intake.assess_session(project)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="no intake session")
+    session = intake.sessions.get(project)
+    return {"project": project, "version": session.version, "iqs": iqs, "questions": questions, "ready": ready}
+
+
+@app.post("/intake/{project}")
+def start_intake(project: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Start (or restart) the intake for a project and return its first assessment."""
+    intake.start_session(project, spec)
+    return _intake_state(project)
+
+
+@app.post("/intake/{project}/answers")
+def answer_intake(project: str, answers: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply answers to a project's intake and return the new assessment."""
+    try:
+        intake.answer_session(project, answers)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="no intake session")
+    return _intake_state(project)
+
+
+@app.get("/intake/{project}")
+def get_intake(project: str) -> Dict[str, Any]:
+    """Return the current assessment of a project's intake."""
+    return _intake_state(project)
+
+
+def _consent_state(project: str) -> Dict[str, Any]:
+    return {"project": project, "version": consents.version(project), "consent": dict(consents.get(project))}
+
+
+@app.get("/consent/{project}")
+def get_consent(project: str) -> Dict[str, Any]:
+    """Return a project's consent bundle and its version."""
+    return _consent_state(project)
+
+
+@app.post("/consent/{project}")
+def update_consent(project: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Change fields of a project's consent bundle; invalid changes get 400 with every problem."""
+    try:
+        consents.update(project, changes)
+    except ValidationError as exc:
+        raise HTTPException(status_code=400, detail=exc.errors)
+    return _consent_state(project)
 
 
 @app.post("/enqueue")
 def enqueue(item: Dict[str, Any]) -> Dict[str, Any]:
-    """Enqueue a plan or a single step."""
+    """Enqueue a plan or a single step.
+
+    Steps are placed in a lane per project (``project``, falling back to the
+    plan_id) and ordered by their optional ``priority`` field. A plan's steps
+    with ``depends_on`` are held until those steps have completed.
+
+    Plans and single steps are validated before anything is queued. An
+    invalid one is rejected with 400 and the list of every problem found;
+    besides bad dependencies this covers a missing plan_id, gates that are
+    not a list, step args an adapter requires (e.g. cron for schedule steps)
+    and a priority that is not a number, all of which used to be queued as
+    given (or fail with 500).
+    """
+    lane = item.get("project") or item.get("plan_id") or DEFAULT_LANE
     if "steps" in item:
-        # It's a plan; extend the queue with its steps
-        for step in item.get("steps", []):
-            queue.append(step)
+        errors = default_validator.plan_errors(item)
+        if not errors:
+            errors = [
+                f"steps[{i}]: {problem}" for i, step in enumerate(item["steps"]) for problem in _priority_errors(step)
+            ]
+        if errors:
+            raise HTTPException(status_code=400, detail=errors)
+        # It's a plan; queue the steps that are ready and hold the rest
+        # until their dependencies complete
+        executor.submit(item["steps"], lane)
     else:
-        queue.append(item)
-    return {"queued": len(queue)}
+        errors = default_validator.step_errors(item) + _priority_errors(item)
+        if errors:
+            raise HTTPException(status_code=400, detail=errors)
+        queue.push(item, lane=lane, priority=int(item.get("priority", 0) or 0))
+    return {"queued": len(queue), "held": len(executor)}
+
+
+def _priority_errors(step: Dict[str, Any]) -> List[str]:
+    priority = step.get("priority")
+    try:
+        if priority is not None:
+            int(priority)
+    except (TypeError, ValueError, OverflowError):
+        return ["priority must be a number"]
+    return []
+
+
+@app.get("/queue/{step_id}")
+def peek_step(step_id: str) -> Dict[str, Any]:
+    """Return a queued step without removing it."""
+    step = queue.peek(step_id)
+    if step is None:
+        raise HTTPException(status_code=404, detail="step not queued")
+    return step
+
+
+@app.delete("/queue/{step_id}")
+def cancel_step(step_id: str) -> Dict[str, Any]:
+    """Cancel every queued or held step with the given step_id, and held steps depending on them."""
+    return {"cancelled": queue.cancel(step_id) + executor.cancel(step_id), "queued": len(queue)}
 
 
 @app.get("/runs")
 def get_runs() -> Dict[str, Any]:
     """Return run results along with budget status."""
     totals = ledger.totals_today()
-    used = totals.get("in_tokens", 0) + totals.get("out_tokens", 0)
+    used = _tokens(totals)
     used_ratio = used / MAX_DAILY_TOKENS if MAX_DAILY_TOKENS else 0.0
     return {
         "runs": runs,
@@ -94,67 +315,310 @@ def get_parked() -> Dict[str, Any]:
     return {"parked": parked}
 
 
+@app.get("/held")
+def get_held() -> Dict[str, Any]:
+    """Return plan steps waiting for their dependencies."""
+    return {"held": executor.held()}
+
+
+@app.get("/runners")
+def get_runners() -> Dict[str, Any]:
+    """Return connected runners with their in-flight leases."""
+    return {"runners": registry.snapshot()}
+
+
 @app.get("/budget/today")
 def get_budget_today() -> Dict[str, Any]:
     """Return today's aggregated budget totals and thresholds."""
+    # Commit first so other readers of the ledger file agree with this answer
+    ledger.flush()
     totals = ledger.totals_today()
-    used = totals.get("in_tokens", 0) + totals.get("out_tokens", 0)
+    used = _tokens(totals)
     return {
         "totals": totals,
         "max_tokens": MAX_DAILY_TOKENS,
         "warn_threshold": WARN_THRESHOLD,
         "stop_threshold": STOP_THRESHOLD,
         "used_ratio": used / MAX_DAILY_TOKENS if MAX_DAILY_TOKENS else 0.0,
+        "buckets": budget.snapshot(),
     }
 
 
+async def _receive_messages(
+    websocket: WebSocket, runner_id: str, results: "asyncio.Queue[Dict[str, Any]]"
+) -> None:
+    """Read everything the runner sends until it disconnects.
+
+    Step results are forwarded to the dispatch loop; heartbeats and acks are
+    recorded in the registry here so they never hold up dispatch.
+    """
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                data = loads(message)
+            except ValueError:
+                registry.heartbeat(runner_id)  # plain "ack"
+                continue
+            if not isinstance(data, dict):
+                continue
+            if data.get("type") == "ack":
+                registry.ack(runner_id, str(data.get("step_id", "")))
+            elif "step_id" in data and "status" in data:
+                registry.heartbeat(runner_id)
+                await results.put(data)
+            else:
+                registry.heartbeat(runner_id, data)
+    except WebSocketDisconnect:
+        return
+
+
+async def _next(
+    awaitable: Awaitable[Any], receiver: "asyncio.Task[None]", timeout: Optional[float] = None
+) -> Any:
+    """Await ``awaitable`` unless the runner disconnects or ``timeout`` passes first."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait({task, receiver}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        if not task.done():
+            task.cancel()
+    if task in done:
+        return task.result()
+    if receiver in done:
+        raise WebSocketDisconnect()
+    raise asyncio.TimeoutError()
+
+
+async def _next_event(
+    receiver: "asyncio.Task[None]",
+    results: "asyncio.Queue[Dict[str, Any]]",
+    want_step: bool,
+    timeout: Optional[float],
+) -> Tuple[Optional[Dict[str, Any]], Optional[QueuedStep]]:
+    """Wait for a result from the runner or, if ``want_step``, a newly queued step.
+
+    Returns ``(result, queued)``; both may be set if they arrived together and
+    both are None on timeout.
+    """
+    result_task = asyncio.ensure_future(results.get())
+    waiting = {result_task, receiver}
+    step_task = None
+    if want_step:
+        step_task = asyncio.ensure_future(queue.get_entry())
+        waiting.add(step_task)
+    try:
+        done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (result_task, step_task):
+            if task is not None and not task.done():
+                task.cancel()
+    result = result_task.result() if result_task in done else None
+    queued = step_task.result() if step_task is not None and step_task in done else None
+    if result is None and queued is None and receiver in done:
+        raise WebSocketDisconnect()
+    return result, queued
+
+
+def _budget_cause(refusal: Refusal) -> str:
+    if refusal.level == "daily":
+        return "Daily token cap reached"
+    return f"Token cap of {refusal.level} {refusal.name} reached"
+
+
+def _spill_over(queued: QueuedStep, cause: str, room_today: Optional[int], reason: str = "budget") -> Dict[str, Any]:
+    """Move a refused step and the rest of its lane into future budget windows.
+
+    Each window becomes a one-shot scheduler job that re-enqueues its steps
+    and reserves their tokens for that day. Today's window only gets
+    ``room_today`` tokens (the room left in the bucket that refused the
+    step), so a full task, project or adapter bucket, or a project over its
+    daily LLM spend (room 0), moves the lane to the next budget day. Returns
+    the parked item for the refused step.
+    """
+    drained = queue.drain_lane(queued.lane)
+    steps = [queued.step] + [item.step for item in drained]
+    try:
+        windows = plan_budget_windows(
+            [estimate_step_tokens(step) for step in steps],
+            datetime.now(timezone.utc),
+            daily_cap=int(MAX_DAILY_TOKENS * STOP_THRESHOLD),
+            per_task_cap=PER_TASK_TOKENS,
+            used_today=budget.used_today(),
+            reserved=scheduler.reservations(),
+            tasks=[_task_of(step) for step in steps],
+            task_used=budget.task_usage(),
+            room_today=room_today,
+        )
+    except ValueError as exc:
+        # No window will take them: put the rest of the lane back and park
+        # only the refused step
+        for item in drained:
+            queue.restore(item)
+        return {
+            "step_id": queued.step.get("step_id"),
+            "status": "parked",
+            "reason": reason,
+            "note": f"{cause} and no budget window is free: {exc}.",
+        }
+    for window in windows:
+        scheduler.add_job(
+            {
+                # The scheduler runs on naive local times
+                "run_at": window.start.astimezone().replace(tzinfo=None),
+                "task_ref": SPILLOVER_TASK,
+                "args": {"steps": [steps[i] for i in window.indexes], "lane": queued.lane},
+                "reserved_tokens": window.tokens,
+            }
+        )
+    return {
+        "step_id": queued.step.get("step_id"),
+        "status": "parked",
+        "reason": reason,
+        "next_try": windows[0].start.astimezone().replace(tzinfo=None).isoformat(timespec="minutes"),
+        "note": f"{cause}. {len(steps)} step(s) rescheduled over {len(windows)} budget window(s).",
+        "steps": [step.get("step_id") for step in steps],
+    }
+
+
+def _runner_window(websocket: WebSocket) -> int:
+    try:
+        window = int(websocket.query_params.get("window", DEFAULT_RUNNER_WINDOW))
+    except ValueError:
+        window = DEFAULT_RUNNER_WINDOW
+    return max(1, min(window, MAX_RUNNER_WINDOW))
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket) -> None:
+    """Dispatch queued steps to a runner and collect its results.
+
+    Up to ``window`` steps are outstanding at once. Each step is sent with a
+    ``correlation_id`` (its lease id) which the runner echoes in the result,
+    so results may arrive in any order; results without one are matched to
+    the oldest outstanding step with the same step_id.
+    """
     await websocket.accept()
+    window = _runner_window(websocket)
+    runner_id = registry.register()
+    results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    receiver = asyncio.create_task(_receive_messages(websocket, runner_id, results))
+    # lease_id -> (lease, budget reservation), in dispatch order
+    in_flight: Dict[str, Tuple[Lease, Reservation]] = {}
+
+    async def dispatch(queued: QueuedStep) -> None:
+        step = queued.step
+        # Consent comes from the store's in-memory cache, not the disk
+        consent = consents.get(queued.lane)
+        refusal = admission_refusal(step, consent)
+        if refusal is not None:
+            wal.record_park(
+                queued.seq,
+                {"step_id": step.get("step_id"), "status": "parked", "reason": "consent", "note": refusal},
+            )
+            return
+        # The project's LLM spend cap resets with the UTC day, so a project
+        # over it waits for tomorrow's budget window rather than being parked
+        refusal = spend_refusal(consent, _lane_usd_today(queued.lane))
+        if refusal is not None:
+            wal.record_park(queued.seq, _spill_over(queued, refusal, 0, reason="consent"))
+            return
+        # Budget enforcement: reserve the step's estimate on its daily,
+        # project, task and adapter buckets. Admission uses the expected
+        # cost, not the worst case, so typical steps are not parked early.
+        adapter, action = step_kind(step)
+        reservation, refusal = budget.try_reserve(
+            default_estimator.expected(adapter, action),
+            project=queued.lane,
+            task=_task_of(step),
+            adapter=adapter,
+        )
+        if reservation is None:
+            # Park the step and the rest of its plan due to budget cap; they
+            # come back through the scheduler when their window opens
+            wal.record_park(queued.seq, _spill_over(queued, _budget_cause(refusal), refusal.room))
+            # Do not send to runner
+            return
+        # Lease the step to this runner, then send it tagged with the lease id
+        lease = registry.lease(runner_id, queued)
+        in_flight[lease.lease_id] = (lease, reservation)
+        await websocket.send_text(dumps_text(dict(step, correlation_id=lease.lease_id)))
+
+    def record(result_data: Dict[str, Any]) -> None:
+        lease_id = result_data.get("correlation_id")
+        if lease_id not in in_flight:
+            step_id = result_data.get("step_id")
+            lease_id = next(
+                (candidate for candidate, (lease, _) in in_flight.items() if lease.step_id == step_id),
+                None,
+            )
+        if lease_id is None:
+            return
+        lease, reservation = in_flight.pop(lease_id)
+        if registry.complete(lease_id) is None:
+            budget.release(reservation)
+            return  # stale: the lease lapsed and the step was re-queued
+        # Record what the runner reports the step used and learn from it;
+        # fall back to the dispatch estimate when it reported nothing
+        step = lease.queued.step
+        step_id = result_data.get("step_id", "unknown")
+        task_id = result_data.get("task_id") or _task_of(step) or "unknown_task"
+        adapter, action = step_kind(step)
+        cost = result_data.get("cost")
+        if isinstance(cost, dict) and ("in_tokens" in cost or "out_tokens" in cost):
+            in_tokens, out_tokens = int(cost.get("in_tokens", 0)), int(cost.get("out_tokens", 0))
+            ledger.append(
+                task_id, step_id, in_tokens, out_tokens, float(cost.get("usd", 0.0)), adapter, action,
+                project=lease.queued.lane,
+            )
+            default_estimator.observe(adapter, action, in_tokens + out_tokens)
+            budget.commit(reservation, in_tokens + out_tokens)
+        else:
+            ledger.append(
+                task_id, step_id, reservation.tokens, 0, 0.0, adapter, action,
+                estimated=True, project=lease.queued.lane,
+            )
+            budget.commit(reservation)
+        # Logging the result appends it to runs or parked based on status
+        wal.record_result(lease.queued.seq, result_data)
+        if result_data.get("status") == "ok":
+            # Steps that were waiting on this one may now be dispatched
+            executor.complete(lease.queued.lane, step_id, run=step.get(RUN_FIELD))
+
     try:
         while True:
-            # Wait until a step is available
-            if not queue:
+            # Fill the window from whatever is already queued
+            if len(in_flight) < window:
+                queued = queue.pop_entry()
+                if queued is not None:
+                    await dispatch(queued)
+                    continue
+            if not in_flight:
+                # Tell the runner the queue is idle, then sleep until /enqueue
+                # wakes us
                 await websocket.send_json({"type": "noop"})
-                await websocket.receive_text()  # consume heartbeat or ack
-                continue
-            step = queue.pop(0)
-            # Budget enforcement: estimate tokens and check against daily cap
-            # Estimate tokens based on adapter type in the step dict
-            adapter_type = None
-            if isinstance(step, dict):
-                adapter = step.get("adapter")
-                if isinstance(adapter, dict):
-                    adapter_type = adapter.get("type")
-            est_tokens = estimate_step_tokens(type("obj", (), {"adapter": {"type": adapter_type}}))
-            totals = ledger.totals_today()
-            used = totals.get("in_tokens", 0) + totals.get("out_tokens", 0)
-            projected_ratio = (used + est_tokens) / MAX_DAILY_TOKENS if MAX_DAILY_TOKENS else 0.0
-            if projected_ratio >= STOP_THRESHOLD:
-                # Park the step due to budget cap
-                parked_item = {
-                    "step_id": step.get("step_id"),
-                    "status": "parked",
-                    "reason": "budget",
-                    "next_try": "tomorrow",
-                    "note": "Daily token cap reached. Retry after next cycle.",
-                }
-                parked.append(parked_item)
-                # Do not send to runner; continue loop
+                await dispatch(await _next(queue.get_entry(), receiver))
                 continue
-            # Send step to runner
-            await websocket.send_json(step)
-            # Receive StepResult from runner
-            result_data = await websocket.receive_json()
-            # Record in ledger using estimated tokens; assign 0 USD for now
-            step_id = result_data.get("step_id", "unknown")
-            task_id = result_data.get("task_id", "unknown_task")
-            ledger.append(task_id, step_id, est_tokens, 0, 0.0)
-            # Append to runs or parked based on status
-            status = result_data.get("status")
-            if status == "blocked" or status == "parked":
-                parked.append(result_data)
-            else:
-                runs.append(result_data)
+            # Wait for a result, or a new step while the window has room
+            oldest_expiry = min(lease.expires_at for lease, _ in in_flight.values())
+            timeout = max(oldest_expiry - registry.clock(), 0.0)
+            result_data, queued = await _next_event(receiver, results, len(in_flight) < window, timeout)
+            if result_data is not None:
+                record(result_data)
+            if queued is not None:
+                await dispatch(queued)
+            if result_data is None and queued is None:
+                # Heartbeats renew leases; only give up once one has lapsed
+                registry.expire()
+                if any(not registry.is_active(lease_id) for lease_id in in_flight):
+                    # The runner went silent and its steps were re-queued
+                    await websocket.close()
+                    return
     except WebSocketDisconnect:
-        return
\ No newline at end of file
+        return
+    finally:
+        receiver.cancel()
+        # Anything still leased to this runner goes back on the queue
+        registry.unregister(runner_id)
+        for _, reservation in in_flight.values():
+            budget.release(reservation)
@@ -0,0 +1,295 @@
+"""Write-ahead log for orchestrator state.
+
+The orchestrator keeps its queue, runs and parked items in memory. This module
+makes that state durable. Every change is appended to ``wal.log`` as one JSON
+line with an increasing log sequence number (``lsn``):
+
+* ``push`` / ``restore`` – a step was queued (or re-queued after a lost lease)
+* ``pop`` – a step left the queue for dispatch
+* ``cancel`` / ``clear`` – queued steps were removed
+* ``result`` – a runner returned a result for a dispatched step
+* ``park`` – a dispatched step was parked instead of sent (e.g. budget)
+* ``hold`` / ``done`` / ``release`` – a plan step was held back until its
+  dependencies complete, one of them completed, or it was released to the
+  queue (see ``plan_executor``)
+
+The log keeps a mirror of the state it describes. Every ``snapshot_every``
+events it is compacted: runs and parked items added since the last snapshot
+are appended to ``history.jsonl`` as a single line, the queue is written to
+``snapshot.json`` (atomically, via a temporary file) and the log is
+truncated. Runs only ever grow, so writing them once keeps each snapshot
+proportional to the queue rather than to the whole history. On startup
+``recover`` loads the history and snapshot and replays only the events after
+the snapshot. Steps that were dispatched but had no result at the time of the
+crash are returned to the queue.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .dispatch_queue import QueuedStep
+
+
+WAL_DIR = os.path.join("memory", "wal")
+SNAPSHOT_EVERY = 10_000  # events between snapshots
+
+
+@dataclass
+class WalState:
+    """Orchestrator state as rebuilt from the log."""
+
+    queued: Dict[int, QueuedStep] = field(default_factory=dict)
+    in_flight: Dict[int, QueuedStep] = field(default_factory=dict)
+    runs: List[Dict[str, Any]] = field(default_factory=list)
+    parked: List[Dict[str, Any]] = field(default_factory=list)
+    # (lane, run, step_id) -> held step record, as journaled by PlanExecutor
+    held: Dict[Tuple[str, int, str], Dict[str, Any]] = field(default_factory=dict)
+    # (lane, run, dependency) -> keys of the held steps waiting for it, so a
+    # ``done`` event touches only those
+    dependents: Dict[Tuple[str, int, str], List[Tuple[str, int, str]]] = field(default_factory=dict)
+
+    def pending(self) -> List[QueuedStep]:
+        """Queued steps in queue order."""
+        return sorted(self.queued.values(), key=lambda queued: queued.seq)
+
+
+def _encode_step(queued: QueuedStep) -> List[Any]:
+    return [queued.seq, queued.lane, queued.priority, queued.step]
+
+
+def _decode_step(data: List[Any]) -> QueuedStep:
+    seq, lane, priority, step = data
+    return QueuedStep(step, lane, priority, seq)
+
+
+class WriteAheadLog:
+    """Append-only event log with periodic snapshots."""
+
+    def __init__(self, directory: str = WAL_DIR, snapshot_every: int = SNAPSHOT_EVERY, fsync: bool = False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.log_path = os.path.join(directory, "wal.log")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self.history_path = os.path.join(directory, "history.jsonl")
+        self.state = WalState()
+        self._runs_saved = 0
+        self._parked_saved = 0
+        self._lsn = 0
+        self._since_snapshot = 0
+        self._log = None
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Recovery
+
+    def recover(self) -> WalState:
+        """Rebuild state from the snapshot and the log tail, then open the log.
+
+        In-flight steps are moved back to the queue because the runners that
+        held them are gone after a restart.
+        """
+        with self._lock:
+            state = WalState()
+            lsn = 0
+            history_bytes = 0
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                lsn = snapshot["lsn"]
+                history_bytes = snapshot["history_bytes"]
+                for data in snapshot["queued"]:
+                    queued = _decode_step(data)
+                    state.queued[queued.seq] = queued
+                for data in snapshot["in_flight"]:
+                    queued = _decode_step(data)
+                    state.in_flight[queued.seq] = queued
+                for record in snapshot.get("held", []):
+                    record.setdefault("run", 0)  # written before runs were tracked
+                    _hold(state, record)
+            if os.path.exists(self.history_path):
+                with open(self.history_path, "rb") as f:
+                    for chunk in f.read(history_bytes).splitlines():
+                        data = json.loads(chunk)
+                        state.runs.extend(data["runs"])
+                        state.parked.extend(data["parked"])
+                if os.path.getsize(self.history_path) > history_bytes:
+                    # Written by a compaction that never finished; the log
+                    # still holds those events
+                    with open(self.history_path, "r+b") as f:
+                        f.truncate(history_bytes)
+            self._runs_saved = len(state.runs)
+            self._parked_saved = len(state.parked)
+            tail = 0
+            if os.path.exists(self.log_path):
+                good_bytes = 0
+                with open(self.log_path, "rb") as f:
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # torn final write
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            break
+                        good_bytes += len(line)
+                        if record["lsn"] <= lsn:
+                            continue  # already covered by the snapshot
+                        _apply(state, record)
+                        lsn = record["lsn"]
+                        tail += 1
+                if good_bytes < os.path.getsize(self.log_path):
+                    # Drop the torn tail so new events start on a clean line
+                    with open(self.log_path, "r+b") as f:
+                        f.truncate(good_bytes)
+            for seq, queued in state.in_flight.items():
+                state.queued[seq] = queued
+            state.in_flight.clear()
+            self.state = state
+            self._lsn = lsn
+            self._since_snapshot = tail
+            self._log = open(self.log_path, "a", encoding="utf-8")
+            return state
+
+    # ------------------------------------------------------------------
+    # Recording
+
+    def record_queue_event(self, event: str, queued: Optional[QueuedStep]) -> None:
+        """Journal hook for ``DispatchQueue``."""
+        if queued is None:
+            self._append({"e": event})
+        elif event in ("push", "restore"):
+            self._append({"e": event, "s": _encode_step(queued)})
+        else:
+            self._append({"e": event, "seq": queued.seq})
+
+    def record_dag_event(self, event: str, data: Dict[str, Any]) -> None:
+        """Journal hook for ``PlanExecutor``."""
+        self._append(dict(data, e=event))
+
+    def record_result(self, seq: int, result: Dict[str, Any]) -> None:
+        self._append({"e": "result", "seq": seq, "r": result})
+
+    def record_park(self, seq: int, item: Dict[str, Any]) -> None:
+        self._append({"e": "park", "seq": seq, "r": item})
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._log is None:
+                self.recover()
+            self._lsn += 1
+            record["lsn"] = self._lsn
+            _apply(self.state, record)
+            self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._since_snapshot += 1
+            if self._since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    # ------------------------------------------------------------------
+    # Snapshots and compaction
+
+    def snapshot(self) -> None:
+        """Write the current state to disk and truncate the log."""
+        with self._lock:
+            if self._log is None:
+                self.recover()
+            new_runs = self.state.runs[self._runs_saved:]
+            new_parked = self.state.parked[self._parked_saved:]
+            with open(self.history_path, "ab") as f:
+                if new_runs or new_parked:
+                    chunk = {"runs": new_runs, "parked": new_parked}
+                    f.write(json.dumps(chunk, separators=(",", ":")).encode("utf-8") + b"\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                history_bytes = f.tell()
+            self._runs_saved = len(self.state.runs)
+            self._parked_saved = len(self.state.parked)
+            snapshot = {
+                "lsn": self._lsn,
+                "history_bytes": history_bytes,
+                "queued": [_encode_step(queued) for queued in self.state.queued.values()],
+                "in_flight": [_encode_step(queued) for queued in self.state.in_flight.values()],
+                "held": list(self.state.held.values()),
+            }
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # Events up to self._lsn are now in the snapshot. If we crash
+            # before truncating, recovery skips them by lsn.
+            self._log.close()
+            self._log = open(self.log_path, "w", encoding="utf-8")
+            self._since_snapshot = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+def _apply(state: WalState, record: Dict[str, Any]) -> None:
+    event = record["e"]
+    if event in ("push", "restore"):
+        queued = _decode_step(record["s"])
+        state.in_flight.pop(queued.seq, None)
+        state.queued[queued.seq] = queued
+    elif event == "pop":
+        queued = state.queued.pop(record["seq"], None)
+        if queued is not None:
+            state.in_flight[queued.seq] = queued
+    elif event == "cancel":
+        state.queued.pop(record["seq"], None)
+    elif event == "clear":
+        state.queued.clear()
+    elif event == "result":
+        state.in_flight.pop(record["seq"], None)
+        result = record["r"]
+        if result.get("status") in ("blocked", "parked"):
+            state.parked.append(result)
+        else:
+            state.runs.append(result)
+    elif event == "hold":
+        held = {key: record[key] for key in ("lane", "priority", "step", "waiting")}
+        held["run"] = record.get("run", 0)
+        _hold(state, held)
+    elif event == "done":
+        step_id = record["step_id"]
+        for key in state.dependents.pop((record["lane"], record.get("run", 0), step_id), []):
+            held = state.held.get(key)
+            if held is not None:
+                held["waiting"] = [dep for dep in held["waiting"] if dep != step_id]
+    elif event == "release":
+        key = (record["lane"], record.get("run", 0), record["step_id"])
+        held = state.held.pop(key, None)
+        if held is not None:
+            for dep in held["waiting"]:
+                waiters = state.dependents.get((key[0], key[1], dep))
+                if waiters is not None and key in waiters:
+                    waiters.remove(key)
+                    if not waiters:
+                        del state.dependents[(key[0], key[1], dep)]
+    elif event == "park":
+        state.in_flight.pop(record["seq"], None)
+        state.parked.append(record["r"])
+
+
+def _hold(state: WalState, held: Dict[str, Any]) -> None:
+    key = _held_key(held)
+    state.held[key] = held
+    for dep in held["waiting"]:
+        state.dependents.setdefault((key[0], key[1], dep), []).append(key)
+
+
+def _held_key(record: Dict[str, Any]) -> Tuple[str, int, str]:
+    return record["lane"], record.get("run", 0), str(record["step"].get("step_id", ""))
@@ -2,6 +2,10 @@
 
 Connects to the orchestrator WebSocket, sends heartbeats, processes steps using a dispatch table,
 and supports a kill switch. Logs events to a local file with secrets redacted.
+
+Up to ``window`` steps are processed concurrently. Each result echoes the step's
+``correlation_id`` and is sent as soon as it is ready, so fast steps are not
+held up behind slow ones.
 """
 
 from __future__ import annotations
@@ -11,8 +15,9 @@ import json
 import os
 import shutil
 import time
+import urllib.parse
 from datetime import datetime
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, Optional
 
 import websockets
 
@@ -30,11 +35,19 @@ ALLOWED_TOOLS = [
 ]
 
 
+DEFAULT_WINDOW = 8  # steps in flight at once
+LOGS_DIR = "runner_windows/logs"
+
+
 class Runner:
-    def __init__(self, server_ws_url: str, logs_dir: str = "runner_windows/logs") -> None:
+    def __init__(
+        self, server_ws_url: str, logs_dir: Optional[str] = None, window: int = DEFAULT_WINDOW
+    ) -> None:
         self.server_ws_url = server_ws_url
+        self.window = max(1, window)
         self.kill_flag = False
-        self.logs_dir = logs_dir
+        # Log directory: the argument, else RUNNER_LOGS_DIR, else LOGS_DIR
+        self.logs_dir = logs_dir or os.environ.get("RUNNER_LOGS_DIR", LOGS_DIR)
         os.makedirs(self.logs_dir, exist_ok=True)
         self.log_file = os.path.join(self.logs_dir, f"runner_{int(time.time())}.log")
 
@@ -66,7 +79,8 @@ class Runner:
         self.log(f"Processed step {step_id} successfully")
         return {"step_id": step_id, "status": "ok", "evidence": evidence}
 
-    async def heartbeat(self, ws) -> None:
+    async def heartbeat(self, ws, send_lock: asyncio.Lock) -> None:
+        """Send a heartbeat every 10 seconds, taking turns with results and acks."""
         while not self.kill_flag:
             hb = {
                 "runner_status": "running",
@@ -74,15 +88,52 @@ class Runner:
                 "timestamp": datetime.utcnow().isoformat(),
             }
             try:
-                await ws.send(json.dumps(hb))
+                async with send_lock:
+                    await ws.send(json.dumps(hb))
             except Exception:
                 break
             await asyncio.sleep(10)
 
+    def connect_url(self) -> str:
+        """Return the server URL with our in-flight window as a query parameter."""
+        parts = urllib.parse.urlsplit(self.server_ws_url)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        query["window"] = str(self.window)
+        return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+
+    async def process_step(self, ws, step: Dict[str, Any], send_lock: asyncio.Lock) -> None:
+        """Run one step and send its result tagged with the step's correlation id.
+
+        The step runs in its own task, so an error is reported to the
+        orchestrator as a failed result rather than lost with the task.
+        """
+        try:
+            result = await self.dispatch_step(step)
+            # Report the tokens the action used so the orchestrator can learn
+            # its estimates; without a report it records its own estimate
+            cost = result.get("cost")
+            if isinstance(cost, dict):
+                result["cost"] = {
+                    "in_tokens": int(cost.get("in_tokens", 0)),
+                    "out_tokens": int(cost.get("out_tokens", 0)),
+                    "usd": float(cost.get("usd", 0.0)),
+                }
+        except Exception as exc:
+            self.log(f"Step {step.get('step_id', 'unknown')} raised {exc!r}")
+            result = {"step_id": step.get("step_id", "unknown"), "status": "failed", "error": str(exc)}
+        if "correlation_id" in step:
+            result["correlation_id"] = step["correlation_id"]
+        async with send_lock:
+            await ws.send(json.dumps(result))
+
     async def run(self) -> None:
         """Main loop: connect via WebSocket, send heartbeats, process steps."""
-        async with websockets.connect(self.server_ws_url) as ws:
-            hb_task = asyncio.create_task(self.heartbeat(ws))
+        async with websockets.connect(self.connect_url()) as ws:
+            # Every send on the socket (heartbeats, acks, results) holds this
+            send_lock = asyncio.Lock()
+            hb_task = asyncio.create_task(self.heartbeat(ws, send_lock))
+            slots = asyncio.Semaphore(self.window)
+            in_flight: set = set()
             try:
                 while not self.kill_flag:
                     message = await ws.recv()
@@ -90,16 +141,25 @@ class Runner:
                     try:
                         step = json.loads(message)
                     except Exception:
-                        await ws.send(json.dumps({"error": "invalid_json"}))
+                        async with send_lock:
+                            await ws.send(json.dumps({"error": "invalid_json"}))
                         continue
-                    # Handle noop keep-alive
+                    # The orchestrator sends noop once when its queue goes idle;
+                    # heartbeats keep the connection alive, so no ack is needed
                     if step.get("type") == "noop":
-                        await ws.send("ack")
                         continue
-                    result = await self.dispatch_step(step)
-                    await ws.send(json.dumps(result))
+                    # Acknowledge receipt so the orchestrator keeps our lease
+                    async with send_lock:
+                        await ws.send(json.dumps({"type": "ack", "step_id": step.get("step_id")}))
+                    await slots.acquire()
+                    task = asyncio.create_task(self.process_step(ws, step, send_lock))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    task.add_done_callback(lambda _: slots.release())
             finally:
                 hb_task.cancel()
+                for task in in_flight:
+                    task.cancel()
 
     def kill(self) -> None:
         self.kill_flag = True
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 
 from runner_windows.actions import secrets_adapter
@@ -42,10 +43,11 @@ class TestSecretsAdapter(unittest.TestCase):
         # Retrieve secret
         _ = secrets_adapter.get(alias)
         # Log only alias using Runner; ensure value is not logged
-        runner = Runner(server_ws_url="ws://localhost")
-        runner.log(f"Using secret alias {alias}")
-        with open(runner.log_file, "r", encoding="utf-8") as f:
-            contents = f.read()
+        with tempfile.TemporaryDirectory() as logs_dir:
+            runner = Runner(server_ws_url="ws://localhost", logs_dir=logs_dir)
+            runner.log(f"Using secret alias {alias}")
+            with open(runner.log_file, "r", encoding="utf-8") as f:
+                contents = f.read()
         self.assertIn(alias, contents)
         self.assertNotIn(value, contents)
 
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from orchestrator.cost.budget import BudgetConfig, BudgetEngine, Refusal, load_budget_config
+
+
+class TestBudgetEngine(unittest.TestCase):
+    def test_nested_caps_and_reserve_commit_release(self):
+        config = BudgetConfig(daily_tokens=1000, per_task_tokens=500, adapter_tokens={"web": 300}, stop_ratio=1.0)
+        budget = BudgetEngine(config)
+        first = budget.reserve(200, project="p", task="t", adapter="web")
+        self.assertIsNotNone(first)
+        # The adapter bucket is the tightest on this path
+        self.assertIsNone(budget.reserve(200, project="p", task="t", adapter="web"))
+        second = budget.reserve(250, project="p", task="t", adapter="files")
+        self.assertIsNotNone(second)
+        # The task bucket is now full
+        self.assertIsNone(budget.reserve(100, project="p", task="t", adapter="files"))
+        self.assertIsNotNone(budget.reserve(100, project="p", task="other"))
+        budget.commit(first, 50)
+        budget.release(second)
+        snapshot = budget.snapshot()
+        self.assertEqual(snapshot["task:t"], {"limit": 500, "used": 50, "reserved": 0})
+        self.assertEqual(snapshot["adapter:web"]["used"], 50)
+        self.assertEqual(budget.used_today(), 150)
+        self.assertEqual(budget.remaining(), 850)
+
+    def test_daily_usage_comes_from_source_and_stop_ratio(self):
+        used = {"tokens": 0}
+        budget = BudgetEngine(BudgetConfig(daily_tokens=1000, stop_ratio=0.9), daily_usage=lambda: used["tokens"])
+        used["tokens"] = 800
+        self.assertIsNone(budget.reserve(150))
+        self.assertIsNotNone(budget.reserve(100))
+        self.assertEqual(budget.used_today(), 900)
+
+    def test_try_reserve_names_the_refusing_bucket(self):
+        budget = BudgetEngine(BudgetConfig(daily_tokens=10_000, per_task_tokens=500, stop_ratio=1.0))
+        reservation, refusal = budget.try_reserve(400, project="p", task="t")
+        self.assertIsNone(refusal)
+        budget.commit(reservation)
+        self.assertEqual(budget.try_reserve(300, project="p", task="t"), (None, Refusal("task", "t", 100)))
+        budget.reserve(9000, project="q")
+        self.assertEqual(budget.try_reserve(700, project="p"), (None, Refusal("daily", None, 600)))
+
+    def test_held_tokens_are_kept_for_scheduled_windows(self):
+        held = {"tokens": 600}
+        budget = BudgetEngine(BudgetConfig(daily_tokens=1000, stop_ratio=1.0), held=lambda: held["tokens"])
+        self.assertIsNone(budget.reserve(500, task="t"))
+        self.assertIsNotNone(budget.reserve(400, task="t"))
+        self.assertEqual(budget.task_usage(), {"t": 400})
+        # Once the window's job has fired its steps compete normally
+        held["tokens"] = 0
+        self.assertIsNotNone(budget.reserve(500, task="u"))
+        self.assertEqual(budget.used_today(), 900)
+
+    def test_concurrent_reservations_never_overcommit(self):
+        budget = BudgetEngine(BudgetConfig(daily_tokens=10_000, stop_ratio=1.0))
+        granted = []
+
+        def worker():
+            for _ in range(500):
+                if budget.reserve(7, project="p") is not None:
+                    granted.append(7)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(granted), 10_000 - 10_000 % 7)
+
+    def test_load_budget_config(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "budget.toml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("[limits]\ndaily_tokens = 5000\nstop_ratio = 0.5\n[limits.adapters]\nweb = 700\n")
+            config = load_budget_config(path)
+            self.assertEqual((config.daily_tokens, config.per_task_tokens, config.stop_ratio), (5000, 8000, 0.5))
+            self.assertEqual(config.adapter_tokens, {"web": 700})
+        self.assertEqual(load_budget_config().daily_tokens, 25000)
+
+
+if __name__ == "__main__":
+    unittest.main()
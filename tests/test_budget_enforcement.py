@@ -1,8 +1,29 @@
+import atexit
+import datetime as dt
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 from fastapi.testclient import TestClient
 
-from orchestrator.service import app, queue, runs, parked, ledger, MAX_DAILY_TOKENS, STOP_THRESHOLD
+# Point the service at scratch storage before it is imported, so tests never
+# touch the ledger, logs or stores under memory/ and schedules/
+_STATE_DIR = tempfile.mkdtemp(prefix="orchestrator-test-")
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+for _name, _path in [
+    ("ORCHESTRATOR_LEDGER_PATH", "cost_ledger.jsonl"),
+    ("ORCHESTRATOR_WAL_DIR", "wal"),
+    ("ORCHESTRATOR_JOBS_PATH", "jobs.yaml"),
+    ("ORCHESTRATOR_PLAN_CACHE_DIR", "plan_cache"),
+    ("ORCHESTRATOR_CONSENT_DIR", "consent"),
+    ("ORCHESTRATOR_INTAKE_DIR", "intake_sessions"),
+]:
+    os.environ.setdefault(_name, os.path.join(_STATE_DIR, _path))
+
+from orchestrator.service import (
+    app, budget, queue, runs, parked, ledger, scheduler, MAX_DAILY_TOKENS, PER_TASK_TOKENS, STOP_THRESHOLD,
+)
 
 
 class TestBudgetEnforcement(unittest.TestCase):
@@ -11,15 +32,26 @@ class TestBudgetEnforcement(unittest.TestCase):
         queue.clear()
         runs.clear()
         parked.clear()
-        # Remove ledger file to reset totals
+        # Remove ledger file to reset totals (committing buffered entries first)
+        ledger.flush()
         if os.path.exists(ledger.ledger_path):
             os.remove(ledger.ledger_path)
+        # Keep spillover jobs out of the real schedule
+        self.tmp = tempfile.TemporaryDirectory()
+        self.jobs_path = scheduler.jobs_path
+        scheduler.jobs_path = os.path.join(self.tmp.name, "jobs.yaml")
+        scheduler.load_jobs()
         self.client = TestClient(app)
 
     def tearDown(self) -> None:
         # Clean up ledger file after test to avoid cross-test contamination
+        ledger.flush()
         if os.path.exists(ledger.ledger_path):
             os.remove(ledger.ledger_path)
+        for job in scheduler.jobs:
+            scheduler.remove_job(job)
+        scheduler.jobs_path = self.jobs_path
+        self.tmp.cleanup()
 
     def test_budget_refusal_and_endpoint(self):
         # Preload ledger with tokens just above stop threshold
@@ -51,6 +83,86 @@ class TestBudgetEnforcement(unittest.TestCase):
         self.assertIn("used_ratio", data)
         self.assertGreaterEqual(data["used_ratio"], STOP_THRESHOLD)
 
+    def test_refused_plan_spills_into_scheduled_windows(self):
+        ledger.append("task-pre", "step-pre", int(MAX_DAILY_TOKENS * STOP_THRESHOLD), 0, 0.0)
+        for i in range(3):
+            self.client.post(
+                "/enqueue",
+                json={"step_id": f"big-{i}", "team": "Engineering", "intent": "Test", "adapter": {"type": "web"}, "project": "big"},
+            )
+        with self.client.websocket_connect("/ws") as ws:
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+        # The whole lane left the queue in one parked item with a real retry time
+        self.assertEqual(len(queue), 0)
+        item = self.client.get("/parked").json()["parked"][0]
+        self.assertEqual(item["steps"], ["big-0", "big-1", "big-2"])
+        next_try = dt.datetime.fromisoformat(item["next_try"])
+        self.assertGreater(next_try, dt.datetime.now())
+        # Today is used up; tomorrow's window holds all three steps
+        self.assertEqual(len(scheduler.jobs), 1)
+        self.assertEqual(scheduler.reservations(), {next_try.astimezone(dt.timezone.utc).date(): 900})
+        # When the window opens the scheduler puts the steps back in order
+        scheduler.reschedule(scheduler.jobs[0], dt.datetime.now() - dt.timedelta(seconds=1))
+        ledger.flush()
+        os.remove(ledger.ledger_path)
+        with mock.patch.object(scheduler, "_in_quiet_hours", return_value=False):
+            scheduler.run_pending()
+        self.assertEqual([queue.pop()["step_id"] for _ in range(3)], ["big-0", "big-1", "big-2"])
+        self.assertEqual(scheduler.jobs, ())
+
+    def test_full_task_bucket_spills_to_next_budget_day(self):
+        # The task has used its whole cap today; the day itself has room
+        budget.seed_tasks({"t1": PER_TASK_TOKENS})
+        self.addCleanup(budget.seed_tasks, {"t1": 0})
+        self.client.post(
+            "/enqueue",
+            json={"step_id": "t1-step", "task_id": "t1", "team": "Engineering", "intent": "Test", "adapter": {"type": "web"}, "project": "tasks"},
+        )
+        with self.client.websocket_connect("/ws") as ws:
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+        item = self.client.get("/parked").json()["parked"][0]
+        self.assertIn("task t1", item["note"])
+        # Not retried today: the window opens on the next budget (UTC) day
+        tomorrow = dt.datetime.now(dt.timezone.utc).date() + dt.timedelta(days=1)
+        next_try = dt.datetime.fromisoformat(item["next_try"]).astimezone(dt.timezone.utc)
+        self.assertGreaterEqual(next_try.date(), tomorrow)
+        self.assertEqual(len(scheduler.jobs), 1)
+        self.assertEqual(list(scheduler.reservations()), [next_try.date()])
+
+    def test_llm_spend_cap_is_per_project_and_waits_for_next_day(self):
+        # One project has spent past the default $1.00 consent cap today
+        ledger.append("t-spend", "s-spend", 10, 10, 5.0, project="spender")
+        for project in ("spender", "thrifty"):
+            self.client.post(
+                "/enqueue",
+                json={"step_id": f"{project}-step", "team": "Engineering", "intent": "Test", "adapter": {"type": "web"}, "project": project},
+            )
+        with self.client.websocket_connect("/ws") as ws:
+            # The other project's step still goes out
+            self.assertEqual(ws.receive_json()["step_id"], "thrifty-step")
+        item = self.client.get("/parked").json()["parked"][0]
+        self.assertEqual((item["step_id"], item["reason"]), ("spender-step", "consent"))
+        self.assertIn("consent limit", item["note"])
+        tomorrow = dt.datetime.now(dt.timezone.utc).date() + dt.timedelta(days=1)
+        next_try = dt.datetime.fromisoformat(item["next_try"]).astimezone(dt.timezone.utc)
+        self.assertGreaterEqual(next_try.date(), tomorrow)
+        self.assertEqual(len(scheduler.jobs), 1)
+
+    def test_steps_without_a_window_are_parked_not_lost(self):
+        ledger.append("task-pre", "step-pre", int(MAX_DAILY_TOKENS * STOP_THRESHOLD), 0, 0.0)
+        for i in range(2):
+            self.client.post(
+                "/enqueue",
+                json={"step_id": f"late-{i}", "team": "Engineering", "intent": "Test", "adapter": {"type": "web"}, "project": "late"},
+            )
+        with mock.patch("orchestrator.service.plan_budget_windows", side_effect=ValueError("no room")):
+            with self.client.websocket_connect("/ws") as ws:
+                self.assertEqual(ws.receive_json().get("type"), "noop")
+        # Each step was put back and then parked on its own
+        self.assertEqual([item["step_id"] for item in self.client.get("/parked").json()["parked"]], ["late-0", "late-1"])
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(scheduler.jobs, ())
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
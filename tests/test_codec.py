@@ -0,0 +1,88 @@
+import json
+import math
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from orchestrator.core import codec
+from orchestrator.core.models import ParkedItem, Plan, Step, StepResult
+
+
+def _step(step_id="s1", **extra):
+    fields = {"step_id": step_id, "team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+    fields.update(extra)
+    return fields
+
+
+class TestCodec(unittest.TestCase):
+    def test_models_are_slotted(self):
+        step = Step(**_step())
+        with self.assertRaises(AttributeError):
+            step.extra = 1
+
+    def test_plan_round_trip(self):
+        plan = Plan(
+            plan_id="p1",
+            gates=["gate1"],
+            steps=[Step(**_step("a")), Step(**_step("b", depends_on=["a"], args={"n": 1}, budget_tokens=100))],
+        )
+        data = codec.loads(codec.dumps(plan))
+        self.assertEqual(data["steps"][1]["depends_on"], ["a"])
+        self.assertEqual(json.loads(codec.dumps_text(plan)), data)
+        self.assertEqual(codec.plan_from_dict(data, validate=True), plan)
+
+    def test_json_fallback_matches(self):
+        plan = Plan(plan_id="p1", gates=[], steps=[Step(**_step("a", args={"text": "café"}))])
+        encoded = codec.dumps(plan)
+        with mock.patch.object(codec, "orjson", None):
+            self.assertEqual(codec.dumps(plan), encoded)
+            self.assertEqual(codec.loads(encoded), codec.to_dict(plan))
+
+    def test_backends_agree_on_edge_cases(self):
+        outputs = []
+        for backend in (codec.orjson, None):
+            with mock.patch.object(codec, "orjson", backend):
+                outputs.append(
+                    [
+                        codec.dumps({1: "a", 2.5: "b", None: "c", False: "d"}),
+                        codec.dumps({"usd": float("nan"), "caps": [float("inf"), -float("inf"), 1.5]}),
+                        codec.dumps({"big": 2**70}),
+                        codec.loads(b'{"usd": NaN, "cap": Infinity}'),
+                    ]
+                )
+                with self.assertRaises(TypeError):
+                    codec.dumps({"at": datetime(2024, 1, 1)})
+                with self.assertRaises(ValueError):
+                    codec.loads(b"{")
+        self.assertEqual(outputs[0][:3], outputs[1][:3])
+        self.assertEqual(json.loads(outputs[0][0]), {"1": "a", "2.5": "b", "null": "c", "false": "d"})
+        self.assertEqual(json.loads(outputs[0][1]), {"usd": None, "caps": [None, None, 1.5]})
+        self.assertEqual(json.loads(outputs[0][2]), {"big": 2**70})
+        for decoded in (outputs[0][3], outputs[1][3]):
+            self.assertTrue(math.isnan(decoded["usd"]))
+            self.assertEqual(decoded["cap"], float("inf"))
+
+    def test_unknown_keys_are_ignored(self):
+        result = codec.result_from_dict({"step_id": "s1", "status": "ok", "correlation_id": "c-1"})
+        self.assertEqual(result, StepResult(step_id="s1", status="ok"))
+        self.assertEqual(codec.to_dict(ParkedItem(reason="budget"))["reason"], "budget")
+
+    def test_validation_is_fused_into_decoding(self):
+        with self.assertRaises(ValueError):
+            codec.step_from_dict(_step(adapter={"type": "teleport"}), validate=True)
+        with self.assertRaises(ValueError):
+            codec.result_from_dict({"step_id": "s1", "status": "done"}, validate=True)
+        with self.assertRaises(ValueError):
+            codec.plan_from_dict({"plan_id": "p", "gates": [], "steps": [_step("a", depends_on=["a"])]}, validate=True)
+        with self.assertRaises(ValueError):
+            codec.parked_from_dict({"reason": ""}, validate=True)
+        # Without validation the same data decodes as is
+        self.assertEqual(codec.step_from_dict(_step(adapter={"type": "teleport"})).adapter["type"], "teleport")
+
+    def test_loads_rejects_malformed_json(self):
+        with self.assertRaises(ValueError):
+            codec.loads(b'{"step_id": ')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from orchestrator.core.validators import ValidationError
+from orchestrator.intake.consent import DEFAULT_CONSENT, ConsentStore, admission_refusal, spend_refusal
+
+
+class TestConsentStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ConsentStore(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_defaults_then_versioned_updates_persist(self):
+        self.assertEqual(dict(self.store.get("p")), DEFAULT_CONSENT)
+        self.assertEqual(self.store.version("p"), 0)
+        self.assertEqual(self.store.update("p", {"live_trading": True}), 1)
+        self.assertEqual(self.store.update("p", {"max_daily_llm_usd": 2.5}), 2)
+        reopened = ConsentStore(self.tmp)
+        self.assertEqual(reopened.version("p"), 2)
+        self.assertTrue(reopened.get("p")["live_trading"])
+        self.assertEqual(reopened.get("p")["max_daily_llm_usd"], 2.5)
+        self.assertEqual([h["changes"] for h in reopened.history("p")], [{"live_trading": True}, {"max_daily_llm_usd": 2.5}])
+        # Other projects keep the defaults
+        self.assertFalse(reopened.get("q")["live_trading"])
+
+    def test_invalid_changes_are_all_reported_and_not_applied(self):
+        with self.assertRaises(ValidationError) as ctx:
+            self.store.update("p", {"live_trading": "yes", "allow_2fa": "sms", "max_daily_llm_usd": -1, "pets": True})
+        self.assertEqual(len(ctx.exception.errors), 4)
+        self.assertEqual(self.store.version("p"), 0)
+
+    def test_reads_are_cached_and_read_only(self):
+        self.store.update("p", {"free_only": False})
+        bundle = self.store.get("p")
+        with mock.patch("builtins.open", side_effect=AssertionError("disk read")):
+            for _ in range(3):
+                self.assertIs(self.store.get("p"), bundle)
+            self.assertEqual(self.store.version("p"), 1)
+        with self.assertRaises(TypeError):
+            bundle["free_only"] = True
+
+    def test_listeners_and_refresh(self):
+        seen = []
+        unsubscribe = self.store.subscribe(lambda project, bundle, version: seen.append((project, bundle["live_trading"], version)))
+        self.store.update("p", {"live_trading": True})
+        unsubscribe()
+        self.store.update("p", {"live_trading": False})
+        self.assertEqual(seen, [("p", True, 1)])
+        # A write from another store (process) shows up after refresh
+        self.store.get("p")
+        ConsentStore(self.tmp).update("p", {"allow_2fa": "totp"})
+        self.assertEqual(self.store.get("p")["allow_2fa"], "none")
+        self.store.refresh("p")
+        self.assertEqual(self.store.get("p")["allow_2fa"], "totp")
+
+    def test_admission_refusal(self):
+        live = {"adapter": {"type": "finance"}, "args": {"action": "place_orders", "mode": "live"}}
+        paper = {"adapter": {"type": "finance"}, "args": {"action": "place_orders", "mode": "paper"}}
+        self.assertIsNotNone(admission_refusal(live, DEFAULT_CONSENT))
+        self.assertIsNone(admission_refusal(paper, DEFAULT_CONSENT))
+        self.assertIsNone(admission_refusal(live, dict(DEFAULT_CONSENT, live_trading=True)))
+
+    def test_spend_refusal(self):
+        self.assertIsNone(spend_refusal(DEFAULT_CONSENT, 0.5))
+        self.assertIn("consent limit", spend_refusal(DEFAULT_CONSENT, 1.0))
+        self.assertIsNone(spend_refusal(dict(DEFAULT_CONSENT, max_daily_llm_usd=None), 100.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,24 @@
 import os
 import json
+import multiprocessing
+import tempfile
+import time
 import unittest
-from datetime import datetime, timezone, timedelta
+from unittest import mock
+from datetime import date, datetime, timezone, timedelta
 
 from orchestrator.core.models import Plan, Step
-from orchestrator.cost.governor import estimate_plan, downscope_plan
+from orchestrator.cost.governor import estimate_plan, downscope_plan, plan_budget_windows
 from orchestrator.cost.ledger import CostLedger
 
 
+def _append_many(ledger_path, task_id, count):
+    ledger = CostLedger(ledger_path, durability="group", flush_entries=7)
+    for i in range(count):
+        ledger.append(task_id, f"s-{i}", 1, 2, 0.0)
+    ledger.close()
+
+
 class TestCostGovernor(unittest.TestCase):
     def test_downscope_plan_over_cap(self):
         # Create a plan with 3 steps, each estimated 300 tokens (web)
@@ -23,25 +34,230 @@ class TestCostGovernor(unittest.TestCase):
         # Ensure at least one step remains
         self.assertGreaterEqual(len(downscoped.steps), 1)
 
+    def test_downscope_plan_keeps_valuable_later_steps(self):
+        def step(step_id, adapter, priority=0, depends_on=()):
+            return Step(
+                step_id=step_id, team="Engineering", intent="Test", adapter={"type": adapter},
+                priority=priority, depends_on=list(depends_on),
+            )
+
+        steps = [
+            step("fetch", "finance"),  # 400
+            step("diffs", "files", depends_on=["fetch"]),  # 100
+            step("report", "web"),  # 300
+            step("verify", "finance", priority=3, depends_on=["fetch"]),  # 400
+        ]
+        plan = Plan(plan_id="p1", gates=["gate1"], steps=steps)
+        # Prefix truncation would keep fetch, diffs and report; verify is worth more
+        kept = [s.step_id for s in downscope_plan(plan, token_cap=900).steps]
+        self.assertEqual(kept, ["fetch", "diffs", "verify"])
+        # A step is never kept without its dependency (report + diffs would fit)
+        kept = [s.step_id for s in downscope_plan(plan, token_cap=450).steps]
+        self.assertEqual(kept, ["report"])
+        # Steps with several dependencies fall back to the greedy pass
+        steps.append(step("summary", "docs", priority=1, depends_on=["diffs", "report"]))  # 150
+        kept = [s.step_id for s in downscope_plan(plan, token_cap=1000).steps]
+        self.assertEqual(kept, ["fetch", "diffs", "verify"])
+
+    def test_budget_windows_respect_caps_reservations_and_quiet_hours(self):
+        # Quiet hours are local to UTC+3, so each budget (UTC) day opens at
+        # 03:00 UTC when quiet hours end
+        local = timezone(timedelta(hours=3))
+        now = datetime(2026, 3, 10, 20, 0, tzinfo=timezone.utc)
+        reserved = {date(2026, 3, 11): 500}
+        windows = plan_budget_windows(
+            [300] * 5, now, daily_cap=1000, per_task_cap=600, used_today=700, reserved=reserved, quiet_tz=local
+        )
+        self.assertEqual([w.indexes for w in windows], [[0], [1], [2, 3], [4]])
+        self.assertEqual([w.tokens for w in windows], [300, 300, 600, 300])
+        self.assertEqual([w.day.day for w in windows], [10, 11, 12, 13])
+        self.assertEqual(windows[0].start, now)
+        self.assertEqual([w.start for w in windows[1:]], [datetime(2026, 3, d, 3, 0, tzinfo=timezone.utc) for d in (11, 12, 13)])
+        # Inside quiet hours today's window opens when they end; an oversized
+        # step gets a window of its own
+        windows = plan_budget_windows(
+            [3000, 100], datetime(2026, 3, 10, 0, 0), daily_cap=1000, per_task_cap=800, quiet_tz=local
+        )
+        self.assertEqual([(w.start.day, w.start.hour, w.indexes) for w in windows], [(10, 6, [0]), (11, 6, [1])])
+
+    def test_budget_windows_cap_each_task_separately(self):
+        now = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+        tasks = ["t1", "t2", "t1", "t2", None, "t1"]
+        windows = plan_budget_windows(
+            [500] * 6, now, daily_cap=5000, per_task_cap=1000, tasks=tasks, quiet_tz=timezone.utc
+        )
+        # Several tasks share one day; only t1's third step waits
+        self.assertEqual([w.indexes for w in windows], [[0, 1, 2, 3, 4], [5]])
+        # A task already at its cap today starts tomorrow even with daily room left
+        windows = plan_budget_windows(
+            [300, 300], now, daily_cap=5000, per_task_cap=8000, tasks=["t1", "t1"],
+            task_used={"t1": 8000}, quiet_tz=timezone.utc,
+        )
+        self.assertEqual([(w.day.day, w.indexes) for w in windows], [(11, [0, 1])])
+        # So does a step refused by a full project or adapter bucket
+        windows = plan_budget_windows(
+            [300], now, daily_cap=5000, per_task_cap=8000, tasks=[None], room_today=50, quiet_tz=timezone.utc
+        )
+        self.assertEqual([(w.day.day, w.indexes) for w in windows], [(11, [0])])
+        with self.assertRaises(ValueError):
+            plan_budget_windows([300], now, daily_cap=1000, per_task_cap=1000, used_today=1000, reserved={
+                date(2026, 3, 10) + timedelta(days=d): 1000 for d in range(1, 5)
+            }, max_days=3)
+
     def test_ledger_aggregation(self):
         # Use a temporary ledger path
-        ledger_path = os.path.join("memory", "test_cost_ledger.jsonl")
-        # Remove existing test ledger
-        if os.path.exists(ledger_path):
-            os.remove(ledger_path)
-        ledger = CostLedger(ledger_path)
-        # Append three entries for today
-        ledger.append("task1", "s1", 100, 50, 0.01)
-        ledger.append("task1", "s2", 200, 70, 0.02)
-        ledger.append("task2", "s1", 50, 25, 0.005)
-        totals = ledger.totals_today()
-        self.assertEqual(totals["in_tokens"], 350)
-        self.assertEqual(totals["out_tokens"], 145)
-        # Approximate float sum; allow small epsilon
-        self.assertAlmostEqual(totals["usd"], 0.035, places=3)
-        # Clean up test ledger
-        if os.path.exists(ledger_path):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = CostLedger(os.path.join(tmp, "test_cost_ledger.jsonl"))
+            # Append three entries for today
+            ledger.append("task1", "s1", 100, 50, 0.01)
+            ledger.append("task1", "s2", 200, 70, 0.02)
+            ledger.append("task2", "s1", 50, 25, 0.005)
+            totals = ledger.totals_today()
+            self.assertEqual(totals["in_tokens"], 350)
+            self.assertEqual(totals["out_tokens"], 145)
+            # Approximate float sum; allow small epsilon
+            self.assertAlmostEqual(totals["usd"], 0.035, places=3)
+
+    def test_ledger_totals_track_other_writers_and_days(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger_path = os.path.join(tmp, "ledger.jsonl")
+            yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+            with open(ledger_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"task_id": "t", "step_id": "old", "in_tokens": 999, "out_tokens": 0, "usd": 0.0, "ts": yesterday}) + "\n")
+            ledger = CostLedger(ledger_path)
+            other = CostLedger(ledger_path)
+            ledger.append("t", "s1", 100, 10, 0.01)
+            other.append("t", "s2", 200, 20, 0.02)
+            # Each instance sees both appends, and yesterday's entry stays out
+            for instance in (ledger, other):
+                totals = instance.totals_today()
+                self.assertEqual(totals["in_tokens"], 300)
+                self.assertEqual(totals["out_tokens"], 30)
+            yesterday_totals = ledger.totals_for((datetime.now(timezone.utc) - timedelta(days=1)).date())
+            self.assertEqual(yesterday_totals["in_tokens"], 999)
+            # The closed day was rotated into a compressed segment
+            self.assertTrue(os.path.exists(os.path.join(tmp, "ledger.d", "index.json")))
+            # Removing the file resets the aggregates
             os.remove(ledger_path)
+            self.assertEqual(ledger.totals_today()["in_tokens"], 0)
+
+    def test_ledger_range_queries_use_day_segments(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger_path = os.path.join(tmp, "ledger.jsonl")
+            today = datetime.now(timezone.utc)
+            lines = []
+            for days_ago, task_id, step_id, tokens in [(40, "a", "s1", 10), (3, "a", "s1", 20), (2, "b", "s2", 40)]:
+                ts = (today - timedelta(days=days_ago)).isoformat()
+                record = {"task_id": task_id, "step_id": step_id, "in_tokens": tokens, "out_tokens": 1, "usd": 0.5, "ts": ts}
+                if task_id == "b":
+                    record["project"] = "p"
+                lines.append(json.dumps(record))
+            with open(ledger_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            ledger = CostLedger(ledger_path)
+            ledger.append("a", "s1", 80, 0, 0.0)
+            ledger.append("c", "s3", 5, 0, 0.25, project="p")
+            segments = sorted(os.listdir(os.path.join(tmp, "ledger.d")))
+            self.assertEqual(len([name for name in segments if name.endswith(".jsonl.gz")]), 3)
+            start = (today - timedelta(days=7)).date()
+            week = ledger.totals_between(start, today.date())
+            self.assertEqual(week["in_tokens"], 145)
+            self.assertEqual(ledger.totals_between(start, today.date(), task_id="a")["in_tokens"], 100)
+            self.assertEqual(set(ledger.totals_by_task(start, today.date())), {"a", "b", "c"})
+            # Per-project totals come from rotated days and the active file alike
+            self.assertEqual(ledger.totals_between(start, today.date(), project="p")["in_tokens"], 45)
+            self.assertAlmostEqual(ledger.totals_between(today.date(), today.date(), project="p")["usd"], 0.25)
+            history = ledger.entries_for_step("s1")
+            self.assertEqual([e["in_tokens"] for e in history], [10, 20, 80])
+            self.assertEqual(len(ledger.entries_for_step("s1", start=start)), 2)
+
+    def test_ledger_rotation_survives_a_crash(self):
+        yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+        line = json.dumps({"task_id": "t", "step_id": "old", "in_tokens": 999, "out_tokens": 0, "usd": 0.0, "ts": yesterday.isoformat()})
+        real_replace = os.replace
+        for crash_after_commit in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                ledger_path = os.path.join(tmp, "ledger.jsonl")
+                with open(ledger_path, "w", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+                def replace(src, dst):
+                    # Die right before, or right after, the active file is replaced
+                    if dst == ledger_path and not crash_after_commit:
+                        raise OSError("crash")
+                    real_replace(src, dst)
+                    if dst == ledger_path:
+                        raise OSError("crash")
+
+                with mock.patch("orchestrator.cost.ledger.os.replace", side_effect=replace):
+                    with self.assertRaises(OSError):
+                        CostLedger(ledger_path)
+                ledger = CostLedger(ledger_path)
+                # The closed day is counted exactly once, and only from its segment
+                self.assertEqual(ledger.totals_for(yesterday.date())["in_tokens"], 999)
+                self.assertEqual([e["step_id"] for e in ledger.iter_entries()], ["old"])
+                self.assertEqual(os.path.getsize(ledger_path), 0)
+                self.assertFalse(os.path.exists(os.path.join(tmp, "ledger.d", "rotation.json")))
+
+    def test_ledger_group_commit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger_path = os.path.join(tmp, "ledger.jsonl")
+            ledger = CostLedger(ledger_path, durability="group", flush_entries=3, flush_interval=60.0)
+            other = CostLedger(ledger_path)
+            ledger.append("t", "s1", 100, 0, 0.0)
+            ledger.append("t", "s2", 100, 0, 0.0)
+            # Buffered entries count for their own instance only
+            self.assertEqual(ledger.totals_today()["in_tokens"], 200)
+            self.assertEqual(other.totals_today()["in_tokens"], 0)
+            # Reaching flush_entries commits the whole group at once
+            ledger.append("t", "s3", 100, 0, 0.0)
+            self.assertEqual(other.totals_today()["in_tokens"], 300)
+            self.assertEqual(ledger.totals_today()["in_tokens"], 300)
+            # Entry-level reads commit first
+            ledger.append("t", "s4", 100, 0, 0.0)
+            self.assertEqual(len(ledger.entries_for_step("s4")), 1)
+            self.assertEqual(other.totals_today()["in_tokens"], 400)
+            ledger.append("t", "s5", 100, 0, 0.0)
+            ledger.close()
+            with open(ledger_path, "r", encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 5)
+            self.assertEqual(ledger.totals_today()["in_tokens"], 500)
+
+    def test_ledger_group_commit_flushes_after_interval(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger_path = os.path.join(tmp, "ledger.jsonl")
+            ledger = CostLedger(ledger_path, durability="fsync", flush_interval=0.01)
+            other = CostLedger(ledger_path)
+            ledger.append("t", "s1", 100, 0, 0.0)
+            deadline = time.monotonic() + 5
+            while other.totals_today()["in_tokens"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(other.totals_today()["in_tokens"], 100)
+            ledger.close()
+            with self.assertRaises(ValueError):
+                CostLedger(ledger_path, durability="never")
+
+    def test_ledger_processes_share_file_and_counters(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger_path = os.path.join(tmp, "ledger.jsonl")
+            reader = CostLedger(ledger_path)
+            workers = [
+                multiprocessing.Process(target=_append_many, args=(ledger_path, f"task-{n}", 500))
+                for n in range(4)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+                self.assertEqual(worker.exitcode, 0)
+            # No interleaved lines
+            with open(ledger_path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual(len(records), 2000)
+            # The reader answers from the published counters without folding the file
+            totals = reader.totals_today()
+            self.assertEqual((totals["in_tokens"], totals["out_tokens"]), (2000, 4000))
+            self.assertEqual(reader._offset, 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import unittest
+
+from orchestrator.dispatch_queue import DispatchQueue
+
+
+def _step(step_id, **extra):
+    step = {"step_id": step_id, "team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+    step.update(extra)
+    return step
+
+
+class TestDispatchQueue(unittest.TestCase):
+    def test_priority_then_fifo_within_lane(self):
+        queue = DispatchQueue()
+        queue.push(_step("a"))
+        queue.push(_step("b"), priority=5)
+        queue.push(_step("c"))
+        order = [queue.pop()["step_id"] for _ in range(3)]
+        self.assertEqual(order, ["b", "a", "c"])
+        self.assertIsNone(queue.pop())
+        self.assertEqual(len(queue), 0)
+
+    def test_lanes_are_served_round_robin(self):
+        queue = DispatchQueue()
+        for i in range(3):
+            queue.push(_step(f"big-{i}"), lane="big")
+        queue.push(_step("small-0"), lane="small")
+        order = [queue.pop()["step_id"] for _ in range(4)]
+        self.assertEqual(order, ["big-0", "small-0", "big-1", "big-2"])
+        self.assertEqual(queue.lane_sizes(), {})
+
+    def test_peek_and_cancel_by_step_id(self):
+        queue = DispatchQueue()
+        queue.push(_step("keep"))
+        queue.push(_step("drop"), lane="other")
+        queue.push(_step("drop"))
+        self.assertEqual(queue.peek("keep")["step_id"], "keep")
+        self.assertIn("drop", queue)
+        self.assertEqual(queue.cancel("drop"), 2)
+        self.assertEqual(queue.cancel("drop"), 0)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.pop()["step_id"], "keep")
+        self.assertIsNone(queue.pop())
+
+    def test_drain_lane_returns_steps_in_dispatch_order(self):
+        queue = DispatchQueue()
+        queue.push(_step("a1"), lane="a")
+        queue.push(_step("b1"), lane="b")
+        queue.push(_step("a2"), lane="a", priority=5)
+        queue.push(_step("a3"), lane="a")
+        queue.cancel("a3")
+        drained = queue.drain_lane("a")
+        self.assertEqual([q.step["step_id"] for q in drained], ["a2", "a1"])
+        self.assertEqual(queue.drain_lane("a"), [])
+        self.assertEqual(len(queue), 1)
+        self.assertNotIn("a1", queue)
+        self.assertEqual(queue.pop()["step_id"], "b1")
+
+    def test_replace_keeps_position(self):
+        queue = DispatchQueue()
+        queue.push(_step("r1"))
+        queue.push(_step("r2"))
+        self.assertEqual(queue.replace("r1", dict(_step("r1"), intent="new")), 1)
+        self.assertEqual(queue.replace("missing", _step("missing")), 0)
+        first = queue.pop()
+        self.assertEqual((first["step_id"], first["intent"]), ("r1", "new"))
+
+    def test_lookups_can_be_limited_to_a_lane(self):
+        queue = DispatchQueue()
+        queue.push(_step("s", task_id="a"), lane="a")
+        queue.push(_step("s", task_id="b"), lane="b")
+        self.assertEqual(queue.peek("s", lane="b")["task_id"], "b")
+        self.assertEqual(queue.update("s", {"intent": "new"}, lane="b"), 1)
+        self.assertEqual(queue.peek("s", lane="b")["intent"], "new")
+        self.assertEqual(queue.cancel("s", lane="a"), 1)
+        self.assertIsNone(queue.peek("s", lane="a"))
+        self.assertEqual([step["task_id"] for step in queue.lane_steps("b")], ["b"])
+        self.assertEqual(queue.pop()["intent"], "new")
+
+    def test_get_wakes_on_push_from_another_thread(self):
+        queue = DispatchQueue()
+
+        async def consume():
+            timer = threading.Timer(0.05, queue.push, args=(_step("late"),))
+            timer.start()
+            return await asyncio.wait_for(queue.get(), timeout=2)
+
+        step = asyncio.run(consume())
+        self.assertEqual(step["step_id"], "late")
+        self.assertEqual(len(queue), 0)
+
+    def test_cancelled_getter_passes_wakeup_on(self):
+        queue = DispatchQueue()
+
+        async def scenario():
+            first = asyncio.ensure_future(queue.get())
+            second = asyncio.ensure_future(queue.get())
+            await asyncio.sleep(0)
+            queue.push(_step("only"))
+            first.cancel()
+            return await asyncio.wait_for(second, timeout=2)
+
+        self.assertEqual(asyncio.run(scenario())["step_id"], "only")
+
+
+if __name__ == "__main__":
+    unittest.main()
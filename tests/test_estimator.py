@@ -0,0 +1,60 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from orchestrator.core.models import Step
+from orchestrator.cost.estimator import TokenEstimator, step_kind
+from orchestrator.cost.governor import DEFAULT_STEP_TOKENS, estimate_step_tokens
+from orchestrator.cost.ledger import CostLedger
+
+
+class TestTokenEstimator(unittest.TestCase):
+    def test_cold_start_uses_defaults(self):
+        estimator = TokenEstimator(DEFAULT_STEP_TOKENS)
+        self.assertEqual(estimator.expected("web"), DEFAULT_STEP_TOKENS["web"])
+        self.assertEqual(estimator.upper("finance", "fetch_data"), DEFAULT_STEP_TOKENS["finance"])
+        self.assertEqual(estimator.expected("unknown"), 300)
+
+    def test_learns_mean_and_tail_per_action(self):
+        estimator = TokenEstimator(DEFAULT_STEP_TOKENS, min_samples=5)
+        for i in range(100):
+            estimator.observe("web", "open", 900 if i % 10 == 5 else 40)
+        for _ in range(10):
+            estimator.observe("web", "scrape", 2000)
+        # Admission sees the typical cost; budgeting sees the tail
+        self.assertLess(estimator.expected("web", "open"), 300)
+        self.assertEqual(estimator.upper("web", "open"), 900)
+        self.assertEqual(estimator.expected("web", "scrape"), 2000)
+        # An action without its own history falls back to the adapter
+        self.assertGreater(estimator.expected("web", "login"), 40)
+        self.assertLess(estimator.expected("web", "login"), 2000)
+
+    def test_loads_measured_entries_from_ledger(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = CostLedger(os.path.join(tmp, "ledger.jsonl"))
+            for _ in range(6):
+                ledger.append("t", "s", 500, 100, 0.0, adapter="docs", action="summarise")
+            ledger.append("t", "s", 9999, 0, 0.0, adapter="docs", action="summarise", estimated=True)
+            estimator = TokenEstimator(DEFAULT_STEP_TOKENS)
+            self.assertEqual(estimator.load(ledger), 6)
+            self.assertEqual(estimator.expected("docs", "summarise"), 600)
+            step = Step(step_id="s", team="Ops", intent="", adapter={"type": "docs"}, args={"action": "summarise"})
+            self.assertEqual(step_kind(step), ("docs", "summarise"))
+            self.assertEqual(estimate_step_tokens(step, estimator), 600)
+
+    def test_assigned_and_pickled_copies_learn_independently(self):
+        estimator = TokenEstimator(DEFAULT_STEP_TOKENS, min_samples=1)
+        estimator.observe("web", "open", 100)
+        assigned = TokenEstimator(DEFAULT_STEP_TOKENS)
+        assigned.assign(estimator)
+        pickled = pickle.loads(pickle.dumps(estimator))
+        for _ in range(5):
+            estimator.observe("web", "open", 1000)
+        self.assertEqual(estimator.upper("web", "open"), 1000)
+        for copy in (assigned, pickled):
+            self.assertEqual((copy.expected("web", "open"), copy.upper("web", "open")), (100, 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
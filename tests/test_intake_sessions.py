@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from orchestrator.intake import intake_manager
+from orchestrator.intake.intake_manager import IntakeManager
+from orchestrator.intake.sessions import SessionStore
+
+
+def _spec():
+    return {"goal": "Manage my portfolio", "domains": ["finance"], "constraints": {}, "parameters": {}}
+
+
+class TestIntakeSessions(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = SessionStore(self.tmp)
+        self.manager = IntakeManager(sessions=self.store)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_sessions_are_independent_per_project(self):
+        self.manager.start_session("a", _spec())
+        self.manager.start_session("b", _spec())
+        self.manager.answer_session("a", {"mode": "paper", "universe": ["AAPL"]})
+        self.assertEqual(self.store.get("a").token_usage, 100)
+        self.assertEqual(self.store.get("b").token_usage, 0)
+        self.assertEqual(self.store.get("b").spec["parameters"], {})
+        with self.assertRaises(KeyError):
+            self.manager.assess_session("missing")
+
+    def test_session_survives_restart_and_eviction(self):
+        self.manager.start_session("proj/1", _spec())
+        self.manager.answer_session("proj/1", {"mode": "paper"})
+        # A fresh store over the same directory reads the session back
+        restarted = IntakeManager(sessions=SessionStore(self.tmp))
+        session = restarted.sessions.get("proj/1")
+        self.assertEqual((session.version, session.token_usage), (1, 50))
+        self.assertEqual(session.spec["parameters"], {"mode": "paper"})
+        # Sessions pushed out of memory are still found on disk
+        small = SessionStore(self.tmp, max_entries=2)
+        for name in ("x", "y", "z"):
+            small.create(name, _spec())
+        self.assertEqual(len(small), 2)
+        self.assertEqual(small.get("x").project, "x")
+        self.assertTrue(small.delete("x"))
+        self.assertIsNone(small.get("x"))
+        # Memory-only stores forget evicted sessions
+        memory = SessionStore(None, max_entries=1)
+        memory.create("x", _spec())
+        memory.create("y", _spec())
+        self.assertIsNone(memory.get("x"))
+
+    def test_torn_record_is_no_session(self):
+        self.store.create("p", _spec())
+        path = os.path.join(self.tmp, os.listdir(self.tmp)[0])
+        with open(path, "wb") as f:
+            f.write(b'{"project": "p", "spe')
+        self.assertIsNone(SessionStore(self.tmp).get("p"))
+
+    def test_iqs_is_memoized_per_version(self):
+        self.manager.start_session("p", _spec())
+        consent = self.manager.get_consent("p")
+        with mock.patch.object(intake_manager, "compute_iqs", wraps=intake_manager.compute_iqs) as scored:
+            first = self.manager.assess_session("p", consent)
+            self.assertEqual(self.manager.assess_session("p", consent), first)
+            self.assertEqual(scored.call_count, 1)
+            # A field outside the MVI does not change the score
+            self.manager.answer_session("p", {"notes": "prefer ETFs"})
+            self.manager.assess_session("p", consent)
+            self.assertEqual(scored.call_count, 1)
+            # A required field and a different consent each do
+            self.manager.answer_session("p", {"mode": "paper"})
+            self.manager.assess_session("p", consent)
+            self.assertEqual(scored.call_count, 2)
+            self.manager.assess_session("p", dict(consent, free_only=False))
+            self.assertEqual(scored.call_count, 3)
+
+    def test_session_flow_matches_spec_flow(self):
+        answers = {
+            "mode": "paper",
+            "universe": ["AAPL", "MSFT"],
+            "per_trade_cap": 1000,
+            "daily_cap": 5000,
+            "data_provider": "alpha_vantage_free",
+            "broker": "alpaca_paper",
+        }
+        plain = IntakeManager()
+        consent = plain.get_consent("p")
+        spec = _spec()
+        self.manager.start_session("p", _spec())
+        self.assertEqual(self.manager.assess_session("p", consent), plain.assess(spec, consent))
+        spec = plain.collect_answers(spec, answers)
+        self.manager.answer_session("p", answers)
+        iqs, questions, ready = self.manager.assess_session("p", consent)
+        self.assertEqual((iqs, questions, ready), plain.assess(spec, consent))
+        self.assertTrue(ready)
+
+    def test_unknown_domain_is_ready(self):
+        self.manager.start_session("p", {"goal": "Do something useful today", "domains": []})
+        iqs, questions, ready = self.manager.assess_session("p")
+        self.assertTrue(ready)
+        self.assertEqual(questions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import random
+import unittest
+from unittest import mock
+
+from orchestrator.intake import iqs
+from orchestrator.intake.consent import DEFAULT_CONSENT
+from orchestrator.intake.mvi import MVI_DEFINITIONS
+
+
+def _specs(count, seed=7):
+    rng = random.Random(seed)
+    domains = list(MVI_DEFINITIONS) + ["jobs", None]
+    values = ["x", "", None, 0, 3, ["AAPL"], []]
+    specs = []
+    for _ in range(count):
+        domain = rng.choice(domains)
+        fields = MVI_DEFINITIONS.get(domain, []) + ["notes"]
+        parameters = {field: rng.choice(values) for field in fields if rng.random() < 0.7}
+        spec = {"goal": "g" * rng.randint(0, 40), "parameters": parameters}
+        if domain is not None:
+            spec["domains"] = [domain]
+        specs.append(spec)
+    return specs
+
+
+def _consents(count, seed=11):
+    rng = random.Random(seed)
+    return [
+        dict(DEFAULT_CONSENT, free_only=rng.random() < 0.5, ask_before_spend=rng.random() < 0.8) for _ in range(count)
+    ]
+
+
+class TestIqsBatch(unittest.TestCase):
+    def _check_matches(self):
+        specs = _specs(2000) + [{"goal": "x" * 25, "domains": [], "parameters": None}, {"domains": None}]
+        consents = _consents(len(specs))
+        self.assertEqual(iqs.compute_iqs_batch(specs, DEFAULT_CONSENT), [iqs.compute_iqs(s, DEFAULT_CONSENT) for s in specs])
+        self.assertEqual(iqs.compute_iqs_batch(specs, consents), [iqs.compute_iqs(s, c) for s, c in zip(specs, consents)])
+        self.assertEqual(iqs.compute_iqs_batch([], DEFAULT_CONSENT), [])
+
+    @unittest.skipIf(iqs.np is None, "NumPy is not installed")
+    def test_numpy_batch_matches_compute_iqs(self):
+        self._check_matches()
+
+    def test_fallback_batch_matches_compute_iqs(self):
+        with mock.patch.object(iqs, "np", None):
+            self._check_matches()
+
+    def test_consent_count_must_match(self):
+        with self.assertRaises(ValueError):
+            iqs.compute_iqs_batch(_specs(3), _consents(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,33 @@
+import atexit
+import json
+import os
+import shutil
+import tempfile
 import unittest
 from fastapi.testclient import TestClient
 
-from orchestrator.service import app, queue, runs, parked
+# Point the service at scratch storage before it is imported, so tests never
+# touch the ledger, logs or stores under memory/ and schedules/
+_STATE_DIR = tempfile.mkdtemp(prefix="orchestrator-test-")
+atexit.register(shutil.rmtree, _STATE_DIR, ignore_errors=True)
+for _name, _path in [
+    ("ORCHESTRATOR_LEDGER_PATH", "cost_ledger.jsonl"),
+    ("ORCHESTRATOR_WAL_DIR", "wal"),
+    ("ORCHESTRATOR_JOBS_PATH", "jobs.yaml"),
+    ("ORCHESTRATOR_PLAN_CACHE_DIR", "plan_cache"),
+    ("ORCHESTRATOR_CONSENT_DIR", "consent"),
+    ("ORCHESTRATOR_INTAKE_DIR", "intake_sessions"),
+]:
+    os.environ.setdefault(_name, os.path.join(_STATE_DIR, _path))
+
+from orchestrator.service import app, executor, queue, runs, parked, ledger
 
 
 class TestOrchestratorService(unittest.TestCase):
     def setUp(self):
         # Clear shared state before each test
         queue.clear()
+        executor.clear()
         runs.clear()
         parked.clear()
         self.client = TestClient(app)
@@ -21,6 +41,10 @@ class TestOrchestratorService(unittest.TestCase):
         plan_resp = self.client.post("/plan", json={"goal": "test", "domains": []})
         self.assertEqual(plan_resp.status_code, 200)
         plan = plan_resp.json()
+        self.assertEqual(plan["steps"][0]["adapter"]["type"], "files")
+        # The same spec gets the same plan id
+        again = self.client.post("/plan", json={"domains": [], "goal": "test"})
+        self.assertEqual(again.json()["plan_id"], plan["plan_id"])
         # Enqueue plan
         enq = self.client.post("/enqueue", json=plan)
         self.assertEqual(enq.status_code, 200)
@@ -38,6 +62,17 @@ class TestOrchestratorService(unittest.TestCase):
         runs_resp = self.client.get("/runs")
         self.assertEqual(len(runs_resp.json()["runs"]), 1)
 
+    def test_plan_batch_streams_ndjson(self):
+        specs = [{"goal": "a", "domains": ["finance"]}, {"goal": "b", "domains": []}, {"goal": "a", "domains": ["finance"]}]
+        resp = self.client.post("/plan/batch", json=specs)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        by_index = {line["index"]: line["plan"] for line in lines}
+        self.assertEqual(sorted(by_index), [0, 1, 2])
+        self.assertEqual(by_index[0], by_index[2])
+        self.assertEqual(by_index[1]["steps"][0]["step_id"], "generic-1")
+
     def test_blocked_step_goes_to_parked(self):
         # Enqueue single step directly
         step = {
@@ -56,6 +91,212 @@ class TestOrchestratorService(unittest.TestCase):
         park_resp = self.client.get("/parked")
         self.assertEqual(len(park_resp.json()["parked"]), 1)
 
+    def test_enqueue_wakes_idle_connection(self):
+        step = {
+            "step_id": "s-late",
+            "team": "Engineering",
+            "intent": "Test",
+            "adapter": {"type": "files"},
+        }
+        with self.client.websocket_connect("/ws") as ws:
+            # Idle notice is sent once; no ack is needed to keep waiting
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+            self.client.post("/enqueue", json=step)
+            received = ws.receive_json()
+            self.assertEqual(received["step_id"], "s-late")
+            ws.send_json({"step_id": "s-late", "status": "ok"})
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+        self.assertEqual(len(self.client.get("/runs").json()["runs"]), 1)
+
+    def test_disconnect_mid_step_requeues_step(self):
+        step = {
+            "step_id": "s-lost",
+            "team": "Engineering",
+            "intent": "Test",
+            "adapter": {"type": "files"},
+        }
+        self.client.post("/enqueue", json=step)
+        with self.client.websocket_connect("/ws") as ws:
+            self.assertEqual(ws.receive_json()["step_id"], "s-lost")
+            self.assertEqual(len(self.client.get("/runners").json()["runners"]), 1)
+        # The runner went away without a result; the step must not be lost
+        self.assertEqual(self.client.get("/queue/s-lost").status_code, 200)
+        self.assertEqual(self.client.get("/runners").json()["runners"], [])
+
+    def test_window_allows_out_of_order_results(self):
+        for i in range(3):
+            self.client.post(
+                "/enqueue",
+                json={"step_id": f"s-{i}", "team": "Engineering", "intent": "Test", "adapter": {"type": "files"}},
+            )
+        with self.client.websocket_connect("/ws?window=2") as ws:
+            first = ws.receive_json()
+            second = ws.receive_json()
+            self.assertEqual([first["step_id"], second["step_id"]], ["s-0", "s-1"])
+            self.assertNotEqual(first["correlation_id"], second["correlation_id"])
+            # Completing the second step frees a slot before the first finishes
+            ws.send_json({"step_id": "s-1", "status": "ok", "correlation_id": second["correlation_id"]})
+            third = ws.receive_json()
+            self.assertEqual(third["step_id"], "s-2")
+            ws.send_json({"step_id": "s-2", "status": "ok", "correlation_id": third["correlation_id"]})
+            ws.send_json({"step_id": "s-0", "status": "ok", "correlation_id": first["correlation_id"]})
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+        runs = self.client.get("/runs").json()["runs"]
+        self.assertEqual([r["step_id"] for r in runs], ["s-1", "s-2", "s-0"])
+
+    def test_reported_cost_is_recorded(self):
+        step = {
+            "step_id": "s-cost",
+            "team": "Engineering",
+            "intent": "Test",
+            "adapter": {"type": "docs"},
+            "args": {"action": "summarise"},
+        }
+        self.client.post("/enqueue", json=step)
+        with self.client.websocket_connect("/ws") as ws:
+            received = ws.receive_json()
+            ws.send_json(
+                {
+                    "step_id": "s-cost",
+                    "status": "ok",
+                    "correlation_id": received["correlation_id"],
+                    "cost": {"in_tokens": 70, "out_tokens": 5, "usd": 0.0},
+                }
+            )
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+        entry = ledger.entries_for_step("s-cost")[-1]
+        self.assertEqual((entry["in_tokens"], entry["out_tokens"]), (70, 5))
+        self.assertEqual((entry["adapter"], entry["action"], entry["estimated"]), ("docs", "summarise", False))
+
+    def test_plan_steps_dispatch_as_dependencies_complete(self):
+        plan = self.client.post("/plan", json={"goal": "Landing page", "domains": ["leadgen"]}).json()
+        enq = self.client.post("/enqueue", json=plan)
+        self.assertEqual(enq.json(), {"queued": 2, "held": 3})
+        with self.client.websocket_connect("/ws?window=4") as ws:
+            # generate_page and the independent scheduling step go out together
+            sent = {ws.receive_json()["step_id"] for _ in range(2)}
+            self.assertEqual(sent, {"generate_page-1", "schedule_updates-5"})
+            ws.send_json({"step_id": "generate_page-1", "status": "ok"})
+            # deploy and configure_form both wait only on generate_page
+            sent = {ws.receive_json()["step_id"] for _ in range(2)}
+            self.assertEqual(sent, {"deploy-2", "configure_form-3"})
+            ws.send_json({"step_id": "deploy-2", "status": "ok"})
+            ws.send_json({"step_id": "configure_form-3", "status": "ok"})
+            self.assertEqual(ws.receive_json()["step_id"], "test_form-4")
+        self.assertEqual(self.client.get("/held").json(), {"held": []})
+
+    def test_same_plan_twice_and_cancel_with_dependents(self):
+        plan = self.client.post("/plan", json={"goal": "Landing page", "domains": ["leadgen"]}).json()
+        self.client.post("/enqueue", json=plan)
+        self.assertEqual(self.client.post("/enqueue", json=plan).json(), {"queued": 4, "held": 6})
+        # generate_page is queued in both runs; everything waiting on it goes too
+        cancelled = self.client.delete("/queue/generate_page-1").json()
+        self.assertEqual(cancelled, {"cancelled": 8, "queued": 2})
+        self.assertEqual(self.client.get("/held").json(), {"held": []})
+
+    def test_runs_finishing_out_of_order_release_their_own_dependents(self):
+        step = {"team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+        plan = {"plan_id": "p-twice", "gates": [], "steps": [dict(step, step_id="a"), dict(step, step_id="b", depends_on=["a"])]}
+        self.client.post("/enqueue", json=plan)
+        self.client.post("/enqueue", json=plan)
+        with self.client.websocket_connect("/ws?window=4") as ws:
+            first, second = ws.receive_json(), ws.receive_json()
+            # The second submission's "a" finishes first
+            ws.send_json({"step_id": "a", "status": "ok", "correlation_id": second["correlation_id"]})
+            released = ws.receive_json()
+            self.assertEqual((released["step_id"], released["_run"]), ("b", second["_run"]))
+            self.assertEqual([h["run"] for h in self.client.get("/held").json()["held"]], [first["_run"]])
+
+    def test_intake_session_endpoints(self):
+        spec = {"goal": "Collect leads for my bakery", "domains": ["leadgen"], "parameters": {}}
+        first = self.client.post("/intake/bakery", json=spec).json()
+        self.assertEqual((first["version"], first["ready"]), (0, False))
+        # Three answers reach READY; cadence feeds no plan step so it is left out
+        self.assertEqual([q["field"] for q in first["questions"]], ["output_type", "asset_source", "platform"])
+        answers = {"output_type": "Static HTML page", "platform": "Netlify", "asset_source": "auto_generate", "cadence": "weekly"}
+        after = self.client.post("/intake/bakery/answers", json=answers).json()
+        self.assertEqual((after["version"], after["ready"], after["questions"]), (1, True, []))
+        self.assertEqual(self.client.get("/intake/bakery").json(), after)
+        self.assertEqual(self.client.get("/intake/nobody").status_code, 404)
+        self.assertEqual(self.client.post("/intake/nobody/answers", json={}).status_code, 404)
+
+    def test_live_order_needs_consent(self):
+        project = "consent-test"
+        self.assertEqual(self.client.post(f"/consent/{project}", json={"live_trading": False}).status_code, 200)
+        self.assertEqual(self.client.post(f"/consent/{project}", json={"live_trading": "yes"}).status_code, 400)
+        step = {
+            "step_id": "live-order",
+            "project": project,
+            "team": "Engineering",
+            "intent": "Test",
+            "adapter": {"type": "finance"},
+            "args": {"action": "place_orders", "mode": "live"},
+        }
+        self.client.post("/enqueue", json=step)
+        with self.client.websocket_connect("/ws") as ws:
+            self.assertEqual(ws.receive_json().get("type"), "noop")
+        self.assertEqual(self.client.get("/parked").json()["parked"][-1]["reason"], "consent")
+        state = self.client.post(f"/consent/{project}", json={"live_trading": True}).json()
+        self.assertTrue(state["consent"]["live_trading"])
+        self.client.post("/enqueue", json=step)
+        with self.client.websocket_connect("/ws") as ws:
+            self.assertEqual(ws.receive_json()["step_id"], "live-order")
+            ws.send_json({"step_id": "live-order", "status": "ok"})
+
+    def test_cyclic_plan_is_rejected(self):
+        step = {"team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+        plan = {
+            "plan_id": "p-cycle",
+            "steps": [dict(step, step_id="a", depends_on=["b"]), dict(step, step_id="b", depends_on=["a"])],
+        }
+        resp = self.client.post("/enqueue", json=plan)
+        self.assertEqual(resp.status_code, 400)
+        # Every problem is reported, not just the first
+        self.assertEqual(resp.json()["detail"], ["gates must be a list", "Dependency cycle: a -> b -> a"])
+        self.assertEqual(len(queue), 0)
+
+    def test_invalid_plan_is_rejected_with_every_error(self):
+        # Plans like this were queued as given before plans were validated
+        plan = {"steps": [{"step_id": "cron", "team": "Engineering", "intent": "Test", "adapter": {"type": "schedule"}}]}
+        resp = self.client.post("/enqueue", json=plan)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(
+            resp.json()["detail"],
+            ["plan_id is required", "gates must be a list", "steps[0]: args.cron is required for schedule steps"],
+        )
+        self.assertEqual((len(queue), len(executor)), (0, 0))
+        fixed = dict(plan, plan_id="p-cron", gates=[])
+        fixed["steps"] = [dict(plan["steps"][0], args={"cron": "0 9 * * *"})]
+        self.assertEqual(self.client.post("/enqueue", json=fixed).json(), {"queued": 1, "held": 0})
+
+    def test_invalid_single_step_is_rejected(self):
+        step = {"step_id": "solo", "team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+        for priority in ("high", []):
+            resp = self.client.post("/enqueue", json=dict(step, priority=priority))
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(resp.json()["detail"], ["priority must be a number"])
+        resp = self.client.post("/enqueue", json={"step_id": "solo", "adapter": None})
+        self.assertEqual(resp.json()["detail"], ["team is required", "adapter with a 'type' field is required"])
+        plan = {"plan_id": "p-priority", "gates": [], "steps": [dict(step, priority="high")]}
+        self.assertEqual(self.client.post("/enqueue", json=plan).json()["detail"], ["steps[0]: priority must be a number"])
+        self.assertEqual((len(queue), len(executor)), (0, 0))
+        self.assertEqual(self.client.post("/enqueue", json=dict(step, priority=None)).json(), {"queued": 1, "held": 0})
+
+    def test_peek_and_cancel_queued_step(self):
+        step = {
+            "step_id": "s-cancel",
+            "team": "Engineering",
+            "intent": "Test",
+            "adapter": {"type": "files"},
+        }
+        self.client.post("/enqueue", json=step)
+        peek = self.client.get("/queue/s-cancel")
+        self.assertEqual(peek.status_code, 200)
+        self.assertEqual(peek.json()["step_id"], "s-cancel")
+        cancel = self.client.delete("/queue/s-cancel")
+        self.assertEqual(cancel.json(), {"cancelled": 1, "queued": 0})
+        self.assertEqual(self.client.get("/queue/s-cancel").status_code, 404)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import copy
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from orchestrator import planner
+from orchestrator.cost.governor import default_estimator
+from orchestrator.plan_cache import PlanCache
+from orchestrator.plan_templates import PLAN_TEMPLATES, register_template
+
+
+SPEC = {"goal": "Rebalance", "domains": ["finance"], "parameters": {"mode": "paper"}}
+
+
+class TestPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = PlanCache(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_plan_id_is_stable_across_processes(self):
+        code = "from orchestrator.planner import plan_id_for; print(plan_id_for(%r))" % (SPEC,)
+        ids = set()
+        for seed in ("1", "2"):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+            ids.add(out.stdout.strip())
+        self.assertEqual(ids, {planner.plan_id_for(SPEC)})
+        # Key order does not matter
+        reordered = {"parameters": {"mode": "paper"}, "domains": ["finance"], "goal": "Rebalance"}
+        self.assertEqual(planner.plan_id_for(reordered), planner.plan_id_for(SPEC))
+
+    def test_hit_returns_an_independent_copy(self):
+        first = self.cache.get(SPEC)
+        first.steps[0].args["action"] = "changed"
+        second = self.cache.get(SPEC)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(second.steps[0].args["action"], "fetch_data")
+        self.assertEqual(second.plan_id, first.plan_id)
+
+    def test_disk_entries_survive_a_restart(self):
+        self.cache.get(SPEC)
+        restarted = PlanCache(self.tmp)
+        plan = restarted.get(SPEC)
+        self.assertEqual(restarted.hits, 1)
+        self.assertEqual(plan.steps[2].depends_on, ["compute_diffs-2"])
+
+    def test_lru_evicts_oldest(self):
+        cache = PlanCache(None, max_entries=2)
+        for goal in ("a", "b", "a", "c"):
+            cache.get({"goal": goal, "domains": []})
+        self.assertEqual(len(cache), 2)
+        cache.get({"goal": "a", "domains": []})
+        cache.get({"goal": "b", "domains": []})
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+    def test_template_change_invalidates(self):
+        original = [dict(entry) for entry in PLAN_TEMPLATES["leadgen"]]
+        spec = {"goal": "Page", "domains": ["leadgen"]}
+        self.cache.get(spec)
+        try:
+            register_template("leadgen", original[:2])
+            self.assertEqual(len(self.cache.get(spec).steps), 2)
+            self.assertEqual(self.cache.misses, 2)
+        finally:
+            register_template("leadgen", original)
+
+    def test_learned_estimates_invalidate(self):
+        spec = {"goal": "Docs", "domains": ["jobs"]}
+        before = self.cache.get(spec)
+        saved = copy.deepcopy(default_estimator)
+        try:
+            for _ in range(default_estimator.min_samples):
+                default_estimator.observe("web", "submit_application", 1500)
+            after = self.cache.get(spec)
+        finally:
+            # Other tests expect the default estimates
+            default_estimator.assign(saved)
+        self.assertEqual(self.cache.misses, 2)
+        self.assertEqual(after.steps[3].budget_tokens, 1500)
+        self.assertNotEqual(before.steps[3].budget_tokens, 1500)
+
+    def test_torn_file_is_a_miss(self):
+        self.cache.get(SPEC)
+        for name in os.listdir(self.tmp):
+            with open(os.path.join(self.tmp, name), "w") as f:
+                f.write('{"fingerprint": ')
+        restarted = PlanCache(self.tmp)
+        restarted.get(SPEC)
+        self.assertEqual(restarted.misses, 1)
+        with open(os.path.join(self.tmp, os.listdir(self.tmp)[0])) as f:
+            self.assertIn("plan", json.load(f))
+
+
+if __name__ == "__main__":
+    unittest.main()
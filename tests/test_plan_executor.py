@@ -0,0 +1,152 @@
+import unittest
+
+from orchestrator.dispatch_queue import DispatchQueue
+from orchestrator.plan_executor import RUN_FIELD, PlanExecutor
+
+
+def _step(step_id, *depends_on):
+    return {
+        "step_id": step_id,
+        "team": "Engineering",
+        "intent": "Test",
+        "adapter": {"type": "files"},
+        "depends_on": list(depends_on),
+    }
+
+
+def _drain(queue):
+    ids = []
+    while True:
+        step = queue.pop()
+        if step is None:
+            return ids
+        ids.append(step["step_id"])
+
+
+class TestPlanExecutor(unittest.TestCase):
+    def setUp(self):
+        self.queue = DispatchQueue()
+        self.executor = PlanExecutor(self.queue)
+
+    def test_independent_steps_are_ready_together(self):
+        # generate -> (deploy, configure) -> test
+        steps = [
+            _step("generate"),
+            _step("deploy", "generate"),
+            _step("configure", "generate"),
+            _step("test", "deploy", "configure"),
+        ]
+        self.assertEqual(self.executor.submit(steps, "p"), 1)
+        self.assertEqual(_drain(self.queue), ["generate"])
+        self.assertEqual(self.executor.complete("p", "generate"), 2)
+        self.assertEqual(_drain(self.queue), ["deploy", "configure"])
+        self.assertEqual(self.executor.complete("p", "deploy"), 0)
+        self.assertEqual(self.executor.held()[0]["waiting"], ["configure"])
+        self.assertEqual(self.executor.complete("p", "configure"), 1)
+        self.assertEqual(_drain(self.queue), ["test"])
+        self.assertEqual(len(self.executor), 0)
+
+    def test_lanes_are_separate(self):
+        self.executor.submit([_step("a"), _step("b", "a")], "p1")
+        self.executor.submit([_step("a"), _step("b", "a")], "p2")
+        self.assertEqual(self.executor.complete("p2", "a"), 1)
+        self.assertEqual([h["lane"] for h in self.executor.held()], ["p1"])
+
+    def test_cycle_is_rejected_before_queueing(self):
+        steps = [_step("x"), _step("a", "b"), _step("b", "a")]
+        with self.assertRaises(ValueError):
+            self.executor.submit(steps, "p")
+        self.assertEqual(len(self.queue), 0)
+        self.assertEqual(len(self.executor), 0)
+
+    def test_dependency_outside_plan_counts_as_met(self):
+        self.assertEqual(self.executor.submit([_step("b", "cut-earlier")], "p"), 1)
+
+    def test_cancel_and_restore(self):
+        events = []
+        self.executor.journal = lambda event, data: events.append((event, data))
+        self.executor.submit([_step("a"), _step("b", "a"), _step("c", "a")], "p")
+        self.assertEqual(self.executor.cancel("c"), 1)
+        self.assertEqual([event for event, _ in events], ["hold", "hold", "release"])
+        restored = PlanExecutor(self.queue)
+        restored.restore(self.executor.held())
+        self.assertEqual(restored.complete("p", "a"), 1)
+        self.assertEqual(_drain(self.queue), ["a", "b"])
+
+    def test_same_plan_submitted_twice_keeps_both_runs(self):
+        plan = [_step("a-1"), _step("a-2", "a-1")]
+        self.executor.submit(plan, "p")
+        self.executor.submit([dict(step) for step in plan], "p")
+        self.assertEqual(len(self.queue), 2)
+        self.assertEqual(len(self.executor), 2)
+        # Queued steps carry their run; the second run finishes first and
+        # releases only its own dependent
+        first, second = self.queue.pop(), self.queue.pop()
+        self.assertEqual((first[RUN_FIELD], second[RUN_FIELD]), (1, 2))
+        self.assertEqual(self.executor.complete("p", "a-1", run=second[RUN_FIELD]), 1)
+        self.assertEqual([h["run"] for h in self.executor.held()], [1])
+        self.assertEqual(self.queue.pop()[RUN_FIELD], 2)
+        self.assertEqual(self.executor.complete("p", "a-1", run=2), 0)
+        self.assertEqual(self.executor.complete("p", "a-1", run=first[RUN_FIELD]), 1)
+        self.assertEqual(len(self.executor), 0)
+        self.assertEqual(self.queue.pop()[RUN_FIELD], 1)
+
+    def test_completion_without_a_run_serves_the_oldest(self):
+        plan = [_step("a-1"), _step("a-2", "a-1")]
+        self.executor.submit(plan, "p")
+        self.executor.submit(plan, "p")
+        self.assertEqual(self.executor.complete("p", "a-1"), 1)
+        self.assertEqual([h["run"] for h in self.executor.held()], [2])
+
+    def test_cancel_takes_dependents_with_it(self):
+        events = []
+        self.executor.journal = lambda event, data: events.append((event, data))
+        steps = [_step("a"), _step("b", "a"), _step("c", "b"), _step("d", "a")]
+        self.executor.submit(steps, "p")
+        # Cancelling a held step cancels what waits on it, transitively
+        self.assertEqual(self.executor.cancel("b"), 2)
+        self.assertEqual([h["step"]["step_id"] for h in self.executor.held()], ["d"])
+        self.assertEqual([data["step_id"] for event, data in events if event == "release"], ["b", "c"])
+        # Cancelling the queued step "a" leaves nothing waiting on it
+        self.assertEqual(self.executor.cancel("a"), 1)
+        self.assertEqual(len(self.executor), 0)
+        self.assertEqual(self.executor.complete("p", "a"), 0)
+
+    def test_extend_waits_for_pending_dependencies(self):
+        self.executor.submit([_step("a"), _step("b", "a")], "p")
+        self.executor.submit([_step("a"), _step("b", "a")], "other")
+        # "a" is queued and "b" held in run 1 of lane "p" only
+        added = [_step("c", "b"), _step("d", "a", "c"), _step("e")]
+        self.assertEqual(self.executor.extend(added, "p"), 3)
+        self.assertEqual(_drain(self.queue), ["a", "a", "e"])
+        self.assertEqual(
+            sorted((h["lane"], h["step"]["step_id"], h["waiting"]) for h in self.executor.held()),
+            [("other", "b", ["a"]), ("p", "b", ["a"]), ("p", "c", ["b"]), ("p", "d", ["a", "c"])],
+        )
+        self.assertEqual(self.executor.complete("p", "a", run=1), 1)
+        self.assertEqual(self.executor.complete("p", "b", run=1), 1)
+        self.assertEqual(self.executor.complete("p", "c", run=1), 1)
+        self.assertEqual(_drain(self.queue), ["b", "c", "d"])
+        # Nothing pending any more: the steps are submitted afresh
+        self.assertEqual(self.executor.extend([_step("f", "a")], "p"), 1)
+        self.assertEqual(self.queue.pop()[RUN_FIELD], 3)
+
+    def test_update_and_drop_held_steps(self):
+        events = []
+        self.executor.journal = lambda event, data: events.append(event)
+        self.executor.submit([_step("a"), _step("b", "a"), _step("c", "b")], "p")
+        self.executor.submit([_step("a"), _step("b", "a"), _step("c", "b")], "other")
+        self.assertEqual(self.executor.update("p", "b", {"intent": "Changed"}), 1)
+        self.assertEqual(events[-2:], ["release", "hold"])
+        held = {(h["lane"], h["step"]["step_id"]): h for h in self.executor.held()}
+        self.assertEqual((held["p", "b"]["step"]["intent"], held["p", "b"]["step"][RUN_FIELD]), ("Changed", 1))
+        self.assertEqual(held["other", "b"]["step"]["intent"], "Test")
+        # Dropping "b" releases "c", which no longer has anything to wait for
+        self.assertEqual(self.executor.drop("p", ["b"]), 1)
+        self.assertEqual(_drain(self.queue), ["a", "a", "c"])
+        self.assertEqual(self.executor.complete("p", "a"), 0)
+        self.assertEqual([h["lane"] for h in self.executor.held()], ["other", "other"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,15 @@
 import json
 import os
 import unittest
+from unittest import mock
 
-from orchestrator.planner import plan_project
+from orchestrator import planner
+from orchestrator.core.codec import dumps_text
+from orchestrator.planner import plan_project, plan_projects
+from orchestrator.plan_templates import PLAN_TEMPLATES, compile_template, templates_for
 from orchestrator.core.validators import validate_plan
+from orchestrator.cost.estimator import TokenEstimator
+from orchestrator.cost.governor import DEFAULT_STEP_TOKENS
 
 
 class TestPlanner(unittest.TestCase):
@@ -38,6 +44,70 @@ class TestPlanner(unittest.TestCase):
         self.assertEqual(len(plan.steps), 1)
         self.assertEqual(plan.steps[0].adapter.get("type"), "files")
 
+    def test_every_domain_template_plans(self):
+        for domain in PLAN_TEMPLATES:
+            plan = plan_project({"goal": domain, "domains": [domain]})
+            validate_plan(plan)
+            ids = {step.step_id for step in plan.steps}
+            for step in plan.steps:
+                self.assertTrue(step.budget_tokens > 0)
+                self.assertTrue(set(step.depends_on) <= ids)
+
+    def test_domains_combine_and_ids_are_renumbered(self):
+        plan = plan_project({"goal": "Both", "domains": ["leadgen", "finance"]})
+        ids = [step.step_id for step in plan.steps]
+        self.assertEqual(ids[0], "generate_page-1")
+        self.assertEqual(ids[5], "fetch_data-6")
+        self.assertEqual(len(set(ids)), len(ids))
+        compute = plan.steps[6]
+        self.assertEqual(compute.depends_on, ["fetch_data-6"])
+
+    def test_instances_do_not_share_state(self):
+        first = plan_project({"goal": "a", "domains": ["finance"]})
+        first.steps[2].args["mode"] = "live"
+        first.steps[2].needs_secrets.append("OTHER")
+        second = plan_project({"goal": "a", "domains": ["finance"]})
+        self.assertEqual(second.steps[2].args["mode"], "paper")
+        self.assertEqual(second.steps[2].needs_secrets, ["BROKER_KEY"])
+
+    def test_estimates_follow_the_estimator(self):
+        template = templates_for(["leadgen"])[0]
+        estimator = TokenEstimator(DEFAULT_STEP_TOKENS, min_samples=1)
+        self.assertEqual(template.estimates(estimator)[1], DEFAULT_STEP_TOKENS["web"])
+        estimator.observe("web", "deploy", 900)
+        self.assertEqual(template.instantiate(estimator=estimator)[1].budget_tokens, 900)
+
+    def test_compile_rejects_bad_templates(self):
+        step = {"name": "a", "team": "Engineering", "intent": "x", "adapter": {"type": "files"}}
+        with self.assertRaises(ValueError):
+            compile_template("bad", [dict(step, depends_on=["b"])])
+        with self.assertRaises(ValueError):
+            compile_template("bad", [step, step])
+        with self.assertRaises(ValueError):
+            compile_template("bad", [dict(step, adapter={"type": "teleport"})])
+
+    def _batch(self):
+        domains = ["finance", "leadgen", "social", "jobs", "ecommerce", "outreach", "nope"]
+        return [{"goal": f"g{i % 7}", "domains": [domains[i % 7]]} for i in range(30)]
+
+    def test_plan_projects_dedupes_and_copies(self):
+        specs = self._batch()
+        with mock.patch.object(planner, "plan_project", wraps=plan_project) as wrapped:
+            results = dict(plan_projects(specs))
+        self.assertEqual(sorted(results), list(range(30)))
+        self.assertEqual(wrapped.call_count, len({json.dumps(s, sort_keys=True) for s in specs}))
+        # Duplicates share the plan id but not their steps
+        duplicate = next(i for i in range(1, 30) if specs[i] == specs[0])
+        self.assertEqual(results[0].plan_id, results[duplicate].plan_id)
+        self.assertIsNot(results[0].steps[0], results[duplicate].steps[0])
+
+    def test_plan_projects_on_a_pool_matches_serial(self):
+        specs = self._batch()
+        serial = {i: dumps_text(plan) for i, plan in plan_projects(specs)}
+        with mock.patch.object(planner, "PARALLEL_MIN_SPECS", 1):
+            pooled = dict(plan_projects(specs, workers=2, chunk_size=4, encode=True))
+        self.assertEqual(pooled, serial)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+import unittest
+
+from orchestrator.intake.consent import DEFAULT_CONSENT
+from orchestrator.intake.iqs import compute_iqs
+from orchestrator.intake.mvi import MVI_DEFINITIONS
+from orchestrator.intake.question_planner import READY_IQS, plan_questions, rank_fields
+from orchestrator.intake.questioner import generate_questions
+
+
+def _spec(domain, **parameters):
+    return {"goal": "A reasonably detailed goal", "domains": [domain], "parameters": parameters}
+
+
+def _intake(spec, choose):
+    """Answer the chosen questions until READY; returns (rounds, answers)."""
+    rounds = answers = 0
+    while compute_iqs(spec, DEFAULT_CONSENT) < READY_IQS:
+        fields = choose(spec)
+        spec["parameters"].update({name: "value" for name in fields})
+        rounds += 1
+        answers += len(fields)
+    return rounds, answers
+
+
+class TestQuestionPlanner(unittest.TestCase):
+    def test_fields_rank_by_gain_then_plan_steps_fed(self):
+        ranked = rank_fields(_spec("leadgen"), DEFAULT_CONSENT)
+        self.assertEqual([name for name, _, _ in ranked], ["output_type", "asset_source", "platform", "cadence"])
+        self.assertEqual([steps for _, _, steps in ranked], [4, 4, 2, 0])
+        self.assertEqual(rank_fields(_spec("leadgen", output_type="x", platform="y", asset_source="z", cadence="w"), DEFAULT_CONSENT), [])
+
+    def test_smallest_batch_that_reaches_ready(self):
+        batch = plan_questions(_spec("leadgen"), DEFAULT_CONSENT)
+        self.assertEqual(batch.fields, ["output_type", "asset_source", "platform"])
+        self.assertGreaterEqual(batch.expected_iqs, READY_IQS)
+        self.assertEqual(batch.rounds, 1)
+        # Finance needs five of its six fields
+        batch = plan_questions(_spec("finance"), DEFAULT_CONSENT)
+        self.assertEqual(len(batch.fields), 5)
+        self.assertEqual(batch.rounds, 1)
+        # Already ready: nothing to ask
+        done = plan_questions(_spec("leadgen", output_type="x", platform="y", asset_source="z"), DEFAULT_CONSENT)
+        self.assertEqual((done.fields, done.gain, done.rounds), ([], 0, 0))
+
+    def test_batch_limits(self):
+        batch = plan_questions(_spec("finance"), DEFAULT_CONSENT, max_items=2)
+        self.assertEqual((len(batch.fields), batch.rounds), (2, 3))
+        batch = plan_questions(_spec("finance"), DEFAULT_CONSENT, max_answers=1)
+        self.assertEqual(batch.fields, ["universe"])
+        self.assertEqual(plan_questions(_spec("finance"), DEFAULT_CONSENT, max_answers=0).fields, [])
+
+    def test_fewer_answers_than_declaration_order(self):
+        for domain in MVI_DEFINITIONS:
+            baseline = _intake(_spec(domain), lambda spec: [q["field"] for q in generate_questions(spec)])
+            planned = _intake(_spec(domain), lambda spec: plan_questions(spec, DEFAULT_CONSENT).fields)
+            self.assertLessEqual(planned[0], baseline[0], domain)
+            self.assertLessEqual(planned[1], baseline[1], domain)
+        self.assertLess(
+            _intake(_spec("leadgen"), lambda spec: plan_questions(spec, DEFAULT_CONSENT).fields)[1],
+            _intake(_spec("leadgen"), lambda spec: [q["field"] for q in generate_questions(spec)])[1],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import copy
+import unittest
+
+from orchestrator.dispatch_queue import DispatchQueue
+from orchestrator.core.codec import to_dict
+from orchestrator.plan_executor import PlanExecutor
+from orchestrator.planner import plan_project
+from orchestrator.replanner import apply_plan_diff, changed_parameters, replan
+
+
+SPEC = {
+    "goal": "Sell prints",
+    "domains": ["ecommerce"],
+    "parameters": {"platform": "Etsy", "pricing_rule": "fixed_price"},
+}
+
+
+class TestReplanner(unittest.TestCase):
+    def test_only_bound_steps_change(self):
+        plan = plan_project(SPEC)
+        new_spec = copy.deepcopy(SPEC)
+        new_spec["parameters"]["pricing_rule"] = "cost_plus_markup"
+        self.assertEqual(changed_parameters(SPEC, new_spec), {"pricing_rule"})
+        updated, diff = replan(plan, SPEC, new_spec)
+        self.assertEqual([step.step_id for step in diff.changed], ["price_items-2"])
+        self.assertEqual((diff.added, diff.removed), ([], []))
+        self.assertEqual(updated.plan_id, plan.plan_id)
+        self.assertEqual(updated.steps[1].args["pricing_rule"], "cost_plus_markup")
+        # Unaffected steps are reused and the old plan is untouched
+        self.assertIs(updated.steps[0], plan.steps[0])
+        self.assertEqual(plan.steps[1].args["pricing_rule"], "fixed_price")
+        # Same result as planning the new spec from scratch
+        self.assertEqual(updated.steps, plan_project(new_spec).steps)
+
+    def test_unbound_parameter_is_a_no_op(self):
+        plan = plan_project(SPEC)
+        new_spec = copy.deepcopy(SPEC)
+        new_spec["parameters"]["notes"] = "anything"
+        updated, diff = replan(plan, SPEC, new_spec)
+        self.assertFalse(diff)
+        self.assertEqual(updated.steps, plan.steps)
+
+    def test_domain_change_rebuilds_and_diffs(self):
+        plan = plan_project(SPEC)
+        new_spec = dict(SPEC, domains=["ecommerce", "social"])
+        updated, diff = replan(plan, SPEC, new_spec)
+        self.assertEqual(diff.removed, [])
+        self.assertEqual([step.step_id for step in diff.added][0], "prepare_content-5")
+        self.assertEqual(len(updated.steps), 8)
+        _, back = replan(updated, new_spec, SPEC)
+        self.assertEqual(len(back.removed), 4)
+
+    def test_apply_diff_updates_queue_in_place(self):
+        plan = plan_project(SPEC)
+        queue = DispatchQueue()
+        events = []
+        queue.journal = lambda event, queued: events.append(event)
+        for step in to_dict(plan)["steps"]:
+            queue.push(dict(step, task_id="t-1"), lane=plan.plan_id)
+        queue.pop()  # the first step is already dispatched
+        new_spec = copy.deepcopy(SPEC)
+        new_spec["parameters"]["platform"] = "Shopify"
+        _, diff = replan(plan, SPEC, new_spec)
+        counts = apply_plan_diff(PlanExecutor(queue), diff)
+        self.assertEqual(counts, {"added": 0, "changed": 1, "removed": 0})
+        self.assertEqual(events[-1], "restore")
+        popped = [queue.pop() for _ in range(3)]
+        self.assertEqual([step["step_id"] for step in popped], ["price_items-2", "publish_listings-3", "verify_listings-4"])
+        self.assertEqual(popped[1]["args"]["platform"], "Shopify")
+        self.assertEqual(popped[1]["task_id"], "t-1")
+
+    def test_apply_diff_leaves_other_lanes_alone(self):
+        # Two plans from the same templates share every step id
+        queue = DispatchQueue()
+        executor = PlanExecutor(queue)
+        social = dict(SPEC, domains=["ecommerce", "social"])
+        plan = plan_project(social)
+        for lane in ("a", "b"):
+            executor.submit(to_dict(plan)["steps"], lane)
+        new_spec = copy.deepcopy(social)
+        new_spec["parameters"]["platform"] = "Shopify"
+        _, diff = replan(plan, social, new_spec)
+        # publish_listings-3 and create_post-6 read the platform; both are held
+        self.assertEqual(apply_plan_diff(executor, diff, lane="a"), {"added": 0, "changed": 2, "removed": 0})
+        _, diff = replan(plan, social, SPEC)
+        # Two social steps were queued and two held
+        self.assertEqual(apply_plan_diff(executor, diff, lane="a"), {"added": 0, "changed": 0, "removed": 4})
+        held = {(h["lane"], h["step"]["step_id"]): h["step"] for h in executor.held()}
+        self.assertEqual(held["a", "publish_listings-3"]["args"]["platform"], "Shopify")
+        self.assertEqual(held["b", "publish_listings-3"]["args"]["platform"], "Etsy")
+        self.assertEqual(sorted(step_id for lane, step_id in held if lane == "a"), ["price_items-2", "publish_listings-3", "verify_listings-4"])
+        self.assertEqual(len([lane for lane, _ in held if lane == "b"]), 5)
+        self.assertEqual(sorted(step["step_id"] for step in queue.lane_steps("b")), ["prepare_content-5", "prepare_listings-1", "schedule_posts-8"])
+        self.assertEqual([step["step_id"] for step in queue.lane_steps("a")], ["prepare_listings-1"])
+
+    def test_added_steps_wait_for_the_plan(self):
+        queue = DispatchQueue()
+        executor = PlanExecutor(queue)
+        plan = plan_project(SPEC)
+        executor.submit(to_dict(plan)["steps"], plan.plan_id)
+        new_spec = dict(SPEC, domains=["ecommerce", "social"])
+        _, diff = replan(plan, SPEC, new_spec)
+        diff.added[0].depends_on = ["verify_listings-4"]
+        self.assertEqual(apply_plan_diff(executor, diff)["added"], 4)
+        # The first social step now waits behind the held listing steps
+        held = {h["step"]["step_id"]: h for h in executor.held()}
+        self.assertEqual(held["prepare_content-5"]["waiting"], ["verify_listings-4"])
+        self.assertEqual(held["prepare_content-5"]["step"]["plan_id"], plan.plan_id)
+        self.assertEqual(sorted(step["step_id"] for step in queue.lane_steps(plan.plan_id)), ["prepare_listings-1", "schedule_posts-8"])
+
+
+if __name__ == "__main__":
+    unittest.main()
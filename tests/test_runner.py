@@ -1,4 +1,6 @@
+import json
 import os
+import tempfile
 import unittest
 import asyncio
 
@@ -6,8 +8,14 @@ from runner_windows.runner import Runner
 
 
 class TestRunner(unittest.TestCase):
+    def setUp(self):
+        # Runner logs go to a scratch directory, not runner_windows/logs
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.logs_dir = tmp.name
+
     def test_dispatch_step_ok_and_logging(self):
-        runner = Runner(server_ws_url="ws://localhost:8000/ws")
+        runner = Runner(server_ws_url="ws://localhost:8000/ws", logs_dir=self.logs_dir)
         step = {
             "step_id": "s1",
             "team": "Engineering",
@@ -16,14 +24,15 @@ class TestRunner(unittest.TestCase):
         }
         result = asyncio.run(runner.dispatch_step(step))
         self.assertEqual(result["status"], "ok")
-        # Ensure log file exists
+        # Ensure log file exists, in the directory we asked for
         self.assertTrue(os.path.exists(runner.log_file))
+        self.assertEqual(os.path.dirname(runner.log_file), self.logs_dir)
         with open(runner.log_file, "r", encoding="utf-8") as f:
             log_contents = f.read()
         self.assertIn("Processed step s1", log_contents)
 
     def test_kill_switch(self):
-        runner = Runner(server_ws_url="ws://localhost:8000/ws")
+        runner = Runner(server_ws_url="ws://localhost:8000/ws", logs_dir=self.logs_dir)
         step = {
             "step_id": "s2",
             "team": "Engineering",
@@ -35,6 +44,72 @@ class TestRunner(unittest.TestCase):
         self.assertEqual(result["status"], "failed")
         self.assertEqual(result["notes"], "killed")
 
+    def test_connect_url_carries_window(self):
+        runner = Runner(server_ws_url="ws://localhost:8000/ws?token=abc", logs_dir=self.logs_dir, window=4)
+        self.assertEqual(runner.connect_url(), "ws://localhost:8000/ws?token=abc&window=4")
+
+    def test_results_echo_correlation_id_out_of_order(self):
+        runner = Runner(server_ws_url="ws://localhost:8000/ws", logs_dir=self.logs_dir)
+        order = []
+
+        async def dispatch_step(step):
+            await asyncio.sleep(step["delay"])
+            return {"step_id": step["step_id"], "status": "ok"}
+
+        class FakeWs:
+            async def send(self, message):
+                order.append(json.loads(message))
+
+        async def scenario():
+            lock = asyncio.Lock()
+            await asyncio.gather(
+                runner.process_step(FakeWs(), {"step_id": "slow", "delay": 0.05, "correlation_id": "c1"}, lock),
+                runner.process_step(FakeWs(), {"step_id": "fast", "delay": 0, "correlation_id": "c2"}, lock),
+            )
+
+        runner.dispatch_step = dispatch_step
+        asyncio.run(scenario())
+        self.assertEqual([(r["step_id"], r["correlation_id"]) for r in order], [("fast", "c2"), ("slow", "c1")])
+
+    def test_step_that_raises_is_reported_as_failed(self):
+        runner = Runner(server_ws_url="ws://localhost:8000/ws", logs_dir=self.logs_dir)
+        sent = []
+
+        class FakeWs:
+            async def send(self, message):
+                sent.append(json.loads(message))
+
+        step = {"step_id": "bad", "team": "Engineering", "intent": "Test", "adapter": None, "correlation_id": "c3"}
+        asyncio.run(runner.process_step(FakeWs(), step, asyncio.Lock()))
+        self.assertEqual(len(sent), 1)
+        self.assertEqual((sent[0]["step_id"], sent[0]["status"], sent[0]["correlation_id"]), ("bad", "failed", "c3"))
+        self.assertIn("NoneType", sent[0]["error"])
+
+    def test_heartbeat_waits_for_the_send_lock(self):
+        runner = Runner(server_ws_url="ws://localhost:8000/ws", logs_dir=self.logs_dir)
+        sent = []
+
+        class FakeWs:
+            async def send(self, message):
+                sent.append(json.loads(message))
+
+        async def scenario():
+            lock = asyncio.Lock()
+            async with lock:
+                # A result is being sent: the heartbeat must not go out yet
+                beat = asyncio.create_task(runner.heartbeat(FakeWs(), lock))
+                await asyncio.sleep(0.01)
+                self.assertEqual(sent, [])
+            # Released: it goes out, then the loop sleeps until the next one
+            for _ in range(100):
+                if sent:
+                    break
+                await asyncio.sleep(0.01)
+            beat.cancel()
+
+        asyncio.run(scenario())
+        self.assertEqual(sent[0]["runner_status"], "running")
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import unittest
+
+from orchestrator.dispatch_queue import DispatchQueue
+from orchestrator.runners import RunnerRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _step(step_id):
+    return {"step_id": step_id, "team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+
+
+class TestRunnerRegistry(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.queue = DispatchQueue()
+        self.registry = RunnerRegistry(self.queue, lease_timeout=30, clock=self.clock)
+
+    def test_lease_and_complete(self):
+        runner_id = self.registry.register()
+        self.queue.push(_step("s1"))
+        lease = self.registry.lease(runner_id, self.queue.pop_entry())
+        self.assertEqual(self.registry.in_flight(runner_id), 1)
+        self.assertTrue(self.registry.ack(runner_id, "s1"))
+        self.assertIs(self.registry.complete(lease.lease_id), lease)
+        self.assertIsNone(self.registry.complete(lease.lease_id))
+        self.assertEqual(self.registry.snapshot()[0]["completed"], 1)
+
+    def test_disconnect_requeues_at_original_position(self):
+        runner_id = self.registry.register()
+        self.queue.push(_step("first"))
+        self.queue.push(_step("second"))
+        self.registry.lease(runner_id, self.queue.pop_entry())
+        self.assertEqual(self.registry.unregister(runner_id), 1)
+        self.assertEqual(self.queue.pop()["step_id"], "first")
+
+    def test_expired_lease_is_requeued_unless_renewed(self):
+        runner_id = self.registry.register()
+        self.queue.push(_step("s1"))
+        lease = self.registry.lease(runner_id, self.queue.pop_entry())
+        self.clock.now = 20
+        self.registry.heartbeat(runner_id, {"runner_status": "running"})
+        self.clock.now = 40
+        self.assertEqual(self.registry.expire(), [])
+        self.clock.now = 60
+        self.assertEqual(self.registry.expire(), [lease])
+        self.assertFalse(self.registry.is_active(lease.lease_id))
+        self.assertEqual(self.queue.pop()["step_id"], "s1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,11 +8,17 @@ from orchestrator.scheduler import Scheduler, CostLedger
 
 
 class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        # Budget checks read a scratch ledger, not memory/cost_ledger.jsonl
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.ledger = CostLedger(os.path.join(tmp.name, "cost_ledger.jsonl"))
+
     def test_interval_job_runs_and_persists(self):
         """Interval jobs should run immediately, update last_run/next_run, and persist."""
         with tempfile.TemporaryDirectory() as tmp:
             jobs_path = os.path.join(tmp, "jobs.yaml")
-            scheduler = Scheduler(jobs_path=jobs_path)
+            scheduler = Scheduler(ledger=self.ledger, jobs_path=jobs_path)
             ran = {"flag": False}
 
             def task_fn():
@@ -29,14 +35,14 @@ class TestScheduler(unittest.TestCase):
             # next_run should be populated (may be immediate for zero interval)
             self.assertIsInstance(job.get("next_run"), dt.datetime)
             # Reload scheduler from file and ensure job persists
-            scheduler2 = Scheduler(jobs_path=jobs_path)
+            scheduler2 = Scheduler(ledger=self.ledger, jobs_path=jobs_path)
             self.assertEqual(len(scheduler2.jobs), 1)
 
     def test_quiet_hours_deferral(self):
         """Jobs due during quiet hours should be deferred to after quiet hours."""
         with tempfile.TemporaryDirectory() as tmp:
             jobs_path = os.path.join(tmp, "jobs.yaml")
-            scheduler = Scheduler(jobs_path=jobs_path)
+            scheduler = Scheduler(ledger=self.ledger, jobs_path=jobs_path)
             ran = {"flag": False}
 
             def task_fn():
@@ -44,8 +50,8 @@ class TestScheduler(unittest.TestCase):
 
             scheduler.register("test", task_fn)
             # Create a job due now
-            job = {"interval": 0, "task_ref": "test", "next_run": dt.datetime.now()}
-            scheduler.jobs.append(job)
+            job = scheduler.add_job({"interval": 0, "task_ref": "test"})
+            scheduler.reschedule(job, dt.datetime.now())
             # Force quiet hours by patching _in_quiet_hours to always return True
             with mock.patch.object(scheduler, "_in_quiet_hours", return_value=True):
                 scheduler.run_pending()
@@ -58,15 +64,15 @@ class TestScheduler(unittest.TestCase):
         """When daily token cap is exceeded, jobs are deferred to the next day."""
         with tempfile.TemporaryDirectory() as tmp:
             jobs_path = os.path.join(tmp, "jobs.yaml")
-            scheduler = Scheduler(jobs_path=jobs_path)
+            scheduler = Scheduler(ledger=self.ledger, jobs_path=jobs_path)
             ran = {"flag": False}
 
             def task_fn():
                 ran["flag"] = True
 
             scheduler.register("test", task_fn)
-            job = {"interval": 0, "task_ref": "test", "next_run": dt.datetime.now()}
-            scheduler.jobs.append(job)
+            job = scheduler.add_job({"interval": 0, "task_ref": "test"})
+            scheduler.reschedule(job, dt.datetime.now())
             # Patch CostLedger.totals_today to simulate high usage
             with mock.patch.object(CostLedger, "totals_today", return_value={"in_tokens": 30000, "out_tokens": 0, "usd": 0.0}):
                 scheduler.run_pending()
@@ -75,6 +81,83 @@ class TestScheduler(unittest.TestCase):
             # next_run should be deferred by at least 12 hours (tomorrow morning)
             self.assertGreater(job["next_run"], dt.datetime.now() + dt.timedelta(hours=12))
 
+    def test_one_shot_job_runs_once_with_args(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs_path = os.path.join(tmp, "jobs.yaml")
+            scheduler = Scheduler(ledger=self.ledger, jobs_path=jobs_path)
+            calls = []
+            scheduler.register("spill", lambda steps: calls.append(steps))
+            run_at = dt.datetime.now() + dt.timedelta(days=1)
+            scheduler.add_job({"run_at": run_at, "task_ref": "spill", "args": {"steps": ["a"]}, "reserved_tokens": 300})
+            self.assertEqual(scheduler.reservations(), {scheduler.jobs[0]["next_run"].astimezone(dt.timezone.utc).date(): 300})
+            # Persisted and reloaded as a datetime
+            self.assertIsInstance(Scheduler(ledger=self.ledger, jobs_path=jobs_path).jobs[0]["run_at"], dt.datetime)
+            scheduler.run_pending()
+            self.assertEqual(calls, [])
+            scheduler.reschedule(scheduler.jobs[0], dt.datetime.now())
+            with mock.patch.object(scheduler, "_in_quiet_hours", return_value=False):
+                scheduler.run_pending()
+                scheduler.run_pending()
+            self.assertEqual(calls, [["a"]])
+            self.assertEqual(scheduler.jobs, ())
+
+    def test_heap_runs_due_jobs_in_order_on_virtual_clock(self):
+        now = [dt.datetime(2026, 1, 5, 9, 0)]
+        scheduler = Scheduler(ledger=self.ledger, jobs_path=None, clock=lambda: now[0])
+        calls = []
+        scheduler.register("mark", lambda name: calls.append(name))
+        jobs = {
+            name: scheduler.add_job({"run_at": now[0] + dt.timedelta(minutes=minutes), "task_ref": "mark", "args": {"name": name}})
+            for name, minutes in (("c", 30), ("a", 10), ("b", 20), ("gone", 15))
+        }
+        # Moved later: the old entry at +10m is skipped; removed: never runs
+        scheduler.reschedule(jobs["a"], now[0] + dt.timedelta(minutes=25))
+        self.assertTrue(scheduler.remove_job(jobs["gone"]))
+        self.assertFalse(scheduler.remove_job(jobs["gone"]))
+        with mock.patch.object(scheduler, "_in_quiet_hours", return_value=False):
+            now[0] += dt.timedelta(minutes=20)
+            scheduler.run_pending()
+            self.assertEqual(calls, ["b"])
+            now[0] += dt.timedelta(minutes=10)
+            scheduler.run_pending()
+        self.assertEqual(calls, ["b", "a", "c"])
+        self.assertEqual(scheduler.jobs, ())
+        with self.assertRaises(KeyError):
+            scheduler.reschedule(jobs["a"], now[0])
+
+    def test_stale_heap_entries_are_compacted(self):
+        start = dt.datetime(2026, 1, 5, 9, 0)
+        scheduler = Scheduler(ledger=self.ledger, jobs_path=None, clock=lambda: start)
+        job = scheduler.add_job({"run_at": start, "task_ref": "noop"})
+        for minutes in range(1000):
+            scheduler.reschedule(job, start + dt.timedelta(minutes=minutes))
+        self.assertLess(len(scheduler._heap), 100)
+        self.assertEqual(scheduler.jobs, (job,))
+
+    def test_changes_are_journaled_and_compacted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs_path = os.path.join(tmp, "jobs.yaml")
+            start = dt.datetime(2026, 1, 5, 9, 0)
+            scheduler = Scheduler(ledger=self.ledger, jobs_path=jobs_path, clock=lambda: start)
+            keep = scheduler.add_job({"run_at": start + dt.timedelta(hours=1), "task_ref": "noop"})
+            gone = scheduler.add_job({"run_at": start + dt.timedelta(hours=2), "task_ref": "noop"})
+            scheduler.reschedule(keep, start + dt.timedelta(hours=3))
+            scheduler.remove_job(gone)
+            # Only the journal was written, one line per change
+            self.assertFalse(os.path.exists(jobs_path))
+            with open(scheduler.journal_path, encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 4)
+            reloaded = Scheduler(ledger=self.ledger, jobs_path=jobs_path)
+            self.assertEqual([job["id"] for job in reloaded.jobs], [keep["id"]])
+            self.assertEqual(reloaded.jobs[0]["next_run"], start + dt.timedelta(hours=3))
+            # Compaction folds the journal into the YAML file
+            with mock.patch("orchestrator.scheduler.JOURNAL_COMPACT_MIN", 4):
+                scheduler.reschedule(keep, start + dt.timedelta(hours=4))
+            self.assertFalse(os.path.exists(scheduler.journal_path))
+            self.assertEqual(Scheduler(ledger=self.ledger, jobs_path=jobs_path).jobs[0]["next_run"], start + dt.timedelta(hours=4))
+            with self.assertRaises(AttributeError):
+                scheduler.jobs.append({"interval": 60})
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
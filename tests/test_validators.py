@@ -2,9 +2,14 @@ import unittest
 
 from orchestrator.core.models import Plan, Step, StepResult
 from orchestrator.core.validators import (
+    SchemaValidator,
+    ValidationError,
+    find_cycle,
     validate_plan,
+    validate_plans,
     validate_step,
     validate_step_result,
+    validate_step_results,
 )
 
 
@@ -37,5 +42,86 @@ class TestValidators(unittest.TestCase):
             validate_step_result(result)
 
 
+    def test_validate_plan_dependencies(self):
+        def plan(*edges):
+            steps = [
+                Step(step_id=step_id, team="Engineering", intent="Test", adapter={"type": "files"}, depends_on=list(deps))
+                for step_id, deps in edges
+            ]
+            return Plan(plan_id="p", gates=[], steps=steps)
+
+        validate_plan(plan(("a", []), ("b", ["a"]), ("c", ["a", "b"])))
+        with self.assertRaises(ValueError):
+            validate_plan(plan(("a", ["missing"])))
+        with self.assertRaises(ValueError):
+            validate_plan(plan(("a", ["c"]), ("b", ["a"]), ("c", ["b"])))
+        self.assertEqual(find_cycle({"a": ["a"]}), ["a", "a"])
+        # A None dependency does not end the scan of the step's other ones
+        self.assertEqual(find_cycle({"a": [None, "b"], "b": ["a"]}), ["a", "b", "a"])
+
+    def test_args_schemas(self):
+        def step(adapter_type, **args):
+            return Step(step_id="s1", team="Engineering", intent="Test", adapter={"type": adapter_type}, args=args)
+
+        validate_step(step("finance", action="place_orders", mode="paper"))
+        validate_step(step("finance", action="fetch_data"))
+        validate_step(step("schedule", cron="@weekly"))
+        with self.assertRaisesRegex(ValidationError, "args.mode is required for finance place_orders"):
+            validate_step(step("finance", action="place_orders"))
+        with self.assertRaisesRegex(ValidationError, "args.mode must be one of live, paper, not 'real'"):
+            validate_step(step("finance", action="place_orders", mode="real"))
+        with self.assertRaisesRegex(ValidationError, "args.cron is required for schedule steps"):
+            validate_step(step("schedule"))
+        with self.assertRaises(ValueError):
+            SchemaValidator(args_schemas={"teleport": {None: {"to": None}}})
+
+    def test_large_plan_reports_every_error(self):
+        steps = [
+            Step(step_id=f"s{i}", team="Engineering", intent="Test", adapter={"type": "files"}, depends_on=[f"s{i - 1}"] if i else [])
+            for i in range(10_000)
+        ]
+        steps[10].team = ""
+        steps[500].adapter = {"type": "teleport"}
+        steps[9_000].args = {"action": "place_orders"}
+        steps[9_000].adapter = {"type": "finance"}
+        steps[9_999].depends_on = ["missing"]
+        steps.append(Step(step_id="s1", team="QA", intent="Test", adapter={"type": "web"}))
+        with self.assertRaises(ValidationError) as ctx:
+            validate_plan(Plan(plan_id="big", gates=[], steps=steps))
+        self.assertEqual(
+            ctx.exception.errors,
+            [
+                "steps[10]: team is required",
+                "steps[500]: Unknown adapter type: teleport",
+                "steps[9000]: args.mode is required for finance place_orders",
+                "steps[10000]: duplicate step_id s1",
+                "Step s9999 depends on unknown step missing",
+            ],
+        )
+        self.assertIsInstance(ctx.exception, ValueError)
+
+    def test_batch_validation(self):
+        good = Plan(plan_id="p1", gates=[], steps=[Step(step_id="a", team="QA", intent="Test", adapter={"type": "web"})])
+        bad = Plan(plan_id="", gates=[], steps=[])
+        validate_plans([good, good])
+        with self.assertRaises(ValidationError) as ctx:
+            validate_plans([good, bad, {"plan_id": "p3", "gates": [], "steps": ["oops"]}])
+        self.assertEqual(
+            ctx.exception.errors,
+            [
+                "plans[1]: plan_id is required",
+                "plans[1]: steps must be a non-empty list",
+                "plans[2]: steps[0]: step must be an object",
+            ],
+        )
+        validate_step_results([StepResult(step_id="a", status="ok"), {"step_id": "b", "status": "retry"}])
+        with self.assertRaises(ValidationError) as ctx:
+            validate_step_results([StepResult(step_id="", status="ok"), StepResult(step_id="b", status="done")])
+        self.assertEqual(ctx.exception.errors, ["results[0]: step_id is required in StepResult", "results[1]: Invalid status: done"])
+        # The message is capped; the full list stays on the exception
+        many = ValidationError([f"e{i}" for i in range(25)])
+        self.assertTrue(str(many).endswith("e9 (and 15 more)"))
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
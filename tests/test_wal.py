@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+
+from orchestrator.dispatch_queue import DispatchQueue
+from orchestrator.plan_executor import PlanExecutor
+from orchestrator.wal import WriteAheadLog
+
+
+def _step(step_id):
+    return {"step_id": step_id, "team": "Engineering", "intent": "Test", "adapter": {"type": "files"}}
+
+
+def _restart(directory, **kwargs):
+    wal = WriteAheadLog(directory, **kwargs)
+    state = wal.recover()
+    queue = DispatchQueue()
+    for queued in state.pending():
+        queue.restore(queued)
+    queue.journal = wal.record_queue_event
+    return wal, state, queue
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    def test_restart_restores_queue_runs_and_parked(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wal, _, queue = _restart(tmp)
+            for step_id in ("a", "b", "c", "d"):
+                queue.push(_step(step_id), lane="p1")
+            done = queue.pop_entry()
+            wal.record_result(done.seq, {"step_id": "a", "status": "ok"})
+            budget = queue.pop_entry()
+            wal.record_park(budget.seq, {"step_id": "b", "reason": "budget"})
+            queue.pop_entry()  # "c" is in flight when we crash
+            queue.cancel("d")
+            wal.close()
+
+            wal, state, queue = _restart(tmp)
+            self.assertEqual([r["step_id"] for r in state.runs], ["a"])
+            self.assertEqual([p["step_id"] for p in state.parked], ["b"])
+            # The in-flight step is back on the queue; the cancelled one is gone
+            self.assertEqual(queue.pop()["step_id"], "c")
+            self.assertIsNone(queue.pop())
+            # New steps do not reuse recovered positions
+            self.assertGreater(queue.push(_step("e")), done.seq)
+            wal.close()
+
+    def test_held_steps_survive_restart_and_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for snapshot_every in (10_000, 3):
+                wal, _, queue = _restart(os.path.join(tmp, str(snapshot_every)), snapshot_every=snapshot_every)
+                executor = PlanExecutor(queue, journal=wal.record_dag_event)
+                steps = [_step("a"), dict(_step("b"), depends_on=["a"]), dict(_step("c"), depends_on=["a", "b"])]
+                executor.submit(steps, "p")
+                done = queue.pop_entry()
+                wal.record_result(done.seq, {"step_id": "a", "status": "ok"})
+                executor.complete("p", "a")
+                wal.close()
+
+                wal, state, queue = _restart(wal.directory, snapshot_every=snapshot_every)
+                executor = PlanExecutor(queue)
+                executor.restore(state.held.values())
+                self.assertEqual(executor.held()[0]["waiting"], ["b"])
+                self.assertEqual(queue.pop()["step_id"], "b")
+                self.assertEqual(executor.complete("p", "b"), 1)
+                wal.close()
+
+    def test_done_events_replay_per_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wal, _, queue = _restart(tmp)
+            executor = PlanExecutor(queue, journal=wal.record_dag_event)
+            plan = [_step("a"), dict(_step("b"), depends_on=["a"]), dict(_step("c"), depends_on=["a", "b"])]
+            executor.submit(plan, "p")
+            executor.submit(plan, "p")
+            executor.complete("p", "a")
+            wal.close()
+            _, state, _ = _restart(tmp)
+            self.assertEqual(
+                sorted((run, held["step"]["step_id"], held["waiting"]) for (_, run, _), held in state.held.items()),
+                [(1, "c", ["b"]), (2, "b", ["a"]), (2, "c", ["a", "b"])],
+            )
+            self.assertEqual(sorted(state.dependents), [("p", 1, "b"), ("p", 2, "a"), ("p", 2, "b")])
+
+    def test_snapshot_compacts_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wal, _, queue = _restart(tmp, snapshot_every=10)
+            for i in range(25):
+                queue.push(_step(f"s{i}"))
+            wal.close()
+            with open(wal.log_path, "r", encoding="utf-8") as f:
+                self.assertEqual(len(f.readlines()), 5)
+            self.assertTrue(os.path.exists(wal.snapshot_path))
+            _, state, queue = _restart(tmp, snapshot_every=10)
+            self.assertEqual(len(queue), 25)
+            self.assertEqual(queue.pop()["step_id"], "s0")
+
+    def test_runs_survive_compaction_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wal, _, queue = _restart(tmp, snapshot_every=4)
+            for i in range(3):
+                queue.push(_step(f"s{i}"))
+                wal.record_result(queue.pop_entry().seq, {"step_id": f"s{i}", "status": "ok"})
+            wal.close()
+            _, state, queue = _restart(tmp, snapshot_every=4)
+            self.assertEqual([r["step_id"] for r in state.runs], ["s0", "s1", "s2"])
+            self.assertEqual(len(queue), 0)
+
+    def test_torn_final_line_is_discarded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            wal, _, queue = _restart(tmp)
+            queue.push(_step("kept"))
+            wal.close()
+            with open(wal.log_path, "a", encoding="utf-8") as f:
+                f.write('{"e":"push","s":[1,')
+            wal, _, queue = _restart(tmp)
+            queue.push(_step("after"))
+            wal.close()
+            _, _, queue = _restart(tmp)
+            self.assertEqual([queue.pop()["step_id"], queue.pop()["step_id"]], ["kept", "after"])
+
+
+if __name__ == "__main__":
+    unittest.main()